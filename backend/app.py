@@ -5,9 +5,12 @@ from contextlib import asynccontextmanager
 from auth.jwt_bearer import JWTBearer
 from config.config import initiate_database
 from routes.admin import router as AdminRouter
-# from routes.evaluate import router as EvaluateRouter
+from routes.evaluate import router as EvaluateRouter
 from routes.extract import router as ExtractRouter
+from routes.jobs import router as JobsRouter
 from routes.requirements import router as RequirementsRouter
+from utils.llm import close_llm_client
+from utils.wikitext import close_client
 from dotenv import load_dotenv
 import os
 
@@ -17,6 +20,8 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     await initiate_database()
     yield
+    await close_client()
+    await close_llm_client()
 
 app = FastAPI(lifespan=lifespan)  # Add lifespan here
 token_listener = JWTBearer()
@@ -37,4 +42,5 @@ async def read_root():
 app.include_router(AdminRouter, tags=["Administrator"], prefix="/admin")
 app.include_router(ExtractRouter, tags=["Extract"], prefix="/api")
 app.include_router(RequirementsRouter, tags=["Requirements"], prefix="/api")
-# app.include_router(EvaluateRouter, tags=["Evaluate"], prefix="/api")
+app.include_router(JobsRouter, tags=["Jobs"], prefix="/api")
+app.include_router(EvaluateRouter, tags=["Evaluate"], prefix="/api")
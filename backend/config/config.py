@@ -3,6 +3,7 @@ from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings
 import models as models
+from utils.indexes import verify_indexes
 import os
 
 class Settings(BaseSettings):
@@ -14,6 +15,83 @@ class Settings(BaseSettings):
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None
+    # "online" calls the model per request; "batch" submits fanned-out extraction and
+    # evaluation calls through the Batch API (see utils/openai_batch.py); "fake" answers
+    # locally without calling any API (see utils/llm.py)
+    LLM_BACKEND: str = "online"
+    LLM_EXTRACTION_MODEL: str = "o1-mini"
+    LLM_TITLE_MODEL: str = "o1-mini"
+    LLM_EVALUATION_MODEL: str = "o1-preview"
+    # Send output schemas as strict response formats to models that support them
+    LLM_STRUCTURED_OUTPUTS: bool = True
+    LLM_TIMEOUT: float = 600.0
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_SECONDS: float = 60.0
+    # Starting budgets per model; they follow the API's rate-limit headers once calls are made
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200000
+    LLM_COMPLETION_TOKEN_ESTIMATE: int = 4000  # Reserved per call until the real usage is known
+    LLM_MAX_RETRIES: int = 6
+    LLM_RETRY_BACKOFF: float = 1.0
+    LLM_RETRY_MAX_BACKOFF: float = 60.0
+    OPENAI_BATCH_WINDOW: float = 1.0  # Calls this close together share a batch
+    OPENAI_BATCH_POLL_INTERVAL: float = 30.0
+
+    # Extraction
+    EXTRACTION_CONCURRENCY: int = 1
+    EXTRACTION_MODE: str = "stateful"
+    EXTRACTION_CHUNK_TOKENS: int = 1500  # Model tokens per style guide chunk
+    EXTRACTION_CHUNK_OVERLAP_TOKENS: int = 0  # Context repeated from the previous chunk
+
+    # Prompts: "pretty", "compact" or "digest" (see utils/prompt_encoding.py)
+    PROMPT_ENCODING: str = "compact"
+
+    # Evaluation
+    EVALUATION_CONCURRENCY: int = 4
+    EVALUATION_PREFILTER: bool = True
+    SCOREBOARD_CACHE_SECONDS: float = 30.0
+    SCOREBOARD_CACHE_MAX_ENTRIES: int = 256
+
+    # Job queue (see worker.py)
+    WORKER_CONCURRENCY: int = 2
+    JOB_MAX_RUNNING: Optional[int] = None  # Cap on running jobs across all workers
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_LEASE_SECONDS: int = 300
+    JOB_RETRY_BACKOFF: float = 30.0
+    JOB_POLL_INTERVAL: float = 2.0
+    JOB_EVENTS_POLL_INTERVAL: float = 0.5  # How often the event stream checks for new events
+    JOB_EVENTS_KEEPALIVE: float = 15.0
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = ".cache/llm_responses.sqlite3"
+    LLM_CACHE_TTL: Optional[int] = 30 * 24 * 60 * 60
+    LLM_CACHE_MAX_ENTRIES: Optional[int] = 50000
+
+    # Wikipedia
+    WIKIPEDIA_API_URL: str = "https://en.wikipedia.org/w/api.php"
+    WIKIPEDIA_USER_AGENT: str = "Omnipedia/2.0 (https://github.com/wikius/omnipedia)"
+    WIKIPEDIA_TIMEOUT: float = 30.0
+    WIKIPEDIA_MAX_RETRIES: int = 3
+    WIKIPEDIA_BACKOFF: float = 0.5
+    WIKIPEDIA_MAX_CONNECTIONS: int = 10
+    WIKITEXT_CACHE_ENABLED: bool = True
+    WIKITEXT_CACHE_PATH: str = ".cache/wikitext.sqlite3"
+    WIKITEXT_CACHE_MAX_ENTRIES: Optional[int] = 5000
+    # Markup dropped when articles are parsed into sections (see utils/wikiparse.py)
+    WIKITEXT_DROP_IMAGES: bool = True
+    WIKITEXT_DROP_TEMPLATES: bool = True
+    WIKITEXT_DROP_REFS: bool = True
+    WIKITEXT_DROP_TABLES: bool = True
+
+    # Requirements storage: documents whose requirements and chunks serialize to at least this
+    # many bytes keep them compressed in a separate collection (None keeps everything inline)
+    REQUIREMENTS_OFFLOAD_BYTES: Optional[int] = None
+    PAYLOAD_COMPRESSION: str = "zstd"  # Falls back to gzip when zstandard is not installed
+
+    # Fail startup if an index declared on a model is missing (see utils/indexes.py)
+    VERIFY_INDEXES: bool = True
 
     # JWT
     secret_key: str = "secret"
@@ -45,4 +123,7 @@ async def initiate_database():
     await init_beanie(
         database=client.get_default_database(),
         document_models=models.__all__
-    )
\ No newline at end of file
+    )
+
+    if settings.VERIFY_INDEXES:
+        await verify_indexes(models.__all__)
\ No newline at end of file
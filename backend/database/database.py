@@ -3,7 +3,9 @@ from beanie import init_beanie, PydanticObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 from models.admin import Admin
 from models.student import Student
-from models.requirements import RequirementsDocument
+from models.requirements import RequirementsDocument, RequirementsPayload
+from models.job import Job, JobEvent, JobSlot
+from models.evaluation import Evaluation, EvaluationCheckpoint
 import os
 
 admin_collection = Admin
@@ -20,7 +22,7 @@ async def init_db():
     # Initialize beanie with the document models
     await init_beanie(
         database=client.get_default_database(),
-        document_models=[RequirementsDocument]
+        document_models=[RequirementsDocument, RequirementsPayload, Job, JobEvent, JobSlot, Evaluation, EvaluationCheckpoint]
     )
 
 
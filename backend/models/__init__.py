@@ -1,5 +1,7 @@
 from models.admin import Admin
 from models.student import Student
-from models.requirements import RequirementsDocument
+from models.requirements import RequirementsDocument, RequirementsPayload
+from models.job import Job, JobEvent, JobSlot
+from models.evaluation import Evaluation, EvaluationCheckpoint
 
-__all__ = [Admin, Student, RequirementsDocument]
\ No newline at end of file
+__all__ = [Admin, Student, RequirementsDocument, RequirementsPayload, Job, JobEvent, JobSlot, Evaluation, EvaluationCheckpoint]
\ No newline at end of file
@@ -0,0 +1,63 @@
+from beanie import Document
+from typing import Dict, Any, Optional
+from datetime import datetime
+from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+class Evaluation(Document):
+    evaluation_id: str
+    requirements_request_id: str
+    # "revid:<n>" for Wikipedia pages, "sha256:<hex>" for pasted article text
+    article_key: str
+    prompt_version: str  # Evaluation model and prompt template version
+    article_title: Optional[str] = None
+    article_url: Optional[str] = None
+    revid: Optional[int] = None
+    content: Optional[str] = None  # Pasted article markdown; pages are fetched by the worker
+    status: str = "queued"  # queued, completed or error
+    result: Optional[Dict[str, Any]] = None  # EvaluationOutput
+    summary: Optional[Dict[str, Any]] = None  # See utils/scoring.py
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "evaluations"
+        indexes = [
+            IndexModel([("evaluation_id", ASCENDING)], unique=True),
+            # One stored evaluation per article revision, requirements set and prompt version
+            IndexModel(
+                [
+                    ("article_key", ASCENDING),
+                    ("requirements_request_id", ASCENDING),
+                    ("prompt_version", ASCENDING),
+                ],
+                unique=True,
+            ),
+            # GET /api/scoreboard
+            IndexModel(
+                [
+                    ("requirements_request_id", ASCENDING),
+                    ("status", ASCENDING),
+                    ("summary.score", DESCENDING),
+                ]
+            ),
+        ]
+
+
+class EvaluationCheckpoint(Document):
+    """A finished section of a batch evaluation, so a restarted batch can skip it."""
+
+    key: str  # See prompts/evaluate/evaluate_batch.py:section_key
+    # EvaluationOutput; None in records written before unparseable sections were retried
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "evaluation_checkpoints"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            # Batches are resumed within hours; completed ones live on as Evaluations
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=7 * 24 * 60 * 60),
+        ]
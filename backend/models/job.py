@@ -0,0 +1,68 @@
+from beanie import Document
+from typing import Dict, Any, Optional
+from datetime import datetime
+from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+class Job(Document):
+    job_id: str  # Same as the request_id handed back to the client
+    kind: str  # Name of the registered handler, e.g. "extract"
+    payload: Dict[str, Any] = {}
+    status: str = "queued"  # queued, running, completed or failed
+    priority: int = 0  # Higher runs first
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime = Field(default_factory=datetime.utcnow)  # Not leased before this time
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    error: Optional[str] = None
+    # Set while the job is queued or running so identical submissions share it (see enqueue_job)
+    dedupe_key: Optional[str] = None
+    event_count: int = 0  # Sequence number of the last progress event (see JobEvent)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "jobs"
+        # Unset fields are left out of the stored document; the dedupe_key index relies on it
+        keep_nulls = False
+        indexes = [
+            IndexModel([("job_id", ASCENDING)], unique=True),
+            # At most one active job per key; the key is unset once a job finishes
+            IndexModel([("dedupe_key", ASCENDING)], unique=True, sparse=True),
+            # Matches the lease query: ready jobs by priority, then oldest first
+            IndexModel(
+                [
+                    ("status", ASCENDING),
+                    ("priority", DESCENDING),
+                    ("created_at", ASCENDING),
+                ]
+            ),
+        ]
+
+
+class JobEvent(Document):
+    job_id: str
+    seq: int  # Increasing per job, used as the SSE event id
+    event: str
+    data: Dict[str, Any] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "job_events"
+        indexes = [
+            IndexModel([("job_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+            # Progress is only interesting while a client is watching; drop it after a week
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=7 * 24 * 60 * 60),
+        ]
+
+
+class JobSlot(Document):
+    # One of JOB_MAX_RUNNING run slots; workers hold one for each job they run (see utils/jobs.py)
+    id: int
+    owner: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+    class Settings:
+        name = "job_slots"
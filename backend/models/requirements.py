@@ -1,18 +1,47 @@
 from beanie import Document
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
-from pydantic import HttpUrl
+from pydantic import Field, HttpUrl
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 class RequirementsDocument(Document):
     request_id: str
     title: str
     requirements: Dict[str, Any]
-    created_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
     status: str = "completed"
     url: Optional[HttpUrl] = None
+    revid: Optional[int] = None  # Wikipedia revision the requirements were extracted from
+    chunks: List[Dict[str, Any]] = []  # Per-chunk content hash and extracted requirements
+    # Set when requirements and chunks are stored compressed in RequirementsPayload instead
+    payload_encoding: Optional[str] = None
 
     class Settings:
         name = "requirements"
+        # Each index serves a query in routes/; `python -m utils.indexes` checks they are used
         indexes = [
-            "url"  # Index on URL for faster lookups
+            # GET /api/requirements/{request_id} and the extraction worker
+            IndexModel([("request_id", ASCENDING)], unique=True),
+            # Latest completed extraction of a URL in POST /api/extract
+            IndexModel(
+                [("url", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]
+            ),
+            # Keyset pagination in GET /api/requirements
+            IndexModel(
+                [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+            ),
+        ]
+
+
+class RequirementsPayload(Document):
+    """Compressed JSON of a large RequirementsDocument's requirements and chunks."""
+    request_id: str
+    encoding: str  # "zstd" or "gzip"
+    data: bytes
+    size: int  # Uncompressed size in bytes
+
+    class Settings:
+        name = "requirements_payloads"
+        indexes = [
+            IndexModel([("request_id", ASCENDING)], unique=True),
         ]
\ No newline at end of file
@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 
 # Add markdown parsing library
 import re
+from utils.prompt_encoding import encode_json, encode_requirements
+from utils.split import parse_markdown_to_sections, split_into_sentences
 
 load_dotenv()
 
@@ -280,57 +282,6 @@ Your evaluation should be saved in the following structured JSON format:
 """
 
 
-def parse_markdown_to_sections(markdown_content: str) -> List[Dict]:
-    """
-    Parse markdown content into sections.
-    Returns a list of dictionaries containing section title and content.
-    """
-    # Split the content into sections based on headers
-    sections = []
-    current_section = {"title": "", "content": []}
-
-    # Split content into lines
-    lines = markdown_content.split("\n")
-
-    for line in lines:
-        # Check if line is a header (starts with #)
-        if line.strip().startswith("#"):
-            # If we have a previous section, save it
-            if current_section["title"]:
-                sections.append(
-                    {
-                        "title": current_section["title"],
-                        "content": "\n".join(current_section["content"]).strip(),
-                    }
-                )
-            # Start new section
-            # Remove #s and whitespace from title
-            current_section = {"title": line.strip("#").strip(), "content": []}
-        else:
-            # Add content line to current section
-            current_section["content"].append(line)
-
-    # Add the last section if it exists
-    if current_section["title"]:
-        sections.append(
-            {
-                "title": current_section["title"],
-                "content": "\n".join(current_section["content"]).strip(),
-            }
-        )
-
-    return sections
-
-
-def split_into_sentences(text: str) -> List[str]:
-    """
-    Split text into sentences using basic rules.
-    """
-    # Simple sentence splitting - can be enhanced based on needs
-    sentences = re.split(r"(?<=[.!?])\s+", text)
-    return [s.strip() for s in sentences if s.strip()]
-
-
 @ell.simple(model="o1-mini", client=OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
 def evaluate_section(
     current_state: EvaluationOutput,
@@ -352,13 +303,13 @@ def evaluate_section(
                     {instructions}
 
                     **Current State of Evaluation:**
-                    {current_state.model_dump_json(indent=2)}
+                    {encode_json(current_state)}
 
                     **Section ({i}/{total_sections}):**
-                    {json.dumps(section, indent=2)}
+                    {encode_json(section)}
 
                     **Requirements:**
-                    {json.dumps(requirements, indent=2)}
+                    {encode_requirements(requirements)}
 
                     **Remember to output only the JSON in the specified format, without any additional text.**
                     """)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Protocol
+
+from config.config import settings
+from models.evaluation import EvaluationCheckpoint
+from prompts.evaluate.evaluate_index import (
+    EVALUATION_MODEL,
+    EVALUATION_PROMPT_VERSION,
+    EvaluationOutput,
+    empty_evaluation,
+    evaluate_section_async,
+    merge_section_evaluations,
+    parse_markdown_to_sections,
+    parse_section_output,
+    requirements_per_section,
+)
+from utils.cache import make_cache_key
+from utils.openai_batch import batch_backend_enabled
+from utils.progress import ProgressCallback, emit
+from utils.prompt_encoding import current_mode
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint(Protocol):
+    """Store of finished section evaluations, keyed by `section_key`."""
+
+    async def load(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]: ...
+
+    async def save(self, key: str, result: Dict[str, Any]) -> None: ...
+
+
+class JsonlCheckpoint:
+    """Append-only JSON lines file of section results, safe to resume after a crash."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def load(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        if not os.path.exists(self.path):
+            return {}
+        wanted = set(keys)
+        results = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+                if record["key"] in wanted:
+                    results[record["key"]] = record["result"]
+        return results
+
+    async def save(self, key: str, result: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "result": result}) + "\n")
+            f.flush()
+
+
+class StoredCheckpoint:
+    """Checkpoint kept in the evaluation_checkpoints collection, shared by all workers."""
+
+    async def load(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        docs = await EvaluationCheckpoint.find({"key": {"$in": keys}}).to_list()
+        return {doc.key: doc.result for doc in docs}
+
+    async def save(self, key: str, result: Dict[str, Any]) -> None:
+        await EvaluationCheckpoint.get_motor_collection().update_one(
+            {"key": key},
+            {"$set": {"result": result}, "$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+
+def section_key(section: Dict, requirements: Any, i: int, total_sections: int) -> str:
+    """Identify a section evaluation by everything that goes into its prompt."""
+    return make_cache_key(
+        EVALUATION_MODEL,
+        EVALUATION_PROMPT_VERSION,
+        {
+            "section": section,
+            "requirements": requirements,
+            "i": i,
+            "total_sections": total_sections,
+            "encoding": current_mode(),
+        },
+    )
+
+
+async def evaluate_batch(
+    articles: Dict[str, str],
+    requirements: Any,
+    max_workers: Optional[int] = None,
+    prefilter: Optional[bool] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Dict[str, EvaluationOutput]:
+    """
+    Evaluate many articles against one requirements set.
+
+    The sections of all articles go through one pool of at most `max_workers` concurrent
+    evaluations, so short articles do not leave workers idle while long ones finish. Each
+    finished section is written to `checkpoint`; if any section fails, the error is raised
+    once the others are done, and running the same batch again only evaluates the sections
+    that are missing from the checkpoint. Sections whose output could not be parsed are
+    not checkpointed and raise a ValueError the same way, so they are retried on the next
+    run instead of being left out of their article.
+
+    Args:
+    articles (Dict[str, str]): Article markdown by article name
+    requirements (Any): Requirements document ({"groups": [...]}) or list of requirements
+    max_workers (int, optional): Concurrent section evaluations across all articles
+    prefilter (bool, optional): Send each section only the requirements that can apply to it
+    checkpoint (Checkpoint, optional): Where finished sections are recorded
+    on_progress (ProgressCallback, optional): Receives "batch_started" and "section" events
+
+    Returns:
+    Dict[str, EvaluationOutput]: Merged evaluation per article name
+    """
+    units = []
+    for name, markdown in articles.items():
+        sections = parse_markdown_to_sections(markdown)
+        selected = requirements_per_section(sections, requirements, prefilter)
+        for i, (section, candidates) in enumerate(zip(sections, selected), start=1):
+            if candidates is not None:
+                key = section_key(section, candidates, i, len(sections))
+                units.append((name, i, len(sections), section, candidates, key))
+
+    done = await checkpoint.load([unit[-1] for unit in units]) if checkpoint else {}
+    # Older checkpoints recorded unparseable sections as None; evaluate those again
+    done = {key: result for key, result in done.items() if result is not None}
+    pending = [unit for unit in units if unit[-1] not in done]
+    logger.info(
+        f"Evaluating {len(pending)} sections of {len(articles)} articles "
+        f"({len(units) - len(pending)} restored from checkpoint)"
+    )
+    emit(
+        on_progress,
+        "batch_started",
+        {"articles": len(articles), "sections": len(units), "restored": len(units) - len(pending)},
+    )
+
+    if max_workers is None:
+        # The batch backend submits every pending section in one batch
+        max_workers = (
+            len(pending) if batch_backend_enabled() else settings.EVALUATION_CONCURRENCY
+        )
+    semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+    async def evaluate(name, i, total_sections, section, candidates, key):
+        async with semaphore:
+            raw_output = await evaluate_section_async(
+                empty_evaluation(), section, candidates, i, total_sections
+            )
+        evaluation = parse_section_output(raw_output, i)
+        result = evaluation.model_dump() if evaluation is not None else None
+        if checkpoint is not None and result is not None:
+            await checkpoint.save(key, result)
+        done[key] = result
+        emit(
+            on_progress,
+            "section",
+            {"article": name, "index": i, "total_sections": total_sections, "evaluation": result},
+        )
+
+    # Let the other sections finish and reach the checkpoint before reporting a failure
+    outcomes = await asyncio.gather(*(evaluate(*unit) for unit in pending), return_exceptions=True)
+    errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if errors:
+        logger.error(f"{len(errors)} of {len(pending)} section evaluations failed")
+        raise errors[0]
+    unparsed = sum(done[unit[-1]] is None for unit in pending)
+    if unparsed:
+        raise ValueError(f"Could not parse the evaluation of {unparsed} of {len(pending)} sections")
+
+    results = {name: [] for name in articles}
+    for name, _, _, _, _, key in units:
+        results[name].append(EvaluationOutput.model_validate(done[key]))
+    return {name: merge_section_evaluations(outputs) for name, outputs in results.items()}
+
+
+async def load_articles(titles: List[str], files: List[str]) -> Dict[str, str]:
+    from prompts.extract.format import convert_wikitext_to_markdown
+    from utils.wikitext import close_client, fetch_pages
+
+    articles = {}
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            articles[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    if titles:
+        try:
+            pages = await fetch_pages(titles)
+        finally:
+            await close_client()
+        for title, page in pages.items():
+            if page is None or not page.content:
+                logger.warning(f"Skipping {title}: page not found")
+                continue
+            articles[title] = convert_wikitext_to_markdown(page.content, page.title)
+    return articles
+
+
+async def load_requirements(request_id: Optional[str], path: Optional[str]) -> Any:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    from config.config import initiate_database
+    from utils.payload_store import find_requirements
+
+    await initiate_database()
+    doc = await find_requirements({"request_id": request_id, "status": "completed"})
+    if doc is None:
+        raise SystemExit(f"Requirements not found for request_id: {request_id}")
+    return doc.requirements
+
+
+async def main(args: argparse.Namespace):
+    requirements = await load_requirements(args.request_id, args.requirements)
+    articles = await load_articles(args.titles, args.files)
+    checkpoint = JsonlCheckpoint(args.checkpoint) if args.checkpoint else None
+
+    evaluations = await evaluate_batch(
+        articles, requirements, max_workers=args.concurrency, checkpoint=checkpoint
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, evaluation in evaluations.items():
+        path = os.path.join(args.output_dir, f"{name.replace('/', '_')}.json")
+        with open(path, "w") as outfile:
+            json.dump(evaluation.model_dump(), outfile, indent=4)
+        logger.info(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Evaluate many articles against one requirements set"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--request-id", help="request_id of stored requirements")
+    source.add_argument("--requirements", help="Path to a requirements JSON file")
+    parser.add_argument("--titles", nargs="*", default=[], help="Wikipedia article titles")
+    parser.add_argument("--files", nargs="*", default=[], help="Article markdown files")
+    parser.add_argument("--checkpoint", help="JSON lines file used to resume the batch")
+    parser.add_argument("--concurrency", type=int, default=settings.EVALUATION_CONCURRENCY)
+    parser.add_argument("--output-dir", default="evaluations")
+    asyncio.run(main(parser.parse_args()))
@@ -1,14 +1,27 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-from openai import OpenAI
-import ell
 import json
-import os
+import logging
 from dotenv import load_dotenv
-import re
+import asyncio
+from config.config import settings
+from utils.applicability import select_requirements
+from utils.cache import get_response_cache, make_cache_key
+from utils.json_output import is_complete_output, parse_json_output
+from utils.llm import get_llm_client
+from utils.openai_batch import batch_backend_enabled, get_batch_collector
+from utils import split
+from utils.progress import ProgressCallback, emit
+from utils.prompt_encoding import current_mode, encode_json, encode_requirements
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+EVALUATION_MODEL = settings.LLM_EVALUATION_MODEL
+# Bump this whenever the evaluation prompt changes so cached responses are not reused
+EVALUATION_PROMPT_VERSION = "3"
+
 
 # Define data models (with indices)
 class RequirementEvaluation(BaseModel):
@@ -48,17 +61,20 @@ class EvaluationOutput(BaseModel):
     sections: List[SectionEvaluation]
     article_evaluation: Optional[ArticleEvaluation]
 
-    def update(self, other: "EvaluationOutput") -> "EvaluationOutput":
-        """Updates the current evaluation with another, merging sections and requirement evaluations."""
-        existing_section_titles = {section.title for section in self.sections}
+    def update(self, other: "EvaluationOutput", by_index: bool = False) -> "EvaluationOutput":
+        """Updates the current evaluation with another, merging sections and requirement evaluations.
+
+        Sections are matched by title, or by index with `by_index`, so that sections sharing a
+        title (e.g. "See also" under two headings) are kept apart.
+        """
+        section_key = (lambda s: s.index) if by_index else (lambda s: s.title)
+        existing_sections = {section_key(section): section for section in self.sections}
         for section in other.sections:
-            if section.title not in existing_section_titles:
+            existing_section = existing_sections.get(section_key(section))
+            if existing_section is None:
                 self.sections.append(section)
             else:
                 # Merge requirement evaluations for the same section
-                existing_section = next(
-                    s for s in self.sections if s.title == section.title
-                )
                 existing_req_ids = {
                     req.requirement_id
                     for req in existing_section.requirement_evaluations
@@ -318,128 +334,325 @@ After completing the evaluation, structure your results using the following JSON
 
 def parse_markdown_to_sections(markdown_content: str) -> List[Dict]:
     """
-    Parse markdown content into sections with indices.
+    Parse markdown content into sections with indices (see utils/split.py).
     Returns a list of dictionaries containing section index, title, and content.
     """
-    sections = []
-    current_section = {"index": 0, "title": "", "content": []}
-    section_counter = 0
-
-    lines = markdown_content.split("\n")
-
-    for line in lines:
-        if line.strip().startswith("#"):
-            if current_section["title"]:
-                sections.append(
-                    {
-                        "index": section_counter,
-                        "title": current_section["title"],
-                        "content": "\n".join(current_section["content"]).strip(),
-                    }
-                )
-            section_counter += 1
-            current_section = {
-                "index": section_counter,
-                "title": line.strip("#").strip(),
-                "content": [],
-            }
-        else:
-            current_section["content"].append(line)
-
-    # Add the last section if it exists
-    if current_section["title"]:
-        sections.append(
-            {
-                "index": section_counter,
-                "title": current_section["title"],
-                "content": "\n".join(current_section["content"]).strip(),
-            }
-        )
-
-    return sections
+    # Sections go into prompts and cache keys as they are, so they carry no level
+    return split.parse_markdown_to_sections(markdown_content, with_level=False)
 
 
 def split_into_sentences(text: str) -> List[Dict]:
     """
-    Split text into sentences with indices using basic rules.
+    Split text into sentences with indices.
     Returns a list of dictionaries containing sentence index and sentence text.
     """
-    sentences = re.split(r"(?<=[.!?])\s+", text)
     return [
-        {"index": idx + 1, "sentence": s.strip()}
-        for idx, s in enumerate(sentences)
-        if s.strip()
+        {"index": idx, "sentence": text[start:end]}
+        for idx, (start, end) in enumerate(split.scan_sentences(text), start=1)
     ]
 
 
-@ell.simple(model="o1-preview", client=OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
-def evaluate_section(
+def build_section_prompt(
     current_state: EvaluationOutput,
     section: Dict,
     requirements: List[Dict],
     i: int,
     total_sections: int,
-):
-    """Evaluate a single section of the article based on the given requirements."""
+) -> str:
+    """Build the evaluation prompt for a single section of the article."""
     # Add sentence-level content to the section with indices
-    if section["content"]:
-        section["sentences"] = split_into_sentences(section["content"])
-    else:
-        section["sentences"] = []
+    section = {
+        **section,
+        "sentences": split_into_sentences(section["content"]) if section["content"] else [],
+    }
 
-    return [
-        ell.user(f"""You are an expert in evaluating article content based on style guide requirements. Your task is to perform a detailed evaluation of the given section, including sentence-level (when applicable) and article-level evaluations, following the multi-step process outlined below.
+    return f"""You are an expert in evaluating article content based on style guide requirements. Your task is to perform a detailed evaluation of the given section, including sentence-level (when applicable) and article-level evaluations, following the multi-step process outlined below.
 
                     {instructions}
 
                     **Current State of Evaluation:**
-                    {current_state.model_dump_json(indent=2)}
+                    {encode_json(current_state)}
 
                     **Section ({i}/{total_sections}, Index: {section['index']}):**
-                    {json.dumps(section, indent=2)}
+                    {encode_json(section)}
 
                     **Requirements:**
-                    {json.dumps(requirements, indent=2)}
+                    {encode_requirements(requirements)}
 
                     **Remember to output only the JSON in the specified format, including the indices, without any additional text.**
-                    """)
-    ]
+                    """
 
 
-def process_article_sections(
-    markdown_content: str, requirements: List[Dict]
-) -> EvaluationOutput:
-    ell.init(store="./logdir", autocommit=True, verbose=True)
+def evaluate_section_llm(
+    current_state: EvaluationOutput,
+    section: Dict,
+    requirements: List[Dict],
+    i: int,
+    total_sections: int,
+) -> str:
+    """Evaluate a single section of the article based on the given requirements."""
+    # Blocking call for the synchronous pipeline; the event loop uses evaluate_section_llm_async
+    return get_llm_client().complete_sync(
+        EVALUATION_MODEL,
+        build_section_prompt(current_state, section, requirements, i, total_sections),
+        EvaluationOutput,
+    )
 
-    # Parse markdown into sections with indices
-    sections = parse_markdown_to_sections(markdown_content)
-    evaluation = EvaluationOutput(
+
+async def evaluate_section_llm_async(
+    current_state: EvaluationOutput,
+    section: Dict,
+    requirements: List[Dict],
+    i: int,
+    total_sections: int,
+) -> str:
+    """Evaluate a single section on the event loop.
+
+    With the batch backend the prompt is queued for the Batch API along with the other
+    sections being evaluated at the same time; otherwise it goes to the async client.
+    """
+    prompt = build_section_prompt(current_state, section, requirements, i, total_sections)
+    if batch_backend_enabled():
+        return await get_batch_collector().complete(EVALUATION_MODEL, prompt, EvaluationOutput)
+    return await get_llm_client().complete(EVALUATION_MODEL, prompt, EvaluationOutput)
+
+
+def evaluate_section(
+    current_state: EvaluationOutput,
+    section: Dict,
+    requirements: List[Dict],
+    i: int,
+    total_sections: int,
+) -> str:
+    """Evaluate a section, serving identical evaluations from the response cache."""
+    cache_key = section_cache_key(current_state, section, requirements, i, total_sections)
+    cached_output = get_response_cache().get(cache_key)
+    if cached_output is not None:
+        return cached_output
+
+    raw_output = evaluate_section_llm(
+        current_state, section, requirements, i, total_sections
+    )
+    cache_section_output(cache_key, raw_output)
+    return raw_output
+
+
+async def evaluate_section_async(
+    current_state: EvaluationOutput,
+    section: Dict,
+    requirements: List[Dict],
+    i: int,
+    total_sections: int,
+) -> str:
+    """Evaluate a section without blocking the event loop (see evaluate_section)."""
+    cache_key = section_cache_key(current_state, section, requirements, i, total_sections)
+    cached_output = await get_response_cache().aget(cache_key)
+    if cached_output is not None:
+        return cached_output
+
+    raw_output = await evaluate_section_llm_async(
+        current_state, section, requirements, i, total_sections
+    )
+    # Only cache complete output, so a bad or truncated response is retried on the next run
+    if is_complete_output(raw_output, EvaluationOutput):
+        await get_response_cache().aset(cache_key, raw_output)
+    return raw_output
+
+
+def section_cache_key(
+    current_state: EvaluationOutput,
+    section: Dict,
+    requirements: List[Dict],
+    i: int,
+    total_sections: int,
+) -> str:
+    return make_cache_key(
+        EVALUATION_MODEL,
+        EVALUATION_PROMPT_VERSION,
+        {
+            "state": current_state.model_dump(),
+            "section": section,
+            "requirements": requirements,
+            "i": i,
+            "total_sections": total_sections,
+            "encoding": current_mode(),
+        },
+    )
+
+
+def cache_section_output(cache_key: str, raw_output: str):
+    # Only cache complete output, so a bad or truncated response is retried on the next run
+    if is_complete_output(raw_output, EvaluationOutput):
+        get_response_cache().set(cache_key, raw_output)
+
+
+def parse_section_output(raw_output: str, i: int) -> Optional[EvaluationOutput]:
+    """Parse the raw model output for a section, returning None if it is not valid JSON."""
+    evaluation = parse_json_output(raw_output, EvaluationOutput)
+    if evaluation is None:
+        logger.warning(f"Error parsing JSON in section {i}")
+        logger.debug(f"Raw output that caused error:\n{raw_output}\n")
+    return evaluation
+
+
+def empty_evaluation() -> EvaluationOutput:
+    return EvaluationOutput(
         sections=[],
         article_evaluation=ArticleEvaluation(
             requirement_evaluations=[], meta_notes=None
         ),
     )
 
+
+def requirements_per_section(
+    sections: List[Dict], requirements: List[Dict], prefilter: Optional[bool] = None
+) -> List[Optional[List[Dict]]]:
+    """Pick the candidate requirements for each section, or None where nothing applies."""
+    if prefilter is None:
+        prefilter = settings.EVALUATION_PREFILTER
+    if not prefilter:
+        return [requirements for _ in sections]
+
+    lead_index = next((s["index"] for s in sections if s["content"]), None)
+    selected = []
+    for section in sections:
+        candidates = select_requirements(
+            requirements, section, is_lead=section["index"] == lead_index
+        )
+        has_candidates = (
+            any(group["requirements"] for group in candidates.get("groups", []))
+            if isinstance(candidates, dict)
+            else bool(candidates)
+        )
+        selected.append(candidates if has_candidates else None)
+    return selected
+
+
+def emit_section_progress(
+    on_progress: Optional[ProgressCallback],
+    i: int,
+    section: Dict,
+    total_sections: int,
+    evaluation: Optional[EvaluationOutput],
+    skipped: bool = False,
+):
+    emit(
+        on_progress,
+        "section",
+        {
+            "index": i,
+            "title": section["title"],
+            "total_sections": total_sections,
+            "skipped": skipped,
+            "evaluation": evaluation.model_dump() if evaluation is not None else None,
+        },
+    )
+
+
+def process_article_sections(
+    markdown_content: str,
+    requirements: List[Dict],
+    prefilter: Optional[bool] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> EvaluationOutput:
+    # Parse markdown into sections with indices
+    sections = parse_markdown_to_sections(markdown_content)
+    section_requirements = requirements_per_section(sections, requirements, prefilter)
+    evaluation = empty_evaluation()
+
     total_sections = len(sections)
+    emit(on_progress, "evaluation_started", {"total_sections": total_sections})
     for i, section in enumerate(sections, start=1):
+        if section_requirements[i - 1] is None:
+            emit_section_progress(on_progress, i, section, total_sections, None, skipped=True)
+            continue
         # Evaluate the current section
         raw_output = evaluate_section(
-            evaluation, section, requirements, i, total_sections
+            evaluation, section, section_requirements[i - 1], i, total_sections
         )
-        # Clean the output (remove any potential backticks)
-        json_output = raw_output.replace("```json", "").replace("```", "").strip()
-        try:
-            # Parse the output into an EvaluationOutput
-            new_evaluation = EvaluationOutput.model_validate_json(json_output)
+        new_evaluation = parse_section_output(raw_output, i)
+        emit_section_progress(on_progress, i, section, total_sections, new_evaluation)
+        if new_evaluation is not None:
             # Update the current state with new evaluations
             evaluation.update(new_evaluation)
-        except Exception as e:
-            print(f"Error parsing JSON in section {i}: {e}")
-            print(f"Raw output:\n{json_output}\n")
 
     return evaluation
 
 
+def merge_section_evaluations(
+    results: List[Optional[EvaluationOutput]],
+) -> EvaluationOutput:
+    """Merge independently produced section evaluations, ordered by section index."""
+    evaluation = empty_evaluation()
+    for new_evaluation in results:
+        if new_evaluation is not None:
+            evaluation.update(new_evaluation, by_index=True)
+    evaluation.sections.sort(key=lambda section: section.index)
+    return evaluation
+
+
+async def process_article_sections_async(
+    markdown_content: str,
+    requirements: List[Dict],
+    max_workers: Optional[int] = None,
+    prefilter: Optional[bool] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> EvaluationOutput:
+    """Evaluate all sections concurrently, with at most `max_workers` evaluations in flight.
+
+    Sections are evaluated independently of each other (each prompt gets an empty current
+    state) and the results are merged by section index once they are all in. Unless
+    `prefilter` is off, each section is only sent the requirements that can apply to it,
+    and sections with none are skipped.
+
+    `on_progress` receives an "evaluation_started" event, then a "section" event with each
+    section's evaluation as it finishes (see utils/progress.py).
+
+    Raises ValueError once all sections are in if the output of any could not be parsed,
+    rather than returning an evaluation with sections missing. Outputs that did parse are in
+    the response cache, so evaluating the article again only repeats the others.
+    """
+    sections = parse_markdown_to_sections(markdown_content)
+    section_requirements = requirements_per_section(sections, requirements, prefilter)
+    total_sections = len(sections)
+    if max_workers is None:
+        # The batch backend submits every section at once instead of a few at a time
+        max_workers = (
+            total_sections if batch_backend_enabled() else settings.EVALUATION_CONCURRENCY
+        )
+    semaphore = asyncio.Semaphore(max(max_workers, 1))
+    emit(on_progress, "evaluation_started", {"total_sections": total_sections})
+
+    async def evaluate(
+        i: int, section: Dict, candidates: List[Dict]
+    ) -> Optional[EvaluationOutput]:
+        async with semaphore:
+            raw_output = await evaluate_section_async(
+                empty_evaluation(), section, candidates, i, total_sections
+            )
+        new_evaluation = parse_section_output(raw_output, i)
+        emit_section_progress(on_progress, i, section, total_sections, new_evaluation)
+        return new_evaluation
+
+    for i, (section, candidates) in enumerate(zip(sections, section_requirements), start=1):
+        if candidates is None:
+            emit_section_progress(on_progress, i, section, total_sections, None, skipped=True)
+
+    results = await asyncio.gather(
+        *(
+            evaluate(i, section, candidates)
+            for i, (section, candidates) in enumerate(
+                zip(sections, section_requirements), start=1
+            )
+            if candidates is not None
+        )
+    )
+    unparsed = sum(result is None for result in results)
+    if unparsed:
+        raise ValueError(f"Could not parse the evaluation of {unparsed} of {len(results)} sections")
+    return merge_section_evaluations(results)
+
+
 if __name__ == "__main__":
     # Load requirements
     with open("backend/prompts/requirements.json") as reqs:
@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 import json
 import re
+from utils.prompt_encoding import encode_json, encode_requirements
 
 
 # Define data models
@@ -195,13 +196,13 @@ def evaluate_section(
 {instructions}
 
 **Current State of Evaluation:**
-{current_state.model_dump_json(indent=2)}
+{encode_json(current_state)}
 
 **Section ({i}/{total_sections}):**
-{json.dumps(section, indent=2)}
+{encode_json(section)}
 
 **Requirements:**
-{json.dumps(requirements, indent=2)}
+{encode_requirements(requirements)}
 
 **Remember to output only the JSON in the specified format, without any additional text.**
 """)
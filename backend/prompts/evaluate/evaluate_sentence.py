@@ -5,6 +5,7 @@ import ell
 import json
 import os
 from dotenv import load_dotenv
+from utils.prompt_encoding import encode_json, encode_requirements
 
 
 load_dotenv()
@@ -296,13 +297,13 @@ def evaluate_section(
                     {instructions}
 
                     **Current State of Evaluation:**
-                    {current_state.model_dump_json(indent=2)}
+                    {encode_json(current_state)}
 
                     **Section ({i}/{total_sections}):**
-                    {json.dumps(section, indent=2)}
+                    {encode_json(section)}
 
                     **Requirements:**
-                    {json.dumps(requirements, indent=2)}
+                    {encode_requirements(requirements)}
 
                     **Remember to output only the JSON in the specified format, without any additional text.**
                     """)
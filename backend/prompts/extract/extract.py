@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, ValidationError
 from typing import List, Dict
 import json
 import re
+from utils.prompt_encoding import encode_requirements
 
 
 class Requirement(BaseModel):
@@ -114,7 +115,7 @@ def extract_requirements_from_chunk(
 10. **Output Only the JSON**: The final response should contain only the JSON structure with all extracted requirements. Do not include any additional text or explanations.
 
 Current State of Requirements Document:
-{current_state.model_dump_json(indent=2)}
+{encode_requirements(current_state.model_dump())}
 
 Chunk ({i}/{total_chunks}):
 {chunk}
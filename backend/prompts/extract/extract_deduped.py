@@ -1,12 +1,18 @@
-from pydantic import BaseModel
-from typing import List, Dict
-import json
+from pydantic import BaseModel, Field
+from typing import Any, List, Dict, Optional, Tuple
+import asyncio
+import hashlib
 import re
-import os
 import logging
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage
 from dotenv import load_dotenv
+from config.config import settings
+from utils.cache import get_response_cache, make_cache_key
+from utils.chunker import chunk_text
+from utils.json_output import is_complete_output, parse_json_output
+from utils.llm import get_llm_client
+from utils.openai_batch import batch_backend_enabled, get_batch_collector
+from utils.progress import ProgressCallback, emit
+from utils.prompt_encoding import current_mode, encode_requirements
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -27,6 +33,14 @@ logger.addHandler(file_handler)
 
 load_dotenv()
 
+EXTRACTION_MODES = ("stateful", "map_reduce")
+
+EXTRACTION_MODEL = settings.LLM_EXTRACTION_MODEL
+TITLE_MODEL = settings.LLM_TITLE_MODEL
+# Bump these whenever the corresponding prompt changes so cached responses are not reused
+EXTRACTION_PROMPT_VERSION = "2"
+TITLE_PROMPT_VERSION = "1"
+
 class Requirement(BaseModel):
     id: str = Field(description="Unique identifier in the format 'R{id}'")
     description: str = Field(description="Brief description of the requirement")
@@ -80,24 +94,22 @@ class RequirementsDocument(BaseModel):
         return self
 
 
-# Define the async function to extract requirements
-async def extract_requirements_from_chunk(
-    current_state: RequirementsDocument, chunk: str, i: int, total_chunks: int
-):
-    """Extract requirements from a chunk of the style guide."""
-    logger.info(f"Processing chunk {i}/{total_chunks}")
-    logger.debug(f"Chunk content length: {len(chunk)} characters")
-    
-    try:
-        # Initialize the ChatOpenAI model
-        chat = ChatOpenAI(
-            model_name="o1-mini",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        logger.debug("ChatOpenAI model initialized")
-        
-        # Create the prompt template
-        prompt = f"""Your task is to extract all requirements from a given style guide chunk and present them in a structured JSON format. Follow the steps below to ensure comprehensive and accurate extraction:
+def build_extraction_prompt(
+    current_state: Optional[RequirementsDocument], chunk: str, i: int, total_chunks: int
+) -> str:
+    """Build the extraction prompt for a chunk.
+
+    When `current_state` is None the prompt carries only the chunk itself, so its size does
+    not depend on how many requirements have been found so far.
+    """
+    state_block = ""
+    if current_state is not None:
+        state_block = f"""Current State of Requirements Document:
+{encode_requirements(current_state.model_dump())}
+
+"""
+
+    return f"""Your task is to extract all requirements from a given style guide chunk and present them in a structured JSON format. Follow the steps below to ensure comprehensive and accurate extraction:
 
 1. **Thoroughly Review the Style Guide Chunk**: Carefully read the provided chunk to understand its scope, target audience, and specific guidelines. TAKE YOUR TIME.
 
@@ -158,39 +170,78 @@ async def extract_requirements_from_chunk(
 
 12. **Output Only the JSON**: The final response should contain only the JSON structure with all extracted requirements. Do not include any additional text or explanations.
 
-Current State of Requirements Document:
-{current_state.model_dump_json(indent=2)}
-
-Chunk ({i}/{total_chunks}):
+{state_block}Chunk ({i}/{total_chunks}):
 {chunk}
 
 Do not include any explanations or text outside of the JSON output."""
 
-        messages = [HumanMessage(content=prompt)]
-        logger.debug("Sending request to OpenAI API")
-        
-        # Make the async call to the model
-        response = await chat.agenerate([messages])
-        logger.debug("Received response from OpenAI API")
-        
-        return response.generations[0][0].text
+# Define the async function to extract requirements
+async def extract_requirements_from_chunk(
+    current_state: Optional[RequirementsDocument], chunk: str, i: int, total_chunks: int
+):
+    """Extract requirements from a chunk of the style guide."""
+    logger.info(f"Processing chunk {i}/{total_chunks}")
+    logger.debug(f"Chunk content length: {len(chunk)} characters")
+
+    cache = get_response_cache()
+    cache_key = make_cache_key(
+        EXTRACTION_MODEL,
+        EXTRACTION_PROMPT_VERSION,
+        {
+            "state": current_state.model_dump() if current_state is not None else None,
+            "chunk": chunk,
+            "i": i,
+            "total_chunks": total_chunks,
+            "encoding": current_mode(),
+        },
+    )
+    cached_output = await cache.aget(cache_key)
+    if cached_output is not None:
+        logger.debug(f"Using cached response for chunk {i}/{total_chunks}")
+        return cached_output
+    
+    try:
+        # Create the prompt template
+        prompt = build_extraction_prompt(current_state, chunk, i, total_chunks)
+
+        if batch_backend_enabled():
+            logger.debug(f"Queueing chunk {i}/{total_chunks} for the Batch API")
+            output = await get_batch_collector().complete(
+                EXTRACTION_MODEL, prompt, RequirementsDocument
+            )
+        else:
+            logger.debug("Sending request to OpenAI API")
+            output = await get_llm_client().complete(
+                EXTRACTION_MODEL, prompt, RequirementsDocument
+            )
+            logger.debug("Received response from OpenAI API")
+        # Only cache complete output, so a bad or truncated response is retried on the next run
+        if is_complete_output(output, RequirementsDocument):
+            await cache.aset(cache_key, output)
+        else:
+            logger.debug(f"Not caching incomplete response for chunk {i}/{total_chunks}")
+
+        return output
     except Exception as e:
         logger.error(f"Error in extract_requirements_from_chunk: {str(e)}", exc_info=True)
         raise
 
 async def get_title(text: str) -> str:
-    try:        
-        chat = ChatOpenAI(
-            model_name="o1-mini",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        messages = [HumanMessage(content="Given the following text, return the title of the article. Do not include any explanations or text outside of the title. " + text)]
+    cache = get_response_cache()
+    cache_key = make_cache_key(TITLE_MODEL, TITLE_PROMPT_VERSION, text)
+    cached_title = await cache.aget(cache_key)
+    if cached_title is not None:
+        logger.debug("Using cached title")
+        return cached_title
+
+    try:
+        prompt = "Given the following text, return the title of the article. Do not include any explanations or text outside of the title. " + text
         logger.debug("Sending request to OpenAI API")
-        
-        # Make the async call to the model
-        response = await chat.agenerate([messages])
+        title = await get_llm_client().complete(TITLE_MODEL, prompt)
         logger.debug("Received response from OpenAI API")
-        return response.generations[0][0].text
+
+        await cache.aset(cache_key, title)
+        return title
     
     except Exception as e:
         logger.error(f"Error in get_title: {str(e)}", exc_info=True)
@@ -198,24 +249,12 @@ async def get_title(text: str) -> str:
     
 
 # Function to split the text into manageable chunks
-def split_content(requirements_text: str, max_chunk_size=6000) -> List[str]:
-    """Split the style guide text into chunks not exceeding max_chunk_size."""
-    logger.info(f"Splitting content with max chunk size: {max_chunk_size}")
+def split_content(requirements_text: str, max_tokens: Optional[int] = None) -> List[str]:
+    """Split the style guide into token-budgeted chunks along its headings (see utils/chunker.py)."""
     logger.debug(f"Input text length: {len(requirements_text)} characters")
-    
+
     try:
-        paragraphs = re.split(r"\n\s*\n", requirements_text)
-        chunks = []
-        current_chunk = ""
-        for para in paragraphs:
-            if len(current_chunk) + len(para) + 2 <= max_chunk_size:
-                current_chunk += para + "\n\n"
-            else:
-                chunks.append(current_chunk.strip())
-                current_chunk = para + "\n\n"
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-            
+        chunks = chunk_text(requirements_text, max_tokens=max_tokens, model=EXTRACTION_MODEL)
         logger.info(f"Content split into {len(chunks)} chunks")
         logger.debug(f"Chunk sizes: {[len(chunk) for chunk in chunks]}")
         return chunks
@@ -223,48 +262,269 @@ def split_content(requirements_text: str, max_chunk_size=6000) -> List[str]:
         logger.error(f"Error in split_content: {str(e)}", exc_info=True)
         raise
 
+def parse_chunk_output(raw_output: str, i: int) -> Optional[RequirementsDocument]:
+    """Parse the raw model output for a chunk, returning None if it is not valid JSON."""
+    logger.debug(f"Raw output length from chunk {i}: {len(raw_output)}")
+
+    logger.debug(f"Attempting to parse JSON output from chunk {i}")
+    new_requirements = parse_json_output(raw_output, RequirementsDocument)
+    if new_requirements is None:
+        logger.error(f"Error parsing JSON in chunk {i}")
+        logger.debug(f"Raw output that caused error:\n{raw_output}\n")
+        return None
+    logger.debug(f"Successfully parsed JSON from chunk {i}")
+    return new_requirements
+
+
+def normalize_key(text: str) -> str:
+    """Normalize free text so trivially different wordings compare equal."""
+    text = re.sub(r"[*_`\"']", "", text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def reduce_requirements(
+    documents: List[Optional[RequirementsDocument]],
+) -> RequirementsDocument:
+    """Merge independently extracted chunk documents into one, dropping duplicates.
+
+    Groups are matched on their normalized category and requirements on their normalized
+    description or reference. The first occurrence wins, so the result follows chunk order.
+    """
+    reduced = RequirementsDocument()
+    groups: Dict[str, Group] = {}
+    seen: set = set()
+
+    for document in documents:
+        if document is None:
+            continue
+        for group in document.groups:
+            group_key = normalize_key(group.category)
+            if group_key not in groups:
+                groups[group_key] = Group(
+                    description=group.description, category=group.category
+                )
+                reduced.groups.append(groups[group_key])
+            target = groups[group_key]
+            if not target.description and group.description:
+                target.description = group.description
+
+            for req in group.requirements:
+                keys = {("description", normalize_key(req.description))}
+                if req.reference.strip():
+                    keys.add(("reference", normalize_key(req.reference)))
+                if keys & seen:
+                    continue
+                seen.update(keys)
+                target.requirements.append(req)
+
+    return reduced
+
+
+def hash_chunk(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def chunk_record(chunk: str, document: Optional[RequirementsDocument]) -> Dict[str, Any]:
+    """Snapshot a chunk's extraction result so it can be reused when the chunk is unchanged."""
+    return {
+        "hash": hash_chunk(chunk),
+        "requirements": document.model_dump() if document is not None else None,
+    }
+
+
+def emit_chunk_progress(
+    on_progress: Optional[ProgressCallback],
+    i: int,
+    total_chunks: int,
+    document: Optional[RequirementsDocument],
+    reused: bool = False,
+):
+    emit(
+        on_progress,
+        "chunk",
+        {
+            "index": i,
+            "total_chunks": total_chunks,
+            "reused": reused,
+            "requirements": document.model_dump() if document is not None else None,
+        },
+    )
+
+
+async def extract_chunks_concurrently(
+    chunks: List[str],
+    concurrency: int,
+    stateless: bool = False,
+    positions: Optional[List[int]] = None,
+    total_chunks: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Optional[RequirementsDocument]]:
+    """Extract requirements from all chunks at once, with at most `concurrency` calls in flight.
+
+    Chunks cannot see each other's results, so every chunk is extracted against an empty
+    state, or with no state block at all when `stateless` is set. Results are returned in
+    chunk order so they can be merged deterministically. `positions` and `total_chunks`
+    place a subset of chunks within the full document. A "chunk" progress event is
+    reported as each chunk finishes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if positions is None:
+        positions = list(range(1, len(chunks) + 1))
+    if total_chunks is None:
+        total_chunks = len(chunks)
+
+    async def extract(i: int, chunk: str) -> Optional[RequirementsDocument]:
+        async with semaphore:
+            raw_output = await extract_requirements_from_chunk(
+                None if stateless else RequirementsDocument(), chunk, i, total_chunks
+            )
+        document = parse_chunk_output(raw_output, i)
+        emit_chunk_progress(on_progress, i, total_chunks, document)
+        return document
+
+    return await asyncio.gather(
+        *(extract(i, chunk) for i, chunk in zip(positions, chunks))
+    )
+
+
+async def reextract_chunks(
+    chunks: List[str],
+    previous_chunks: List[Dict[str, Any]],
+    concurrency: int,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Optional[RequirementsDocument]]:
+    """Reuse stored results for unchanged chunks and extract only new or modified ones."""
+    previous = {
+        record["hash"]: record["requirements"]
+        for record in previous_chunks
+        if record.get("requirements") is not None
+    }
+    results: List[Optional[RequirementsDocument]] = [
+        RequirementsDocument.model_validate(previous[hash_chunk(chunk)])
+        if hash_chunk(chunk) in previous
+        else None
+        for chunk in chunks
+    ]
+    changed = [index for index, result in enumerate(results) if result is None]
+    logger.info(f"Re-extracting {len(changed)}/{len(chunks)} new or modified chunks")
+    for index, result in enumerate(results):
+        if result is not None:
+            emit_chunk_progress(on_progress, index + 1, len(chunks), result, reused=True)
+
+    extracted = await extract_chunks_concurrently(
+        [chunks[index] for index in changed],
+        max(concurrency, 1),
+        stateless=True,
+        positions=[index + 1 for index in changed],
+        total_chunks=len(chunks),
+        on_progress=on_progress,
+    )
+    for index, document in zip(changed, extracted):
+        results[index] = document
+    return results
+
+
 # Main function to process the text and extract requirements
-async def process_requirements(requirements_text: str) -> RequirementsDocument:
+async def process_requirements(
+    requirements_text: str,
+    concurrency: Optional[int] = None,
+    mode: Optional[str] = None,
+    previous_chunks: Optional[List[Dict[str, Any]]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+    """Extract a requirements document from a style guide.
+
+    `mode` is either "stateful", where each chunk prompt carries the requirements found so
+    far, or "map_reduce", where chunks are extracted independently (map) and combined by a
+    local merge/dedupe pass (reduce).
+
+    Passing the `chunks` records of an earlier extraction re-extracts incrementally: only
+    chunks whose content hash is not among them are sent to the model, and the results are
+    reduced together with the stored ones.
+
+    `on_progress` receives an "extraction_started" event, then a "chunk" event with the
+    requirements found in each chunk as it is merged (see utils/progress.py).
+
+    With the batch backend (LLM_BACKEND="batch") extraction always uses "map_reduce", and
+    all chunks are submitted together as one Batch API job.
+
+    Returns the title, the requirements document and the per-chunk records to store.
+    """
     logger.info("Starting requirements processing")
     logger.debug(f"Input text length: {len(requirements_text)} characters")
-    
+
+    if concurrency is None:
+        concurrency = settings.EXTRACTION_CONCURRENCY
+    if mode is None:
+        mode = settings.EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+    if batch_backend_enabled() and mode == "stateful":
+        # Each stateful chunk waits for the one before it, i.e. one batch per chunk
+        logger.info("Using map_reduce extraction with the batch backend")
+        mode = "map_reduce"
+
     try:
         title = await get_title(requirements_text)
         
         chunks = split_content(requirements_text)
+        if batch_backend_enabled():
+            # Submit every chunk in one batch rather than `concurrency` at a time
+            concurrency = max(concurrency, len(chunks))
         current_state = RequirementsDocument()
         total_chunks = len(chunks)
         logger.info(f"Processing {total_chunks} chunks")
-        
-        for i, chunk in enumerate(chunks, start=1):
-            logger.info(f"Processing chunk {i}/{total_chunks}")
-            
-            # Extract requirements from the current chunk
-            raw_output = await extract_requirements_from_chunk(
-                current_state, chunk, i, total_chunks
+        emit(
+            on_progress,
+            "extraction_started",
+            {"title": title, "total_chunks": total_chunks, "mode": mode},
+        )
+
+        if previous_chunks is not None:
+            results = await reextract_chunks(chunks, previous_chunks, concurrency, on_progress)
+            chunk_records = [chunk_record(c, r) for c, r in zip(chunks, results)]
+            logger.info("Reducing chunk results")
+            current_state = reduce_requirements(results)
+        elif mode == "map_reduce":
+            logger.info(f"Extracting chunks independently (concurrency={concurrency})")
+            results = await extract_chunks_concurrently(
+                chunks, max(concurrency, 1), stateless=True, on_progress=on_progress
+            )
+            chunk_records = [chunk_record(c, r) for c, r in zip(chunks, results)]
+            logger.info("Reducing chunk results")
+            current_state = reduce_requirements(results)
+        elif concurrency > 1:
+            logger.info(f"Extracting chunks concurrently (concurrency={concurrency})")
+            results = await extract_chunks_concurrently(
+                chunks, concurrency, on_progress=on_progress
             )
-            logger.debug(f"Raw output length from chunk {i}: {len(raw_output)}")
-            
-            # Clean the output (remove any potential backticks)
-            json_output = raw_output.replace("```json", "").replace("```", "").strip()
-            
-            try:
-                # Parse the output into a RequirementsDocument
-                logger.debug(f"Attempting to parse JSON output from chunk {i}")
-                new_requirements = RequirementsDocument.model_validate_json(json_output)
-                logger.debug(f"Successfully parsed JSON from chunk {i}")
-                
-                # Update the current state with new requirements
-                logger.debug(f"Updating current state with requirements from chunk {i}")
-                current_state.update(new_requirements)
-                logger.debug(f"Current state updated with chunk {i}")
-                
-            except (json.JSONDecodeError, ValidationError) as e:
-                logger.error(f"Error parsing JSON in chunk {i}: {e}")
-                logger.debug(f"Raw output that caused error:\n{json_output}\n")
-            except Exception as e:
-                logger.error(f"Unexpected error in chunk {i}: {e}", exc_info=True)
-                logger.debug(f"Raw output that caused error:\n{json_output}\n")
+            chunk_records = [chunk_record(c, r) for c, r in zip(chunks, results)]
+
+            # Merge in chunk order so the output does not depend on completion order
+            for i, new_requirements in enumerate(results, start=1):
+                if new_requirements is not None:
+                    logger.debug(f"Updating current state with requirements from chunk {i}")
+                    current_state.update(new_requirements)
+        else:
+            chunk_records = []
+            for i, chunk in enumerate(chunks, start=1):
+                logger.info(f"Processing chunk {i}/{total_chunks}")
+
+                # Extract requirements from the current chunk
+                raw_output = await extract_requirements_from_chunk(
+                    current_state, chunk, i, total_chunks
+                )
+
+                new_requirements = parse_chunk_output(raw_output, i)
+                # Snapshot before merging, since update() shares objects with the state
+                chunk_records.append(chunk_record(chunk, new_requirements))
+                emit_chunk_progress(on_progress, i, total_chunks, new_requirements)
+                if new_requirements is not None:
+                    # Update the current state with new requirements
+                    logger.debug(f"Updating current state with requirements from chunk {i}")
+                    current_state.update(new_requirements)
+                    logger.debug(f"Current state updated with chunk {i}")
 
         # After processing all chunks, renumber the requirements sequentially
         logger.info("Renumbering requirements")
@@ -275,7 +535,7 @@ async def process_requirements(requirements_text: str) -> RequirementsDocument:
                 requirement_counter += 1
         
         logger.info(f"Requirements processing complete. Total requirements: {requirement_counter - 1}")
-        return title, current_state.model_dump()
+        return title, current_state.model_dump(), chunk_records
         
     except Exception as e:
         logger.error("Error in process_requirements", exc_info=True)
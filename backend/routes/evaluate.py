@@ -1,52 +1,422 @@
-# from fastapi import APIRouter, Body, HTTPException
-# from pydantic import BaseModel, HttpUrl
+import logging
+import uuid
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+from config.config import settings
+from database.database import *
+from models.evaluation import Evaluation
+from models.job import Job
+from models.requirements import RequirementsDocument
+from prompts.evaluate import evaluate_batch, evaluate_index
+from prompts.extract.format import convert_wikitext_to_markdown
+from utils.jobs import enqueue_job, register_handler
+from utils.payload_store import find_requirements
+from utils.progress import JobProgress
+from utils.scoring import summarize_evaluation
+from utils.ttl_cache import TTLCache
+from utils.wikitext import (
+    fetch_revision,
+    fetch_revision_contents,
+    fetch_revisions,
+    title_from_url,
+)
 
-# from utils.wikitext import fetch_wikitext
-# from database.database import *
-# from schemas.student import Response
-# from prompts.evaluate_section import process_article_sections
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
-# router = APIRouter()
+router = APIRouter()
 
+# (requirements_id, limit, completed evaluations) -> response (see get_scoreboard)
+_scoreboard_cache = TTLCache(
+    max_entries=settings.SCOREBOARD_CACHE_MAX_ENTRIES, ttl=settings.SCOREBOARD_CACHE_SECONDS
+)
 
-# class EvaluateInput(BaseModel):
-#     text_input: Union[HttpUrl, str]
-#     requirements_id: str
 
+class EvaluateInput(BaseModel):
+    # A Wikipedia article URL or title, or the article itself as markdown
+    url: Optional[str] = None
+    content: Optional[str] = None
+    title: Optional[str] = None
+    requirements_id: str
+    priority: int = 0
 
-# @router.post("/evaluate", response_model=Response)
-# async def evaluate_text(data: EvaluateInput):
-#     try:
-#         article_content = None
 
-#         if str(data.text_input).startswith(("http://", "https://")):
-#             article_content = fetch_wikitext(data.content)
-#         else:
-#             article_content = data.content
+class BatchEvaluateInput(BaseModel):
+    # Wikipedia article URLs or titles
+    titles: List[str]
+    requirements_id: str
+    priority: int = 0
 
-#         requirements = await retrieve_requirements_from_db(data.requirements_id)
-#         evaluation_output = process_article_sections(article_content, requirements)
-#         saved_evaluation = await save_evaluation_to_db(evaluation_output)
 
-#         return {
-#             "status_code": 200,
-#             "response_type": "success",
-#             "description": "Article evaluated successfully",
-#             "data": saved_evaluation,
-#         }
+def evaluation_prompt_version() -> str:
+    return f"{evaluate_index.EVALUATION_MODEL}/{evaluate_index.EVALUATION_PROMPT_VERSION}"
 
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_or_create_evaluation(key: Dict[str, str], **fields) -> Tuple[Evaluation, bool]:
+    """
+    Return the stored evaluation for `key`, inserting a queued one if there is none.
 
-# async def retrieve_requirements_from_db(requirements_guide_id: str):
-#     print(f"Retrieving requirements for guide ID: {requirements_guide_id}")
-#     return {"status": "success", "data": {"requirements": "Sample requirements data"}}
+    Args:
+    key (Dict[str, str]): article_key, requirements_request_id and prompt_version
+    **fields: Other Evaluation fields, used only when inserting
 
+    Returns:
+    Tuple[Evaluation, bool]: The evaluation, and whether this call created it
+    """
+    evaluation = await Evaluation.find_one(key)
+    if evaluation is not None:
+        return evaluation, False
+    evaluation = Evaluation(evaluation_id=str(uuid.uuid4()), **fields, **key)
+    try:
+        await evaluation.insert()
+        return evaluation, True
+    except DuplicateKeyError:
+        # A concurrent request created it first
+        return await Evaluation.find_one(key), False
 
-# async def save_evaluation_to_db(evaluation_output):
-#     print("Saving evaluation output to the database...")
-#     return {
-#         "status": "success",
-#         "data": {"message": "Placeholder for saved evaluation data"},
-#     }
+
+async def requirements_or_404(requirements_id: str) -> RequirementsDocument:
+    requirements_doc = await RequirementsDocument.find_one(
+        {"request_id": requirements_id, "status": "completed"}
+    )
+    if not requirements_doc:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Requirements not found for request_id: {requirements_id}"
+        )
+    return requirements_doc
+
+
+def evaluation_response(evaluation: Evaluation, status_code: int, description: str) -> Dict[str, Any]:
+    return {
+        "status_code": status_code,
+        "response_type": "success",
+        "description": description,
+        "data": {
+            "evaluation_id": evaluation.evaluation_id,
+            "status": evaluation.status,
+        },
+    }
+
+
+@router.post("/evaluate")
+async def evaluate_article(data: EvaluateInput):
+    """Evaluate an article against an extracted requirements set.
+
+    Results are stored per (article revision, requirements set, prompt version): asking for
+    an evaluation that already exists returns it without calling the model again, and one
+    that is already queued or running is shared.
+    """
+    try:
+        if not data.url and not data.content:
+            raise HTTPException(status_code=422, detail="Either url or content must be provided")
+
+        await requirements_or_404(data.requirements_id)
+
+        revid = None
+        if data.url:
+            revid = await fetch_revision(data.url)
+            if revid is None:
+                raise HTTPException(status_code=404, detail=f"Article not found: {data.url}")
+            article_key = f"revid:{revid}"
+        else:
+            article_key = f"sha256:{hashlib.sha256(data.content.encode('utf-8')).hexdigest()}"
+
+        key = {
+            "article_key": article_key,
+            "requirements_request_id": data.requirements_id,
+            "prompt_version": evaluation_prompt_version(),
+        }
+        evaluation, _ = await get_or_create_evaluation(
+            key,
+            article_title=data.title or (title_from_url(data.url) if data.url else None),
+            article_url=data.url,
+            revid=revid,
+            content=data.content if not data.url else None,
+        )
+        if evaluation.status == "completed":
+            logger.info(f"Found stored evaluation {evaluation.evaluation_id} for {key}")
+            return evaluation_response(evaluation, 200, "Retrieved existing evaluation")
+        if evaluation.status == "error":
+            # Retry a failed evaluation under the same id
+            await evaluation.set({"status": "queued", "error": None})
+
+        job = await enqueue_job(
+            "evaluate",
+            {"evaluation_id": evaluation.evaluation_id},
+            job_id=f"evaluate-{evaluation.evaluation_id}-{uuid.uuid4().hex[:8]}",
+            priority=data.priority,
+            dedupe_key=f"evaluate:{evaluation.evaluation_id}",
+        )
+        logger.info(f"Evaluation {evaluation.evaluation_id} queued as job {job.job_id}")
+        response = evaluation_response(evaluation, 202, "Request accepted for processing")
+        response["data"]["job_id"] = job.job_id
+        return response
+
+    except HTTPException as he:
+        logger.error(f"HTTP error in request: {str(he)}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/evaluate/batch")
+async def evaluate_articles(data: BatchEvaluateInput):
+    """Evaluate many Wikipedia articles against one requirements set in a single job.
+
+    The sections of all articles share one pool of EVALUATION_CONCURRENCY model calls, and
+    finished sections are checkpointed, so a batch interrupted by a worker crash resumes
+    where it stopped. Articles with a stored evaluation are not evaluated again.
+    """
+    try:
+        if not data.titles:
+            raise HTTPException(status_code=422, detail="At least one title must be provided")
+        await requirements_or_404(data.requirements_id)
+
+        urls = {title_from_url(url): url for url in data.titles}
+        revisions = await fetch_revisions(list(urls))
+        prompt_version = evaluation_prompt_version()
+
+        evaluations = {}
+        for title, revid in revisions.items():
+            if revid is None:
+                continue
+            evaluation, _ = await get_or_create_evaluation(
+                {
+                    "article_key": f"revid:{revid}",
+                    "requirements_request_id": data.requirements_id,
+                    "prompt_version": prompt_version,
+                },
+                article_title=title,
+                article_url=urls[title],
+                revid=revid,
+            )
+            if evaluation.status == "error":
+                await evaluation.set({"status": "queued", "error": None})
+            evaluations[title] = evaluation
+
+        pending = sorted(
+            evaluation.evaluation_id
+            for evaluation in evaluations.values()
+            if evaluation.status != "completed"
+        )
+        response = {
+            "status_code": 202 if pending else 200,
+            "response_type": "success",
+            "description": (
+                "Request accepted for processing" if pending else "Retrieved existing evaluations"
+            ),
+            "data": {
+                "evaluations": [
+                    {
+                        "title": title,
+                        "evaluation_id": evaluation.evaluation_id,
+                        "status": evaluation.status,
+                    }
+                    for title, evaluation in evaluations.items()
+                ],
+                "missing": [title for title, revid in revisions.items() if revid is None],
+            },
+        }
+        if pending:
+            batch_key = "|".join(pending)
+            job = await enqueue_job(
+                "evaluate_batch",
+                {"evaluation_ids": pending, "requirements_id": data.requirements_id},
+                job_id=f"evaluate-batch-{uuid.uuid4().hex}",
+                priority=data.priority,
+                dedupe_key=f"evaluate_batch:{hashlib.sha256(batch_key.encode('utf-8')).hexdigest()}",
+            )
+            logger.info(f"{len(pending)} evaluations queued as job {job.job_id}")
+            response["data"]["job_id"] = job.job_id
+        return response
+
+    except HTTPException as he:
+        logger.error(f"HTTP error in request: {str(he)}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/evaluations/{evaluation_id}")
+async def get_evaluation(evaluation_id: str):
+    evaluation = await Evaluation.find_one({"evaluation_id": evaluation_id})
+    if not evaluation:
+        raise HTTPException(status_code=404, detail=f"Evaluation not found: {evaluation_id}")
+    return {
+        "status": "success",
+        "data": evaluation.model_dump(exclude={"id", "content"}),
+    }
+
+
+@router.get("/scoreboard")
+async def get_scoreboard(requirements_id: str, limit: int = Query(50, ge=1, le=500)):
+    """Articles evaluated against a requirements set, best score first.
+
+    Scores are summarized when an evaluation is saved, so this only reads the stored
+    summaries; responses are additionally cached for SCOREBOARD_CACHE_SECONDS, or until
+    another evaluation against the set is saved.
+    """
+    # Evaluations are saved by worker processes, which cannot reach this process's cache.
+    # Completed evaluations are never removed, so their count (answered from the scoreboard
+    # index) changes whenever a worker saves one, and a new count misses the cache.
+    completed = await Evaluation.find(
+        {"requirements_request_id": requirements_id, "status": "completed"}
+    ).count()
+    cache_key = (requirements_id, limit, completed)
+    cached = _scoreboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    rows = await Evaluation.get_motor_collection().find(
+        {"requirements_request_id": requirements_id, "status": "completed"},
+        {
+            "evaluation_id": True,
+            "article_title": True,
+            "article_url": True,
+            "revid": True,
+            "summary.score": True,
+            "summary.scored": True,
+            "completed_at": True,
+        },
+        sort=[("summary.score", -1)],
+        limit=limit,
+    ).to_list(limit)
+
+    response = {
+        "status": "success",
+        "requirements_id": requirements_id,
+        "data": [
+            {
+                "evaluation_id": row["evaluation_id"],
+                "article_title": row.get("article_title"),
+                "article_url": row.get("article_url"),
+                "revid": row.get("revid"),
+                "score": (row.get("summary") or {}).get("score"),
+                "scored": (row.get("summary") or {}).get("scored"),
+                "completed_at": row.get("completed_at"),
+            }
+            for row in rows
+        ],
+    }
+    # Entries for earlier counts can never be hit again
+    _scoreboard_cache.discard(lambda key: key[:2] == (requirements_id, limit))
+    _scoreboard_cache.set(cache_key, response)
+    return response
+
+
+async def articles_markdown(evaluations: List[Evaluation]) -> Dict[str, str]:
+    """Return the article markdown of each evaluation by evaluation_id, fetching pages in bulk.
+
+    Articles are fetched at the revision the evaluation was requested for, which is the
+    revision its stored result is keyed by, even if the page has been edited since.
+    """
+    revids = [evaluation.revid for evaluation in evaluations if evaluation.content is None]
+    pages = await fetch_revision_contents(revids) if revids else {}
+
+    markdown = {}
+    for evaluation in evaluations:
+        if evaluation.content is not None:
+            markdown[evaluation.evaluation_id] = evaluation.content
+            continue
+        page = pages.get(evaluation.revid)
+        if not page or not page.content:
+            raise ValueError(
+                f"No content retrieved for {evaluation.article_url} (revid {evaluation.revid})"
+            )
+        markdown[evaluation.evaluation_id] = convert_wikitext_to_markdown(page.content, page.title)
+    return markdown
+
+
+async def article_markdown(evaluation: Evaluation) -> str:
+    return (await articles_markdown([evaluation]))[evaluation.evaluation_id]
+
+
+async def load_requirements(requirements_id: str) -> Any:
+    requirements_doc = await find_requirements({"request_id": requirements_id})
+    if requirements_doc is None:
+        raise ValueError(f"Requirements not found: {requirements_id}")
+    return requirements_doc.requirements
+
+
+async def save_evaluation_result(evaluation: Evaluation, result: Dict[str, Any]):
+    await evaluation.set(
+        {
+            "status": "completed",
+            "result": result,
+            "summary": summarize_evaluation(result),
+            "completed_at": datetime.utcnow(),
+        }
+    )
+    logger.info(f"Saved evaluation {evaluation.evaluation_id}")
+
+
+async def run_evaluation_job(job: Job):
+    """Worker entry point for queued "evaluate" jobs."""
+    evaluation = await Evaluation.find_one({"evaluation_id": job.payload["evaluation_id"]})
+    if evaluation is None:
+        raise ValueError(f"Evaluation not found: {job.payload['evaluation_id']}")
+    if evaluation.status == "completed":
+        return
+
+    requirements = await load_requirements(evaluation.requirements_request_id)
+    markdown = await article_markdown(evaluation)
+
+    progress = JobProgress(job.job_id)
+    try:
+        result = await evaluate_index.process_article_sections_async(
+            markdown, requirements, on_progress=progress
+        )
+    finally:
+        await progress.aclose()
+
+    await save_evaluation_result(evaluation, result.model_dump())
+
+
+async def on_evaluation_failed(job: Job, error: str):
+    evaluation = await Evaluation.find_one({"evaluation_id": job.payload["evaluation_id"]})
+    if evaluation is not None:
+        await evaluation.set({"status": "error", "error": error})
+
+
+async def run_batch_evaluation_job(job: Job):
+    """Worker entry point for queued "evaluate_batch" jobs."""
+    evaluations = await Evaluation.find(
+        {"evaluation_id": {"$in": job.payload["evaluation_ids"]}}
+    ).to_list()
+    pending = [evaluation for evaluation in evaluations if evaluation.status != "completed"]
+    if not pending:
+        return
+
+    requirements = await load_requirements(job.payload["requirements_id"])
+    articles = await articles_markdown(pending)
+
+    progress = JobProgress(job.job_id)
+    try:
+        results = await evaluate_batch.evaluate_batch(
+            articles,
+            requirements,
+            checkpoint=evaluate_batch.StoredCheckpoint(),
+            on_progress=progress,
+        )
+    finally:
+        await progress.aclose()
+
+    for evaluation in pending:
+        await save_evaluation_result(evaluation, results[evaluation.evaluation_id].model_dump())
+
+
+async def on_batch_evaluation_failed(job: Job, error: str):
+    await Evaluation.find(
+        {"evaluation_id": {"$in": job.payload["evaluation_ids"]}, "status": {"$ne": "completed"}}
+    ).update({"$set": {"status": "error", "error": error}})
+
+
+register_handler("evaluate", run_evaluation_job, on_failure=on_evaluation_failed)
+register_handler("evaluate_batch", run_batch_evaluation_job, on_failure=on_batch_evaluation_failed)
@@ -1,12 +1,17 @@
 import logging
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from database.database import *
 from prompts.extract.extract_deduped import process_requirements
-from prompts.extract.format import convert_wikitext
-from utils.wikitext import fetch_wikitext
+from utils.jobs import enqueue_job, register_handler
+from utils.payload_store import load_payload, offload_payload
+from utils.progress import JobProgress, ProgressCallback
+from utils.singleflight import SingleFlight
+from utils.wikitext import fetch_page, fetch_revision, title_from_url
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from models.job import Job
 from models.requirements import RequirementsDocument
+import hashlib
 import uuid
 
 # Configure logging
@@ -22,10 +27,17 @@ logger.addHandler(console_handler)
 
 router = APIRouter()
 
+# Coalesces identical submissions handled by this process
+single_flight = SingleFlight()
+
 
 class StyleGuideInput(BaseModel):
     content: Optional[str] = None
     url: Optional[str] = None
+    # Re-extract incrementally against an earlier extraction of the same guide
+    previous_request_id: Optional[str] = None
+    # Queued jobs with a higher priority are picked up by the workers first
+    priority: int = 0
 
     @property
     def input_content(self) -> str:
@@ -41,7 +53,7 @@ class StyleGuideInput(BaseModel):
 
 
 @router.post("/extract")
-async def extract_requirements(data: StyleGuideInput, background_tasks: BackgroundTasks):
+async def extract_requirements(data: StyleGuideInput):
     try:
         # Validate input
         try:
@@ -52,36 +64,23 @@ async def extract_requirements(data: StyleGuideInput, background_tasks: Backgrou
                 detail=str(e)
             )
 
-        # Check if it's a URL
-        if data.is_url:
-            # Check if we already have this URL in the database
-            existing_doc = await RequirementsDocument.find_one({"url": content})
-            if existing_doc:
-                logger.info(f"Found existing requirements for URL: {content}")
-                return {
-                    "status_code": 200,
-                    "response_type": "success",
-                    "description": "Retrieved existing requirements",
-                    "data": {
-                        "request_id": existing_doc.request_id
-                    },
-                }
-
-        # Generate UUID for new request
-        request_id = str(uuid.uuid4())
-        
-        # Add the processing task to background tasks
-        background_tasks.add_task(process_and_save_requirements, data, request_id)
-        
-        logger.info(f"Request accepted for processing with request_id: {request_id}")
-        return {
-            "status_code": 202,
-            "response_type": "success",
-            "description": "Request accepted for processing",
-            "data": {
-                "request_id": request_id
-            },
-        }
+        previous_request_id = None
+        if data.previous_request_id:
+            previous_doc = await RequirementsDocument.find_one(
+                {"request_id": data.previous_request_id}
+            )
+            if not previous_doc:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Requirements not found for request_id: {data.previous_request_id}"
+                )
+            previous_request_id = previous_doc.request_id
+
+        # Concurrent submissions of the same guide share one lookup and one job
+        return await single_flight.do(
+            extraction_dedupe_key(data),
+            lambda: submit_extraction(data, previous_request_id),
+        )
     except HTTPException as he:
         logger.error(f"HTTP error in request: {str(he)}")
         raise he
@@ -89,51 +88,168 @@ async def extract_requirements(data: StyleGuideInput, background_tasks: Backgrou
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_and_save_requirements(data: StyleGuideInput, request_id: str):
+def extraction_dedupe_key(data: StyleGuideInput) -> str:
+    """Identify the work behind a submission: the page title for URLs, else a content hash."""
+    content = data.input_content
+    if data.is_url:
+        return f"extract:url:{title_from_url(content)}"
+    return f"extract:content:{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+
+async def submit_extraction(data: StyleGuideInput, previous_request_id: Optional[str]) -> Dict[str, Any]:
+    """Return existing requirements for an unchanged URL, or queue an extraction job."""
+    content = data.input_content
+    # Check if it's a URL
+    if data.is_url:
+        # Check if we already have this URL in the database
+        existing_doc = await RequirementsDocument.find(
+            {"url": content, "status": "completed"}
+        ).sort("-created_at").first_or_none()
+        if existing_doc and await is_current_revision(existing_doc, content):
+            logger.info(f"Found existing requirements for URL: {content}")
+            return {
+                "status_code": 200,
+                "response_type": "success",
+                "description": "Retrieved existing requirements",
+                "data": {
+                    "request_id": existing_doc.request_id
+                },
+            }
+        if existing_doc and previous_request_id is None:
+            # The page was edited since the last extraction; only changed chunks are re-sent
+            previous_request_id = existing_doc.request_id
+
+    # Generate UUID for new request
+    request_id = str(uuid.uuid4())
+
+    # Queue the extraction for the worker processes (see worker.py); if the same guide is
+    # already queued or running, its job is returned instead
+    job = await enqueue_job(
+        "extract",
+        {
+            "data": data.model_dump(),
+            "previous_request_id": previous_request_id,
+        },
+        job_id=request_id,
+        priority=data.priority,
+        dedupe_key=extraction_dedupe_key(data),
+    )
+
+    if job.job_id != request_id:
+        logger.info(f"Request joined in-flight extraction with request_id: {job.job_id}")
+        description = "Request already being processed"
+    else:
+        logger.info(f"Request accepted for processing with request_id: {request_id}")
+        description = "Request accepted for processing"
+    return {
+        "status_code": 202,
+        "response_type": "success",
+        "description": description,
+        "data": {
+            "request_id": job.job_id
+        },
+    }
+
+async def is_current_revision(doc: RequirementsDocument, url: str) -> bool:
+    """Check whether `doc` was extracted from the latest revision of the page at `url`."""
+    if doc.revid is None:
+        # Extracted before revisions were tracked; keep serving it
+        return True
     try:
-        style_guide_content = None
-        content = data.input_content
-        url = data.url or (content if data.is_url else None)
-        
-        if data.is_url:
-            try:
-                wikitext_content = fetch_wikitext(content)
-                if not wikitext_content:
-                    raise ValueError("No content retrieved from URL")
-                style_guide_content = wikitext_content
-            except Exception as url_error:
-                logger.error(f"Error fetching content from URL: {str(url_error)}")
-                raise ValueError(f"Failed to fetch content from URL: {str(url_error)}")
-        else:
-            style_guide_content = content
-
-        if not style_guide_content:
-            raise ValueError("No content to process")
-
-        title, requirements_data = await process_requirements(style_guide_content)
-        
-        # Create a document that matches the RequirementsDocument model
-        doc = RequirementsDocument(
-            request_id=request_id,
-            requirements=requirements_data,
-            status="completed",
-            url=url,
-            title=title
-        )
-        
-        # Save requirements to database
-        await doc.insert()
-        logger.info(f"Successfully saved requirements to database for request_id: {request_id}")
+        current_revid = await fetch_revision(url)
     except Exception as e:
-        logger.error(f"Error processing request {request_id}: {str(e)}", exc_info=True)
-        # Update document with error status if possible
+        logger.warning(f"Could not check the current revision of {url}: {str(e)}")
+        return True
+    if current_revid != doc.revid:
+        logger.info(f"Style guide at {url} changed (revid {doc.revid} -> {current_revid})")
+        return False
+    return True
+
+async def process_and_save_requirements(
+    data: StyleGuideInput,
+    request_id: str,
+    previous_chunks: Optional[List[Dict[str, Any]]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+):
+    style_guide_content = None
+    revid = None
+    content = data.input_content
+    url = data.url or (content if data.is_url else None)
+
+    if data.is_url:
         try:
-            error_doc = RequirementsDocument(
-                request_id=request_id,
-                requirements={},
-                status="error",
-                url=url
-            )
-            await error_doc.insert()
-        except Exception as db_error:
-            logger.error(f"Failed to save error status for request {request_id}: {str(db_error)}")
+            page = await fetch_page(content)
+            if not page or not page.content:
+                raise ValueError("No content retrieved from URL")
+            style_guide_content = page.content
+            revid = page.revid
+        except Exception as url_error:
+            logger.error(f"Error fetching content from URL: {str(url_error)}")
+            raise ValueError(f"Failed to fetch content from URL: {str(url_error)}")
+    else:
+        style_guide_content = content
+
+    if not style_guide_content:
+        raise ValueError("No content to process")
+
+    title, requirements_data, chunks = await process_requirements(
+        style_guide_content, previous_chunks=previous_chunks, on_progress=on_progress
+    )
+
+    # Create a document that matches the RequirementsDocument model
+    doc = RequirementsDocument(
+        request_id=request_id,
+        requirements=requirements_data,
+        status="completed",
+        url=url,
+        revid=revid,
+        chunks=chunks,
+        title=title
+    )
+
+    # Save requirements to database, large payloads compressed out of line
+    await offload_payload(doc)
+    await doc.insert()
+    logger.info(f"Successfully saved requirements to database for request_id: {request_id}")
+
+async def save_error_status(request_id: str, url: Optional[str] = None):
+    try:
+        error_doc = RequirementsDocument(
+            request_id=request_id,
+            requirements={},
+            status="error",
+            url=url
+        )
+        await error_doc.insert()
+    except Exception as db_error:
+        logger.error(f"Failed to save error status for request {request_id}: {str(db_error)}")
+
+async def run_extraction_job(job: Job):
+    """Worker entry point for queued "extract" jobs."""
+    request_id = job.job_id
+    if await RequirementsDocument.find_one({"request_id": request_id, "status": "completed"}):
+        # A previous attempt saved its result but died before the job was marked completed
+        logger.info(f"Requirements for request_id {request_id} already saved")
+        return
+
+    data = StyleGuideInput.model_validate(job.payload["data"])
+    previous_chunks = None
+    previous_request_id = job.payload.get("previous_request_id")
+    if previous_request_id:
+        previous_doc = await RequirementsDocument.find_one({"request_id": previous_request_id})
+        if previous_doc:
+            previous_doc = await load_payload(previous_doc)
+            previous_chunks = previous_doc.chunks or None
+
+    # Streamed to clients by GET /api/jobs/{request_id}/events
+    progress = JobProgress(request_id)
+    try:
+        await process_and_save_requirements(data, request_id, previous_chunks, progress)
+    finally:
+        await progress.aclose()
+
+async def on_extraction_failed(job: Job, error: str):
+    data = StyleGuideInput.model_validate(job.payload["data"])
+    url = data.url or (data.content if data.is_url else None)
+    await save_error_status(job.job_id, url)
+
+register_handler("extract", run_extraction_job, on_failure=on_extraction_failed)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from config.config import settings
+from models.job import Job, JobEvent
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FINISHED_STATUSES = {"completed", "failed"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await Job.find_one({"job_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return {
+        "status": "success",
+        "data": {
+            "job_id": job.job_id,
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "error": job.error,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+        },
+    }
+
+
+def format_sse(event: JobEvent) -> str:
+    return f"id: {event.seq}\nevent: {event.event}\ndata: {json.dumps(event.data, default=str)}\n\n"
+
+
+async def job_event_stream(
+    job_id: str, after: int = 0, request: Optional[Request] = None
+) -> AsyncIterator[str]:
+    """
+    Yield the job's progress events as Server-Sent Events until the job has finished.
+
+    Args:
+    job_id (str): Job to follow
+    after (int): Sequence number of the last event the client has already seen
+    request (Request, optional): Stops the stream when the client disconnects
+
+    Yields:
+    str: Formatted SSE messages
+    """
+    last_sent = time.monotonic()
+    while True:
+        events = await JobEvent.find(
+            {"job_id": job_id, "seq": {"$gt": after}}
+        ).sort("+seq").to_list()
+        for event in events:
+            after = event.seq
+            last_sent = time.monotonic()
+            yield format_sse(event)
+
+        if events:
+            continue
+
+        job = await Job.find_one({"job_id": job_id})
+        if job is None:
+            return
+        if job.status in FINISHED_STATUSES:
+            # Jobs write their final event before their final status, so the events stored by
+            # now are all there will be. event_count is not waited on: it also counts events
+            # whose insert failed, which will never arrive.
+            events = await JobEvent.find(
+                {"job_id": job_id, "seq": {"$gt": after}}
+            ).sort("+seq").to_list()
+            for event in events:
+                yield format_sse(event)
+            return
+        if request is not None and await request.is_disconnected():
+            return
+        if time.monotonic() - last_sent >= settings.JOB_EVENTS_KEEPALIVE:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(settings.JOB_EVENTS_POLL_INTERVAL)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str, request: Request, last_event_id: Optional[str] = Header(None)
+):
+    """Stream per-chunk and per-section progress of a job as Server-Sent Events.
+
+    Reconnecting clients send the standard Last-Event-ID header to resume where they left off.
+    """
+    job = await Job.find_one({"job_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        job_event_stream(job_id, after, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
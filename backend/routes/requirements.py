@@ -1,10 +1,25 @@
+import base64
+import json
 import logging
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pymongo import DESCENDING
 from database.database import *
 from models.requirements import RequirementsDocument
+from utils.payload_store import find_requirements, load_payload_fields
 
 router = APIRouter()
 
+# Fields returned by the listing when none are asked for
+DEFAULT_LIST_FIELDS = ("title", "request_id", "status", "created_at")
+LISTABLE_FIELDS = set(DEFAULT_LIST_FIELDS) | {"url", "revid", "requirements"}
+LISTING_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+MAX_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 100
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -19,7 +34,7 @@ async def get_requirements(request_id: str):
                 detail="Invalid request ID format"
             )
 
-        doc = await RequirementsDocument.find_one({"request_id": request_id})
+        doc = await find_requirements({"request_id": request_id})
         if not doc:
             logger.warning(f"Requirements not found for request_id: {request_id}")
             raise HTTPException(
@@ -57,38 +72,124 @@ async def get_requirements(request_id: str):
         logger.error(error_msg, exc_info=True)  # This will log the full stack trace
         raise HTTPException(status_code=500, detail=error_msg)
 
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque position after `doc` in the (created_at, _id) descending listing order."""
+    position = {"created_at": doc["created_at"].isoformat(), "id": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(position["created_at"])
+        last_id = ObjectId(position["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    }
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(DEFAULT_LIST_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(requested) - LISTABLE_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+            f"Allowed: {', '.join(sorted(LISTABLE_FIELDS))}"
+        )
+    return requested
+
+
+def listing_projection(fields: List[str]) -> Dict[str, bool]:
+    projection = {field: True for field in fields + ["created_at"]}
+    if "requirements" in fields:
+        # Offloaded payloads are looked up by request_id
+        projection["payload_encoding"] = True
+        projection["request_id"] = True
+    return projection
+
+
+async def serialize_listing(doc: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    if "requirements" in fields and doc.get("payload_encoding"):
+        doc["requirements"] = (await load_payload_fields(doc["request_id"]))["requirements"]
+    item = {field: doc.get(field) for field in fields}
+    if isinstance(item.get("created_at"), datetime):
+        item["created_at"] = item["created_at"].isoformat()
+    return item
+
+
+def listing_query(cursor: Optional[str], status: Optional[str]) -> Dict[str, Any]:
+    # Failed extractions have no requirements and are only listed when asked for
+    query: Dict[str, Any] = {"status": status or "completed"}
+    if cursor:
+        query.update(decode_cursor(cursor))
+    return query
+
+
+async def stream_listing(
+    query: Dict[str, Any], fields: List[str]
+) -> AsyncIterator[str]:
+    """Yield every matching document as one JSON line, reading the cursor in batches."""
+    collection = RequirementsDocument.get_motor_collection()
+    projection = listing_projection(fields)
+    cursor = collection.find(
+        query, projection, sort=LISTING_SORT, batch_size=STREAM_BATCH_SIZE
+    )
+    async for doc in cursor:
+        yield json.dumps(await serialize_listing(doc, fields), default=str) + "\n"
+
+
 @router.get("/requirements")
-async def get_requirements():
+async def list_requirements(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    stream: bool = False,
+):
+    """List requirements documents, newest first.
+
+    Pages are read with keyset pagination: pass the `next_cursor` of a page as `cursor` to
+    get the next one. Only the `fields` asked for (title, request_id, status and created_at by
+    default) are read from the database. With `stream`, every document from `cursor` on is
+    sent as newline-delimited JSON instead of a single page.
+    """
     try:
+        selected = parse_fields(fields)
+        query = listing_query(cursor, status)
 
-        docs = await RequirementsDocument.find_all().to_list()
-        
-        if not docs:
-            logger.warning("No requirements documents found")
-            return {
-                "status": "success",
-                "data": [],
-                "count": 0
-            }
-
-        requirements_list = [
-            {
-                "title": doc.title,
-                "request_id": doc.request_id,
-                "requirements": doc.requirements
-            }
-            for doc in docs
-            if hasattr(doc, 'requirements') and doc.requirements
-        ]
+        if stream:
+            return StreamingResponse(
+                stream_listing(query, selected), media_type="application/x-ndjson"
+            )
+
+        docs = await RequirementsDocument.get_motor_collection().find(
+            query, listing_projection(selected)
+        ).sort(LISTING_SORT).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        requirements_list = [await serialize_listing(doc, selected) for doc in docs[:limit]]
 
         logger.info(f"Successfully retrieved {len(requirements_list)} requirements documents")
-        
+
         return {
             "status": "success",
             "data": requirements_list,
-            "count": len(requirements_list)
+            "count": len(requirements_list),
+            "next_cursor": next_cursor
         }
 
+    except HTTPException as he:
+        logger.error(f"HTTP error listing requirements: {str(he)}")
+        raise he
+
     except Exception as e:
         error_msg = f"Unexpected error retrieving all requirements: {str(e)}"
         logger.error(error_msg, exc_info=True)
@@ -0,0 +1,70 @@
+import json
+
+from utils.applicability import embedding_scorer, select_requirements
+
+
+def requirement(id, level, where, when="Always", classification="Best Practices"):
+    return {
+        "id": id,
+        "description": f"Requirement {id}",
+        "classification": classification,
+        "where": where,
+        "when": when,
+        "level": level,
+    }
+
+
+REQUIREMENTS = [
+    requirement("1", "article-level", "Entire article"),
+    requirement("2", "sentence-level", "Article prose"),
+    requirement("3", "section-level", "Lead section"),
+    requirement("4", "section-level", "Clinical significance section"),
+    requirement("5", "section-level", "Interactions section", "When orthologs are described",
+                "Contextual Considerations"),
+    requirement("6", "sentence-level", "Article prose", classification="Non-Applicable Elements"),
+]
+
+LEAD = {"index": 2, "title": "Overview", "content": "ABCC11 is a transporter."}
+CLINICAL = {"index": 3, "title": "Clinical significance", "content": "Variants cause disease."}
+INTERACTIONS = {"index": 4, "title": "Interactions", "content": "No data yet."}
+EMPTY = {"index": 5, "title": "See also", "content": ""}
+
+
+def ids(requirements):
+    return [r["id"] for r in requirements]
+
+
+class TestSelectRequirements:
+    def test_lead_gets_article_and_lead_requirements(self):
+        assert ids(select_requirements(REQUIREMENTS, LEAD, is_lead=True)) == ["1", "2", "3"]
+
+    def test_named_section_requirements_follow_the_title(self):
+        assert ids(select_requirements(REQUIREMENTS, CLINICAL)) == ["2", "4"]
+
+    def test_contextual_requirements_need_their_condition(self):
+        assert ids(select_requirements(REQUIREMENTS, INTERACTIONS)) == ["2"]
+        section = {**INTERACTIONS, "content": "Orthologs of ABCC12 interact with it."}
+        assert ids(select_requirements(REQUIREMENTS, section)) == ["2", "5"]
+
+    def test_empty_sections_get_nothing(self):
+        assert select_requirements(REQUIREMENTS, EMPTY) == []
+
+    def test_document_shape_is_preserved(self):
+        document = {
+            "groups": [
+                {"category": "Content", "description": "", "requirements": REQUIREMENTS[:2]},
+                {"category": "Structure", "description": "", "requirements": REQUIREMENTS[2:]},
+            ]
+        }
+        selected = select_requirements(document, CLINICAL)
+        assert [ids(group["requirements"]) for group in selected["groups"]] == [["2"], ["4"]]
+
+    def test_scorer_prunes_low_relevance_candidates(self):
+        def embed(texts):
+            return [[1.0, 0.0] if "Requirement 4" in text or "Variants" in text else [0.0, 1.0]
+                    for text in texts]
+
+        selected = select_requirements(
+            REQUIREMENTS, CLINICAL, scorer=embedding_scorer(embed), threshold=0.5
+        )
+        assert ids(selected) == ["4"]
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from utils.cache import ResponseCache, make_cache_key
+
+
+class TestResponseCache:
+    def test_key_depends_on_model_version_and_payload(self):
+        key = make_cache_key("o1-mini", "1", {"chunk": "text", "i": 1})
+        assert key == make_cache_key("o1-mini", "1", {"i": 1, "chunk": "text"})
+        assert key != make_cache_key("o1-preview", "1", {"chunk": "text", "i": 1})
+        assert key != make_cache_key("o1-mini", "2", {"chunk": "text", "i": 1})
+        assert key != make_cache_key("o1-mini", "1", {"chunk": "other", "i": 1})
+
+    def test_round_trip_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache" / "responses.sqlite3")
+        ResponseCache(path).set("key", "value")
+        assert ResponseCache(path).get("key") == "value"
+
+    def test_expired_entries_are_dropped(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.sqlite3"), ttl=0)
+        cache.set("key", "value")
+        time.sleep(0.01)
+        assert cache.get("key") is None
+
+    def test_least_recently_used_entry_is_evicted(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_entries=2)
+        cache.set("a", "1")
+        time.sleep(0.01)
+        cache.set("b", "2")
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.set("c", "3")
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+
+    def test_disabled_cache_stores_nothing(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.sqlite3"), enabled=False)
+        cache.set("key", "value")
+        assert cache.get("key") is None
+
+    @pytest.mark.anyio
+    async def test_async_access_runs_off_the_event_loop(self, tmp_path, monkeypatch):
+        cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+        threads = []
+        get = cache.get
+        monkeypatch.setattr(
+            cache, "get", lambda key: threads.append(threading.get_ident()) or get(key)
+        )
+
+        await cache.aset("key", "value")
+
+        assert await cache.aget("key") == "value"
+        assert threads and threading.get_ident() not in threads
@@ -0,0 +1,66 @@
+from utils import chunker
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+GUIDE = """Intro paragraph with five words.
+
+== Spelling ==
+Use British spelling in British topics.
+
+Keep spelling consistent within an article.
+
+== Numbers ==
+Spell out numbers under ten."""
+
+
+class TestChunker:
+    def test_sections_are_kept_together(self):
+        chunks = chunker.chunk_text(GUIDE, max_tokens=16, overlap_tokens=0, count=words)
+
+        assert chunks == [
+            "Intro paragraph with five words.",
+            "== Spelling ==\nUse British spelling in British topics.\n\n"
+            "Keep spelling consistent within an article.",
+            "== Numbers ==\nSpell out numbers under ten.",
+        ]
+
+    def test_small_sections_share_a_chunk(self):
+        chunks = chunker.chunk_text(GUIDE, max_tokens=100, overlap_tokens=0, count=words)
+
+        assert len(chunks) == 1
+        assert chunks[0].startswith("Intro paragraph")
+        assert chunks[0].endswith("under ten.")
+
+    def test_oversized_blocks_are_split_without_empty_chunks(self):
+        text = "word " * 25 + "\n\n== Next ==\nShort."
+
+        chunks = chunker.chunk_text(text, max_tokens=10, overlap_tokens=0, count=words)
+
+        assert all(chunk.strip() for chunk in chunks)
+        assert all(words(chunk) <= 10 for chunk in chunks)
+        assert sum(words(chunk) for chunk in chunks) == words(text)
+
+    def test_sentences_keep_their_punctuation(self):
+        text = "One two three. Four five six. Seven eight nine."
+
+        chunks = chunker.chunk_text(text, max_tokens=6, overlap_tokens=0, count=words)
+
+        assert chunks == ["One two three. Four five six.", "Seven eight nine."]
+
+    def test_overlap_repeats_the_previous_paragraph(self):
+        chunks = chunker.chunk_text(GUIDE, max_tokens=24, overlap_tokens=8, count=words)
+
+        assert len(chunks) == 2
+        assert chunks[0].endswith("Keep spelling consistent within an article.")
+        assert chunks[1] == (
+            "Keep spelling consistent within an article.\n\n"
+            "== Numbers ==\nSpell out numbers under ten."
+        )
+
+    def test_counts_are_estimated_without_an_encoding(self, monkeypatch):
+        monkeypatch.setattr(chunker, "get_encoding", lambda model: None)
+
+        assert chunker.token_counter("o1-mini")("x" * 40) == 10
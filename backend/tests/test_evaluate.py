@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from prompts.evaluate import evaluate_index
+from utils.cache import ResponseCache
+from utils.prompt_encoding import prompt_encoding
+
+ARTICLE = """# ABCC11
+## Overview
+The ABCC11 gene encodes a transporter. It is expressed widely.
+## Function
+The protein exports molecules.
+## Clinical significance
+Variants affect earwax type.
+"""
+
+
+def section_output(index: int, title: str) -> str:
+    return json.dumps(
+        {
+            "sections": [
+                {
+                    "index": index,
+                    "title": title,
+                    "sentence_evaluations": None,
+                    "requirement_evaluations": [],
+                    "meta_notes": None,
+                }
+            ],
+            "article_evaluation": None,
+        }
+    )
+
+
+class TestConcurrentEvaluation:
+    @pytest.fixture
+    def fake_llm(self, monkeypatch, tmp_path):
+        in_flight = {"current": 0, "max": 0, "states": [], "garbled": set()}
+
+        async def fake_evaluate(current_state, section, requirements, i, total_sections):
+            in_flight["current"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["current"])
+            in_flight["states"].append(current_state.sections)
+            # Earlier sections take longer so they complete last
+            await asyncio.sleep(0.02 * (total_sections - i))
+            in_flight["current"] -= 1
+            if section["title"] in in_flight["garbled"]:
+                return "I cannot evaluate this section."
+            return section_output(section["index"], section["title"])
+
+        disabled = ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=False)
+        monkeypatch.setattr(evaluate_index, "get_response_cache", lambda: disabled)
+        monkeypatch.setattr(evaluate_index, "evaluate_section_llm_async", fake_evaluate)
+        return in_flight
+
+    @pytest.mark.anyio
+    async def test_worker_limit_is_respected(self, fake_llm):
+        await evaluate_index.process_article_sections_async(
+            ARTICLE, [], max_workers=2, prefilter=False
+        )
+        assert fake_llm["max"] == 2
+        assert all(state == [] for state in fake_llm["states"])
+
+    @pytest.mark.anyio
+    async def test_results_are_merged_by_section_index(self, fake_llm):
+        evaluation = await evaluate_index.process_article_sections_async(
+            ARTICLE, [], max_workers=4, prefilter=False
+        )
+        assert [section.index for section in evaluation.sections] == [1, 2, 3, 4]
+        assert [section.title for section in evaluation.sections] == [
+            "ABCC11",
+            "Overview",
+            "Function",
+            "Clinical significance",
+        ]
+
+    @pytest.mark.anyio
+    async def test_unparseable_section_fails_the_evaluation(self, fake_llm):
+        fake_llm["garbled"] = {"Function"}
+        with pytest.raises(ValueError, match="1 of 4 sections"):
+            await evaluate_index.process_article_sections_async(
+                ARTICLE, [], max_workers=4, prefilter=False
+            )
+
+    def test_sections_with_the_same_title_are_kept_apart(self):
+        outputs = [
+            evaluate_index.EvaluationOutput.model_validate_json(section_output(i, "See also"))
+            for i in (3, 1)
+        ]
+
+        evaluation = evaluate_index.merge_section_evaluations(outputs)
+
+        assert [section.index for section in evaluation.sections] == [1, 3]
+
+    def test_cache_key_depends_on_the_prompt_encoding(self):
+        section = {"index": 2, "title": "Overview", "content": "One. Two."}
+        keys = set()
+        for mode in ("pretty", "compact"):
+            with prompt_encoding(mode):
+                keys.add(
+                    evaluate_index.section_cache_key(
+                        evaluate_index.empty_evaluation(), section, [], 1, 1
+                    )
+                )
+        assert len(keys) == 2
+
+    def test_prompt_builder_does_not_mutate_section(self):
+        section = {"index": 2, "title": "Overview", "content": "One. Two."}
+        prompt = evaluate_index.build_section_prompt(
+            evaluate_index.empty_evaluation(), section, [], 1, 1
+        )
+        assert "sentences" not in section
+        assert '"sentence":"Two."' in prompt
+
+    @pytest.mark.anyio
+    async def test_sections_without_candidates_are_skipped(self, fake_llm):
+        requirements = {
+            "groups": [
+                {
+                    "description": "Sections",
+                    "category": "Structure",
+                    "requirements": [
+                        {
+                            "id": "1",
+                            "description": "Describe the function of the protein",
+                            "classification": "Imperative Standards",
+                            "where": "Function section",
+                            "when": "Always",
+                            "level": "section-level",
+                        }
+                    ],
+                }
+            ]
+        }
+        evaluation = await evaluate_index.process_article_sections_async(
+            ARTICLE, requirements, max_workers=4
+        )
+        assert [section.title for section in evaluation.sections] == ["Function"]
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import os
+
+import pytest
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from models.evaluation import Evaluation, EvaluationCheckpoint  # noqa: E402
+from models.job import Job, JobEvent  # noqa: E402
+from models.requirements import RequirementsDocument, RequirementsPayload  # noqa: E402
+from prompts.evaluate import evaluate_batch, evaluate_index  # noqa: E402
+from routes import evaluate  # noqa: E402
+from utils import jobs  # noqa: E402
+from utils.cache import ResponseCache  # noqa: E402
+from utils.scoring import summarize_evaluation  # noqa: E402
+from utils.ttl_cache import TTLCache  # noqa: E402
+from utils.wikitext import WikiPage  # noqa: E402
+
+
+def requirement_evaluation(requirement_id, score, applicable=True):
+    return {
+        "requirement_id": requirement_id,
+        "requirement_category": "Content",
+        "classification": "Imperative Standards",
+        "applicable": applicable,
+        "applicability_reasoning": None,
+        "score": score,
+        "confidence": 0.9,
+        "evidence": None,
+        "reasoning": None,
+        "overlap_notes": None,
+    }
+
+
+EVALUATION = {
+    "sections": [
+        {
+            "index": 1,
+            "title": "ABCC11",
+            "sentence_evaluations": [
+                {
+                    "index": 1,
+                    "sentence": "ABCC11 is a gene.",
+                    "requirement_evaluations": [requirement_evaluation("2", 0.5)],
+                    "meta_notes": None,
+                }
+            ],
+            "requirement_evaluations": [
+                requirement_evaluation("1", 1.0),
+                requirement_evaluation("3", None, applicable=False),
+            ],
+            "meta_notes": None,
+        }
+    ],
+    "article_evaluation": {"requirement_evaluations": [], "meta_notes": None},
+}
+
+
+@pytest.fixture
+async def database(monkeypatch):
+    client = AsyncMongoMockClient()
+    await client.drop_database("evaluations_test")
+    await init_beanie(
+        database=client["evaluations_test"],
+        document_models=[
+            Evaluation,
+            EvaluationCheckpoint,
+            Job,
+            JobEvent,
+            RequirementsDocument,
+            RequirementsPayload,
+        ],
+    )
+    await RequirementsDocument(
+        request_id="mcb", title="MCB", requirements={"groups": []}
+    ).insert()
+
+    calls = []
+
+    async def fake_evaluate(markdown, requirements, on_progress=None):
+        calls.append(markdown)
+        return evaluate_index.EvaluationOutput.model_validate(EVALUATION)
+
+    monkeypatch.setattr(evaluate_index, "process_article_sections_async", fake_evaluate)
+    monkeypatch.setattr(evaluate, "_scoreboard_cache", TTLCache(max_entries=16, ttl=60))
+    return calls
+
+
+async def run_queued_jobs():
+    while (job := await jobs.lease_job("w1")) is not None:
+        await jobs.run_job(job, "w1")
+
+
+class TestEvaluationStorage:
+    def test_summary_covers_every_level(self):
+        summary = summarize_evaluation(EVALUATION)
+        assert summary["score"] == 0.75
+        assert summary["scored"] == 2
+        assert summary["not_applicable"] == 1
+        assert summary["by_requirement"] == {"1": 1.0, "2": 0.5}
+
+    @pytest.mark.anyio
+    async def test_identical_request_is_served_from_storage(self, database):
+        request = evaluate.EvaluateInput(content="# ABCC11\nABCC11 is a gene.", requirements_id="mcb")
+
+        first = await evaluate.evaluate_article(request)
+        joined = await evaluate.evaluate_article(request)
+        await run_queued_jobs()
+        stored = await evaluate.evaluate_article(request)
+
+        assert first["status_code"] == 202
+        assert joined["data"]["job_id"] == first["data"]["job_id"]
+        assert stored["status_code"] == 200
+        assert stored["data"]["evaluation_id"] == first["data"]["evaluation_id"]
+        assert len(database) == 1
+
+        evaluation = await evaluate.get_evaluation(first["data"]["evaluation_id"])
+        assert evaluation["data"]["result"]["sections"][0]["title"] == "ABCC11"
+
+    @pytest.mark.anyio
+    async def test_scoreboard_ranks_by_score(self, database):
+        for content in ("# A\nFirst.", "# B\nSecond."):
+            await evaluate.evaluate_article(
+                evaluate.EvaluateInput(content=content, requirements_id="mcb")
+            )
+        await run_queued_jobs()
+        await Evaluation.find_one({"content": "# B\nSecond."}).set({"summary.score": 0.9})
+
+        board = await evaluate.get_scoreboard("mcb", limit=10)
+
+        assert [row["score"] for row in board["data"]] == [0.9, 0.75]
+
+    @pytest.mark.anyio
+    async def test_scoreboard_is_refreshed_when_an_evaluation_finishes(self, database):
+        request = evaluate.EvaluateInput(content="# A\nFirst.", requirements_id="mcb")
+        await evaluate.evaluate_article(request)
+        assert (await evaluate.get_scoreboard("mcb", limit=10))["data"] == []
+
+        # As a worker process would, without touching this process's cache
+        await Evaluation.find_one({"content": "# A\nFirst."}).set(
+            {"status": "completed", "summary": {"score": 0.5, "scored": 1}}
+        )
+
+        board = await evaluate.get_scoreboard("mcb", limit=10)
+        assert [row["score"] for row in board["data"]] == [0.5]
+        assert len(evaluate._scoreboard_cache) == 1
+
+    def test_scoreboard_cache_is_bounded(self):
+        cache = TTLCache(max_entries=2, ttl=60)
+        for limit in (1, 2, 3):
+            cache.set(("mcb", limit), limit)
+
+        assert len(cache) == 2
+        assert cache.get(("mcb", 1)) is None
+        assert cache.get(("mcb", 3)) == 3
+
+    @pytest.mark.anyio
+    async def test_article_is_evaluated_at_the_requested_revision(self, database, monkeypatch):
+        async def fake_revision(url):
+            return 7
+
+        async def fake_revision_contents(revids):
+            # The page has been edited since; only the old revision must be read
+            return {7: WikiPage(title="ABCC11", revid=7, content="Old text.")}
+
+        monkeypatch.setattr(evaluate, "fetch_revision", fake_revision)
+        monkeypatch.setattr(evaluate, "fetch_revision_contents", fake_revision_contents)
+
+        await evaluate.evaluate_article(
+            evaluate.EvaluateInput(url="ABCC11", requirements_id="mcb")
+        )
+        await run_queued_jobs()
+
+        assert database == ["# ABCC11\nOld text."]
+
+
+ARTICLES = {
+    "A": "# A\nLead of A.\n## History\nHistory of A.\n## Uses\nUses of A.",
+    "B": "# B\nLead of B.\n## History\nHistory of B.",
+}
+
+
+@pytest.fixture
+def sections(monkeypatch, tmp_path):
+    """Replace the model call with one that records each section and the peak concurrency."""
+    state = {"titles": [], "running": 0, "peak": 0, "fail": set(), "garbled": set()}
+
+    async def fake_evaluate_section(current_state, section, requirements, i, total_sections):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.02)
+        state["running"] -= 1
+        state["titles"].append(section["title"])
+        if section["content"] in state["fail"]:
+            raise RuntimeError("model unavailable")
+        if section["content"] in state["garbled"]:
+            return "Sorry, I cannot evaluate this section."
+        return json.dumps(
+            {
+                "sections": [
+                    {
+                        "index": i,
+                        "title": section["title"],
+                        "sentence_evaluations": [],
+                        "requirement_evaluations": [requirement_evaluation("1", 1.0)],
+                        "meta_notes": None,
+                    }
+                ],
+                "article_evaluation": {"requirement_evaluations": [], "meta_notes": None},
+            }
+        )
+
+    disabled = ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=False)
+    monkeypatch.setattr(evaluate_index, "get_response_cache", lambda: disabled)
+    monkeypatch.setattr(evaluate_index, "evaluate_section_llm_async", fake_evaluate_section)
+    monkeypatch.setattr(evaluate_batch.settings, "EVALUATION_PREFILTER", False)
+    return state
+
+
+class TestBatchEvaluation:
+    @pytest.mark.anyio
+    async def test_sections_share_one_pool(self, sections):
+        results = await evaluate_batch.evaluate_batch(
+            ARTICLES, [{"id": "1"}], max_workers=2
+        )
+
+        assert sections["peak"] == 2
+        assert len(sections["titles"]) == 5
+        assert [s.title for s in results["A"].sections] == ["A", "History", "Uses"]
+        assert [s.title for s in results["B"].sections] == ["B", "History"]
+
+    @pytest.mark.anyio
+    async def test_resume_skips_checkpointed_sections(self, sections, tmp_path):
+        checkpoint = evaluate_batch.JsonlCheckpoint(str(tmp_path / "batch.jsonl"))
+        sections["fail"] = {"Uses of A."}
+        with pytest.raises(RuntimeError):
+            await evaluate_batch.evaluate_batch(
+                ARTICLES, [{"id": "1"}], checkpoint=checkpoint
+            )
+
+        sections["fail"] = set()
+        sections["titles"] = []
+        results = await evaluate_batch.evaluate_batch(
+            ARTICLES, [{"id": "1"}], checkpoint=checkpoint
+        )
+
+        assert sections["titles"] == ["Uses"]
+        assert len(results["A"].sections) == 3
+
+    @pytest.mark.anyio
+    async def test_unparseable_sections_are_retried_on_resume(self, sections, tmp_path):
+        checkpoint = evaluate_batch.JsonlCheckpoint(str(tmp_path / "batch.jsonl"))
+        sections["garbled"] = {"Uses of A."}
+        with pytest.raises(ValueError):
+            await evaluate_batch.evaluate_batch(
+                ARTICLES, [{"id": "1"}], checkpoint=checkpoint
+            )
+
+        sections["garbled"] = set()
+        sections["titles"] = []
+        results = await evaluate_batch.evaluate_batch(
+            ARTICLES, [{"id": "1"}], checkpoint=checkpoint
+        )
+
+        assert sections["titles"] == ["Uses"]
+        assert len(results["A"].sections) == 3
+
+    @pytest.mark.anyio
+    async def test_batch_job_saves_each_evaluation(self, database, sections, monkeypatch):
+        async def fake_revisions(titles):
+            return {"A": 1, "B": 2, "Missing": None}
+
+        async def fake_markdown(evaluations):
+            return {e.evaluation_id: ARTICLES[e.article_title] for e in evaluations}
+
+        monkeypatch.setattr(evaluate, "fetch_revisions", fake_revisions)
+        monkeypatch.setattr(evaluate, "articles_markdown", fake_markdown)
+
+        response = await evaluate.evaluate_articles(
+            evaluate.BatchEvaluateInput(titles=["A", "B", "Missing"], requirements_id="mcb")
+        )
+        await run_queued_jobs()
+
+        assert response["status_code"] == 202
+        assert response["data"]["missing"] == ["Missing"]
+        assert await Evaluation.find({"status": "completed"}).count() == 2
+        assert await EvaluationCheckpoint.count() == 5
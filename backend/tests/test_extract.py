@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+import pytest
+
+from prompts.extract import extract_deduped
+
+
+def chunk_output(i: int) -> str:
+    return json.dumps(
+        {
+            "groups": [
+                {
+                    "description": f"Group from chunk {i}",
+                    "category": "Formatting" if i % 2 else "Content",
+                    "requirements": [
+                        {
+                            "id": "1",
+                            "description": f"Requirement from chunk {i}",
+                            "reference": f"Quote {i}",
+                            "category": "Formatting",
+                            "classification": "Best Practices",
+                            "where": "Entire article",
+                            "when": "Always",
+                            "level": "article-level",
+                        }
+                    ],
+                }
+            ]
+        }
+    )
+
+
+class TestConcurrentExtraction:
+    @pytest.fixture
+    def fake_llm(self, monkeypatch):
+        in_flight = {"current": 0, "max": 0}
+
+        async def fake_extract(current_state, chunk, i, total_chunks):
+            in_flight["current"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["current"])
+            # Later chunks finish first to check that merging ignores completion order
+            await asyncio.sleep(0.01 * (total_chunks - i))
+            in_flight["current"] -= 1
+            return "```json\n" + chunk_output(i) + "\n```"
+
+        async def fake_title(text):
+            return "Style guide"
+
+        monkeypatch.setattr(extract_deduped, "extract_requirements_from_chunk", fake_extract)
+        monkeypatch.setattr(extract_deduped, "get_title", fake_title)
+        monkeypatch.setattr(
+            extract_deduped,
+            "split_content",
+            lambda text: [f"chunk {i}" for i in range(1, 7)],
+        )
+        return in_flight
+
+    @pytest.mark.anyio
+    async def test_concurrency_is_bounded(self, fake_llm):
+        await extract_deduped.process_requirements("guide", concurrency=2)
+        assert fake_llm["max"] == 2
+
+    @pytest.mark.anyio
+    async def test_merge_matches_sequential_order(self, fake_llm):
+        _, sequential, _ = await extract_deduped.process_requirements("guide", concurrency=1)
+        _, concurrent, _ = await extract_deduped.process_requirements("guide", concurrency=4)
+        assert concurrent == sequential
+        ids = [req["id"] for group in concurrent["groups"] for req in group["requirements"]]
+        assert ids == [str(n) for n in range(1, 7)]
+
+    @pytest.mark.anyio
+    async def test_progress_is_reported_per_chunk(self, fake_llm):
+        events = []
+        await extract_deduped.process_requirements(
+            "guide", concurrency=3, on_progress=lambda event, data: events.append((event, data))
+        )
+
+        assert events[0] == (
+            "extraction_started",
+            {"title": "Style guide", "total_chunks": 6, "mode": "stateful"},
+        )
+        chunks = [data for event, data in events[1:] if event == "chunk"]
+        assert sorted(data["index"] for data in chunks) == list(range(1, 7))
+        assert chunks[0]["requirements"]["groups"][0]["requirements"]
+
+
+class TestMapReduceExtraction:
+    @pytest.mark.anyio
+    async def test_map_prompts_do_not_carry_state(self, monkeypatch):
+        states = []
+
+        async def fake_extract(current_state, chunk, i, total_chunks):
+            states.append(current_state)
+            return chunk_output(i)
+
+        async def fake_title(text):
+            return "Style guide"
+
+        monkeypatch.setattr(extract_deduped, "extract_requirements_from_chunk", fake_extract)
+        monkeypatch.setattr(extract_deduped, "get_title", fake_title)
+        monkeypatch.setattr(extract_deduped, "split_content", lambda text: ["a", "b", "c"])
+
+        _, document, _ = await extract_deduped.process_requirements("guide", mode="map_reduce")
+
+        assert states == [None, None, None]
+        assert sum(len(group["requirements"]) for group in document["groups"]) == 3
+
+    def test_prompt_without_state_omits_state_block(self):
+        prompt = extract_deduped.build_extraction_prompt(None, "chunk text", 1, 1)
+        assert "Current State of Requirements Document" not in prompt
+        assert "chunk text" in prompt
+
+    def test_reduce_drops_near_duplicates(self):
+        first = extract_deduped.RequirementsDocument.model_validate_json(chunk_output(1))
+        second = extract_deduped.RequirementsDocument.model_validate_json(chunk_output(1))
+        second.groups[0].category = " formatting "
+        second.groups[0].requirements[0].description = "**Requirement** from chunk 1."
+        second.groups[0].requirements[0].reference = "Another quote"
+
+        reduced = extract_deduped.reduce_requirements([first, None, second])
+
+        assert len(reduced.groups) == 1
+        assert len(reduced.groups[0].requirements) == 1
+
+
+class TestIncrementalExtraction:
+    @pytest.mark.anyio
+    async def test_only_changed_chunks_are_extracted(self, monkeypatch):
+        calls = []
+
+        async def fake_extract(current_state, chunk, i, total_chunks):
+            calls.append((chunk, i, total_chunks))
+            return chunk_output(int(chunk.split()[-1]))
+
+        async def fake_title(text):
+            return "Style guide"
+
+        monkeypatch.setattr(extract_deduped, "extract_requirements_from_chunk", fake_extract)
+        monkeypatch.setattr(extract_deduped, "get_title", fake_title)
+        monkeypatch.setattr(extract_deduped, "split_content", lambda text: text.split("|"))
+
+        _, _, records = await extract_deduped.process_requirements(
+            "chunk 1|chunk 2|chunk 3", mode="map_reduce"
+        )
+        calls.clear()
+
+        _, document, new_records = await extract_deduped.process_requirements(
+            "chunk 1|chunk 4|chunk 3", previous_chunks=records
+        )
+
+        assert calls == [("chunk 4", 2, 3)]
+        assert new_records[0] == records[0]
+        assert new_records[2] == records[2]
+        descriptions = [
+            req["description"] for group in document["groups"] for req in group["requirements"]
+        ]
+        assert sorted(descriptions) == [
+            "Requirement from chunk 1",
+            "Requirement from chunk 3",
+            "Requirement from chunk 4",
+        ]
+
+    def test_records_are_not_affected_by_merging(self):
+        chunk = "chunk"
+        document = extract_deduped.RequirementsDocument.model_validate_json(chunk_output(1))
+        record = extract_deduped.chunk_record(chunk, document)
+        document.groups[0].requirements[0].id = "42"
+        assert record["requirements"]["groups"][0]["requirements"][0]["id"] == "1"
+        assert record["hash"] == extract_deduped.hash_chunk(chunk)
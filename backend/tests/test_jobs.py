@@ -0,0 +1,247 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect
+
+from config.config import settings
+from models.job import Job, JobEvent, JobSlot
+from routes.jobs import job_event_stream
+from utils import jobs
+from utils.progress import JobProgress, record_event
+from utils.singleflight import SingleFlight
+
+
+@pytest.fixture
+async def queue(monkeypatch):
+    client = AsyncMongoMockClient()
+    await client.drop_database("jobs_test")
+    await init_beanie(database=client["jobs_test"], document_models=[Job, JobEvent, JobSlot])
+    monkeypatch.setattr(jobs, "HANDLERS", {})
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.01)
+    yield
+
+
+class TestJobQueue:
+    @pytest.mark.anyio
+    async def test_lease_takes_highest_priority_then_oldest(self, queue):
+        await jobs.enqueue_job("extract", {}, job_id="low")
+        await jobs.enqueue_job("extract", {}, job_id="high", priority=5)
+        await jobs.enqueue_job("extract", {}, job_id="high-later", priority=5)
+
+        leased = [(await jobs.lease_job("w1")).job_id for _ in range(3)]
+
+        assert leased == ["high", "high-later", "low"]
+        assert await jobs.lease_job("w1") is None
+
+    @pytest.mark.anyio
+    async def test_expired_lease_is_reclaimed(self, queue):
+        await jobs.enqueue_job("extract", {}, job_id="a")
+        job = await jobs.lease_job("dead-worker")
+        await Job.get_motor_collection().update_one(
+            {"_id": job.id},
+            {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}},
+        )
+
+        job = await jobs.lease_job("w2")
+
+        assert job.lease_owner == "w2"
+        assert job.attempts == 2
+
+    @pytest.mark.anyio
+    async def test_failed_job_is_retried_then_marked_failed(self, queue):
+        calls = []
+        failures = []
+
+        async def run(job):
+            calls.append(job.attempts)
+            raise RuntimeError("boom")
+
+        async def on_failure(job, error):
+            failures.append(error)
+
+        jobs.register_handler("extract", run, on_failure)
+        await jobs.enqueue_job("extract", {}, job_id="a", max_attempts=2)
+
+        while (job := await jobs.lease_job("w1")) is not None:
+            await jobs.run_job(job, "w1")
+
+        job = await Job.find_one({"job_id": "a"})
+        assert calls == [1, 2]
+        assert failures == ["boom"]
+        assert job.status == "failed"
+        assert job.error == "boom"
+
+    @pytest.mark.anyio
+    async def test_worker_runs_jobs_until_stopped(self, queue):
+        stop = asyncio.Event()
+        done = []
+
+        async def run(job):
+            done.append(job.payload["n"])
+            if len(done) == 3:
+                stop.set()
+
+        jobs.register_handler("extract", run)
+        for n in range(3):
+            await jobs.enqueue_job("extract", {"n": n})
+
+        await asyncio.wait_for(jobs.run_worker("w1", concurrency=2, stop=stop), timeout=5)
+
+        assert sorted(done) == [0, 1, 2]
+        assert await Job.find({"status": "completed"}).count() == 3
+
+    @pytest.mark.anyio
+    async def test_running_cap_holds_across_workers(self, queue, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_MAX_RUNNING", 2)
+        stop = asyncio.Event()
+        running = {"current": 0, "max": 0, "done": 0}
+
+        async def run(job):
+            running["current"] += 1
+            running["max"] = max(running["max"], running["current"])
+            await asyncio.sleep(0.01)
+            running["current"] -= 1
+            running["done"] += 1
+            if running["done"] == 8:
+                stop.set()
+
+        lease_job = jobs.lease_job
+
+        async def slow_lease_job(worker_id):
+            # Let the other slots run between deciding to lease and leasing, as a network
+            # round trip would
+            await asyncio.sleep(0.001)
+            return await lease_job(worker_id)
+
+        monkeypatch.setattr(jobs, "lease_job", slow_lease_job)
+        jobs.register_handler("extract", run)
+        for n in range(8):
+            await jobs.enqueue_job("extract", {"n": n})
+
+        await asyncio.wait_for(
+            asyncio.gather(
+                jobs.run_worker("w1", concurrency=3, stop=stop),
+                jobs.run_worker("w2", concurrency=3, stop=stop),
+            ),
+            timeout=5,
+        )
+
+        assert running["max"] == 2
+        assert await JobSlot.find({"owner": None}).count() == 2
+
+
+    @pytest.mark.anyio
+    async def test_worker_survives_database_errors(self, queue, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_MAX_RUNNING", 1)
+        stop = asyncio.Event()
+        lease_job = jobs.lease_job
+        failures = [AutoReconnect("primary stepped down")]
+
+        async def flaky_lease_job(worker_id):
+            if failures:
+                raise failures.pop()
+            return await lease_job(worker_id)
+
+        async def run(job):
+            stop.set()
+
+        monkeypatch.setattr(jobs, "lease_job", flaky_lease_job)
+        jobs.register_handler("extract", run)
+        await jobs.enqueue_job("extract", {}, job_id="a")
+
+        await asyncio.wait_for(jobs.run_worker("w1", concurrency=1, stop=stop), timeout=5)
+
+        assert (await Job.find_one({"job_id": "a"})).status == "completed"
+        assert await JobSlot.find({"owner": None}).count() == 1
+
+
+class TestSingleFlight:
+    @pytest.mark.anyio
+    async def test_active_job_is_shared_by_dedupe_key(self, queue):
+        first = await jobs.enqueue_job("extract", {}, job_id="a", dedupe_key="extract:url:ABCC11")
+        second = await jobs.enqueue_job("extract", {}, job_id="b", dedupe_key="extract:url:ABCC11")
+        other = await jobs.enqueue_job("extract", {}, job_id="c", dedupe_key="extract:url:Spiders")
+
+        assert first.job_id == second.job_id == "a"
+        assert other.job_id == "c"
+        assert await Job.find_all().count() == 2
+
+    @pytest.mark.anyio
+    async def test_finished_job_releases_its_key(self, queue):
+        async def run(job):
+            pass
+
+        jobs.register_handler("extract", run)
+        await jobs.enqueue_job("extract", {}, job_id="a", dedupe_key="key")
+        await jobs.run_job(await jobs.lease_job("w1"), "w1")
+
+        job = await jobs.enqueue_job("extract", {}, job_id="b", dedupe_key="key")
+
+        assert job.job_id == "b"
+
+    @pytest.mark.anyio
+    async def test_concurrent_calls_are_coalesced_in_process(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def submit():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "request-id"
+
+        results = await asyncio.gather(*(single_flight.do("key", submit) for _ in range(10)))
+
+        assert results == ["request-id"] * 10
+        assert len(calls) == 1
+        assert not single_flight.in_flight("key")
+
+
+class TestJobEvents:
+    @pytest.mark.anyio
+    async def test_progress_is_streamed_in_order(self, queue, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_EVENTS_POLL_INTERVAL", 0.01)
+
+        async def run(job):
+            progress = JobProgress(job.job_id)
+            for i in range(1, 4):
+                progress("chunk", {"index": i})
+            await progress.aclose()
+
+        jobs.register_handler("extract", run)
+        await jobs.enqueue_job("extract", {}, job_id="a")
+        await jobs.run_job(await jobs.lease_job("w1"), "w1")
+
+        messages = [message async for message in job_event_stream("a")]
+
+        assert [m.split("\n")[1] for m in messages] == [
+            "event: running",
+            "event: chunk",
+            "event: chunk",
+            "event: chunk",
+            "event: completed",
+        ]
+        assert messages[1] == 'id: 2\nevent: chunk\ndata: {"index": 1}\n\n'
+
+        resumed = [message async for message in job_event_stream("a", after=4)]
+        assert resumed == [messages[-1]]
+
+    @pytest.mark.anyio
+    async def test_stream_of_finished_job_ends_despite_lost_events(self, queue, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_EVENTS_POLL_INTERVAL", 0.01)
+        await jobs.enqueue_job("extract", {}, job_id="a")
+        await record_event("a", "chunk", {"index": 1})
+        # A second event whose insert failed after its sequence number was taken
+        await Job.get_motor_collection().update_one(
+            {"job_id": "a"}, {"$inc": {"event_count": 1}, "$set": {"status": "completed"}}
+        )
+
+        async def stream():
+            return [message async for message in job_event_stream("a")]
+
+        messages = await asyncio.wait_for(stream(), timeout=5)
+
+        assert [m.split("\n")[1] for m in messages] == ["event: chunk"]
@@ -0,0 +1,58 @@
+import json
+
+from prompts.evaluate.evaluate_index import EvaluationOutput
+from prompts.extract.extract_deduped import RequirementsDocument
+from tests.test_extract import chunk_output
+from utils.json_output import is_complete_output, parse_json_output
+
+
+class TestParseJsonOutput:
+    def test_strict_output(self):
+        document = parse_json_output(chunk_output(1), RequirementsDocument)
+
+        assert document == RequirementsDocument.model_validate_json(chunk_output(1))
+
+    def test_fences_prose_and_trailing_commas(self):
+        raw = (
+            "Here are the requirements:\n```json\n"
+            + chunk_output(1).replace("}]}]}", "},]},]}")
+            + "\n```\nLet me know if you need more."
+        )
+
+        document = parse_json_output(raw, RequirementsDocument)
+
+        assert document == RequirementsDocument.model_validate_json(chunk_output(1))
+        assert not is_complete_output(raw, RequirementsDocument)
+
+    def test_string_contents_are_kept_verbatim(self):
+        quote = "Link as [[A|b,]] and {{x, }}, not ```code```"
+        raw = "```json\n" + chunk_output(1).replace("Quote 1", quote) + "\n```"
+
+        document = parse_json_output(raw, RequirementsDocument)
+
+        assert document.groups[0].requirements[0].reference == quote
+        assert is_complete_output(raw, RequirementsDocument)
+
+    def test_repairs_skip_string_literals(self):
+        raw = chunk_output(1).replace("Quote 1", "a, ]").replace("}]}]}", "},]},]}")
+
+        document = parse_json_output(raw, RequirementsDocument)
+
+        assert document.groups[0].requirements[0].reference == "a, ]"
+
+    def test_truncated_output_keeps_complete_items(self):
+        document = json.loads(chunk_output(1))
+        requirements = document["groups"][0]["requirements"]
+        requirements.append({**requirements[0], "id": "R2"})
+        raw = json.dumps(document)
+        # Cut off in the middle of the second requirement
+        truncated = raw[: raw.rindex('"R2"') + 10]
+
+        recovered = parse_json_output(truncated, RequirementsDocument)
+
+        assert [r.id for r in recovered.groups[0].requirements] == [requirements[0]["id"]]
+        assert not is_complete_output(truncated, RequirementsDocument)
+
+    def test_unrecoverable_output(self):
+        assert parse_json_output("I cannot evaluate this section.", EvaluationOutput) is None
+        assert parse_json_output('{"sections": [', EvaluationOutput) is None
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from prompts.evaluate import evaluate_index
+from prompts.extract import extract_deduped
+from tests.test_extract import chunk_output
+from utils import llm
+from utils.cache import ResponseCache
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    def respond(model, prompt):
+        if "return the title" in prompt:
+            return "Manual of Style"
+        return chunk_output(1)
+
+    client = llm.FakeLLMClient(respond)
+    llm.set_llm_client(client)
+    disabled = ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=False)
+    monkeypatch.setattr(extract_deduped, "get_response_cache", lambda: disabled)
+    monkeypatch.setattr(evaluate_index, "get_response_cache", lambda: disabled)
+    yield client
+    llm.set_llm_client(None)
+
+
+class TestLLMClient:
+    @pytest.mark.anyio
+    async def test_stages_use_their_configured_models(self, fake_llm):
+        title = await extract_deduped.get_title("Some style guide")
+        output = await extract_deduped.extract_requirements_from_chunk(None, "Chunk.", 1, 1)
+        section = {"index": 1, "title": "Lead", "content": "Text."}
+        evaluate_index.evaluate_section(evaluate_index.empty_evaluation(), section, [], 1, 1)
+        await evaluate_index.evaluate_section_async(
+            evaluate_index.empty_evaluation(), section, [], 1, 1
+        )
+
+        assert title == "Manual of Style"
+        assert output == chunk_output(1)
+        assert [model for model, _ in fake_llm.calls] == [
+            extract_deduped.TITLE_MODEL,
+            extract_deduped.EXTRACTION_MODEL,
+            evaluate_index.EVALUATION_MODEL,
+            evaluate_index.EVALUATION_MODEL,
+        ]
+
+    @pytest.mark.anyio
+    async def test_openai_client_is_shared(self, monkeypatch):
+        monkeypatch.setattr(llm.settings, "LLM_BACKEND", "online")
+        try:
+            client = llm.get_llm_client()
+            assert llm.get_llm_client() is client
+            assert client.async_client is client.async_client
+            assert client.sync_client is client.sync_client
+        finally:
+            await llm.close_llm_client()
+
+    def test_sync_client_is_created_once_across_threads(self):
+        client = llm.OpenAIClient(api_key="test")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            clients = set(map(id, pool.map(lambda _: client.sync_client, range(32))))
+        client.sync_client.close()
+
+        assert len(clients) == 1
+
+    def test_fake_backend_needs_no_api(self, monkeypatch):
+        monkeypatch.setattr(llm.settings, "LLM_BACKEND", "fake")
+        try:
+            assert llm.get_llm_client().complete_sync("any-model", "prompt") == "{}"
+        finally:
+            llm.set_llm_client(None)
+
+
+class TestStructuredOutputs:
+    def test_schema_is_sent_to_supporting_models(self, monkeypatch):
+        monkeypatch.setattr(llm.settings, "LLM_STRUCTURED_OUTPUTS", True)
+        body = llm.chat_request("gpt-4o-mini", "prompt", evaluate_index.EvaluationOutput)
+
+        response_format = body["response_format"]
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["strict"] is True
+        assert response_format["json_schema"]["schema"]["additionalProperties"] is False
+
+    def test_schema_is_left_out_otherwise(self, monkeypatch):
+        schema = extract_deduped.RequirementsDocument
+        assert "response_format" not in llm.chat_request("o1-mini", "prompt", schema)
+        assert "response_format" not in llm.chat_request("gpt-4o", "prompt")
+
+        monkeypatch.setattr(llm.settings, "LLM_STRUCTURED_OUTPUTS", False)
+        assert "response_format" not in llm.chat_request("gpt-4o", "prompt", schema)
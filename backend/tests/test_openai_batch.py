@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+from openai import AsyncOpenAI
+
+from prompts.extract import extract_deduped
+from tests.test_extract import chunk_output
+from utils import openai_batch
+from utils.cache import ResponseCache
+
+
+def fake_batch_server(respond):
+    """A local stand-in for the Files and Batches endpoints used by utils/openai_batch.py.
+
+    `respond(prompt)` returns the message content for a request, or None to fail it. Each
+    batch reports "in_progress" once before completing.
+    """
+    app = FastAPI()
+    ids = itertools.count(1)
+    files = {}
+    app.state.batches = {}
+
+    def file_object(file_id, purpose):
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(files[file_id]),
+            "created_at": 0,
+            "filename": f"{file_id}.jsonl",
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    @app.post("/v1/files")
+    async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+        file_id = f"file-{next(ids)}"
+        files[file_id] = (await file.read()).decode("utf-8")
+        return file_object(file_id, purpose)
+
+    @app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+    async def file_content(file_id: str):
+        if file_id not in files:
+            raise HTTPException(status_code=404)
+        return files[file_id]
+
+    @app.post("/v1/batches")
+    async def create_batch(body: dict):
+        batch_id = f"batch-{next(ids)}"
+        app.state.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "completion_window": body["completion_window"],
+            "input_file_id": body["input_file_id"],
+            "created_at": 0,
+            "status": "validating",
+        }
+        return app.state.batches[batch_id]
+
+    @app.get("/v1/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str):
+        batch = app.state.batches[batch_id]
+        if batch["status"] == "validating":
+            batch["status"] = "in_progress"
+            return batch
+
+        output, errors = [], []
+        requests = [json.loads(line) for line in files[batch["input_file_id"]].splitlines()]
+        for request in requests:
+            content = respond(request["body"]["messages"][0]["content"])
+            if content is None:
+                errors.append(
+                    {
+                        "custom_id": request["custom_id"],
+                        "response": None,
+                        "error": {"code": "server_error", "message": "failed"},
+                    }
+                )
+                continue
+            output.append(
+                {
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"message": {"content": content}}]},
+                    },
+                    "error": None,
+                }
+            )
+        for name, records in (("output_file_id", output), ("error_file_id", errors)):
+            if records:
+                file_id = f"file-{next(ids)}"
+                files[file_id] = "\n".join(json.dumps(record) for record in records)
+                batch[name] = file_id
+        batch["status"] = "completed"
+        batch["request_counts"] = {
+            "total": len(requests),
+            "completed": len(output),
+            "failed": len(errors),
+        }
+        return batch
+
+    return app
+
+
+def fake_client(app) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key="test",
+        base_url="http://fake-openai/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+    )
+
+
+class TestBatchCollector:
+    @pytest.mark.anyio
+    async def test_concurrent_calls_share_one_batch(self):
+        app = fake_batch_server(lambda prompt: f"answer to {prompt}")
+        collector = openai_batch.BatchCollector(fake_client(app), window=0.01, poll_interval=0)
+
+        answers = await asyncio.gather(
+            *(collector.complete("o1-mini", f"prompt {i}") for i in range(3))
+        )
+
+        assert answers == ["answer to prompt 0", "answer to prompt 1", "answer to prompt 2"]
+        assert len(app.state.batches) == 1
+
+    @pytest.mark.anyio
+    async def test_failed_request_only_fails_its_caller(self):
+        app = fake_batch_server(lambda prompt: None if prompt == "bad" else "ok")
+        collector = openai_batch.BatchCollector(fake_client(app), window=0.01, poll_interval=0)
+
+        good, bad = await asyncio.gather(
+            collector.complete("o1-mini", "good"),
+            collector.complete("o1-mini", "bad"),
+            return_exceptions=True,
+        )
+
+        assert good == "ok"
+        assert isinstance(bad, openai_batch.BatchRequestError)
+
+    @pytest.mark.anyio
+    async def test_map_reduce_extraction_through_batch(self, monkeypatch, tmp_path):
+        chunks = ["First chunk.", "Second chunk."]
+        app = fake_batch_server(
+            lambda prompt: chunk_output(next(i for i, c in enumerate(chunks, 1) if c in prompt))
+        )
+        collector = openai_batch.BatchCollector(fake_client(app), window=0.01, poll_interval=0)
+        monkeypatch.setattr(openai_batch.settings, "LLM_BACKEND", "batch")
+        monkeypatch.setattr(extract_deduped, "get_batch_collector", lambda: collector)
+        monkeypatch.setattr(
+            extract_deduped,
+            "get_response_cache",
+            lambda: ResponseCache(str(tmp_path / "cache.sqlite3"), enabled=False),
+        )
+
+        results = await extract_deduped.extract_chunks_concurrently(
+            chunks, len(chunks), stateless=True
+        )
+        merged = extract_deduped.reduce_requirements(results)
+
+        assert len(app.state.batches) == 1
+        assert [r.description for g in merged.groups for r in g.requirements] == [
+            "Requirement from chunk 1",
+            "Requirement from chunk 2",
+        ]
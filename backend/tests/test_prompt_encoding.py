@@ -0,0 +1,47 @@
+import json
+
+from utils.prompt_encoding import encode_json, encode_requirements, prompt_encoding, token_report
+
+REQUIREMENTS = {
+    "groups": [
+        {
+            "category": "Formatting",
+            "description": "Gene | protein names",
+            "requirements": [
+                {
+                    "id": "1",
+                    "description": "Italicize gene symbols",
+                    "level": "sentence-level",
+                    "classification": "Imperative Standards",
+                    "category": "Formatting",
+                    "where": "Article prose",
+                    "when": "Always",
+                }
+            ],
+        }
+    ]
+}
+
+
+class TestPromptEncoding:
+    def test_compact_json_round_trips_and_is_smaller(self):
+        with prompt_encoding("pretty"):
+            pretty = encode_json(REQUIREMENTS)
+        with prompt_encoding("compact"):
+            compact = encode_json(REQUIREMENTS)
+        assert json.loads(compact) == REQUIREMENTS
+        assert len(compact) < len(pretty)
+
+    def test_digest_renders_one_row_per_requirement(self):
+        with prompt_encoding("digest"):
+            digest = encode_requirements(REQUIREMENTS)
+        assert digest.splitlines() == [
+            "id | level | classification | category | where | when | description",
+            "# Formatting: Gene / protein names",
+            "1 | sentence-level | Imperative Standards | Formatting | Article prose | Always"
+            " | Italicize gene symbols",
+        ]
+
+    def test_report_measures_savings_against_pretty(self):
+        report = token_report({"template": {"pretty": "a " * 100, "compact": "a " * 50}})
+        assert report[0]["savings"]["compact"] > 0
@@ -0,0 +1,111 @@
+import httpx
+import pytest
+
+from utils import llm, rate_limit
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "o1-mini",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = rate_limit.RateLimiter(requests_per_minute=600, tokens_per_minute=100000)
+    monkeypatch.setattr(llm, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(rate_limit.settings, "LLM_RETRY_BACKOFF", 0.001)
+    return limiter
+
+
+def rate_limited_server(failures: int):
+    """Answer with `failures` 429s before succeeding; returns (transport, request log)."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) <= failures:
+            return httpx.Response(
+                429,
+                json={"error": {"message": "Rate limit reached", "code": "rate_limit_exceeded"}},
+                headers={
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": "20ms",
+                },
+            )
+        return httpx.Response(
+            200,
+            json=completion("done"),
+            headers={
+                "x-ratelimit-limit-requests": "60",
+                "x-ratelimit-remaining-requests": "59",
+                "x-ratelimit-limit-tokens": "1000",
+                "x-ratelimit-remaining-tokens": "900",
+            },
+        )
+
+    return httpx.MockTransport(handler), requests
+
+
+class TestTokenBucket:
+    def test_waits_once_budget_is_spent(self):
+        bucket = rate_limit.TokenBucket(per_minute=60)
+        for _ in range(60):
+            assert bucket.reserve(1) == 0
+        assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_follows_reported_limits(self):
+        bucket = rate_limit.TokenBucket(per_minute=1000)
+        bucket.observe(limit=120, remaining=0)
+        assert bucket.capacity == 120
+        assert bucket.reserve(2) == pytest.approx(1.0, abs=0.05)
+
+    def test_parses_reset_durations(self):
+        assert rate_limit.parse_duration("6m0s") == 360
+        assert rate_limit.parse_duration("1.5s") == 1.5
+        assert rate_limit.parse_duration("120ms") == pytest.approx(0.12)
+        assert rate_limit.parse_duration("2") == 2
+        assert rate_limit.parse_duration(None) is None
+
+
+class TestRateLimitedClient:
+    @pytest.mark.anyio
+    async def test_429s_are_retried_not_raised(self, limiter):
+        transport, requests = rate_limited_server(failures=2)
+        client = llm.OpenAIClient(api_key="test", base_url="http://fake/v1", transport=transport)
+
+        assert await client.complete("o1-mini", "prompt") == "done"
+        assert len(requests) == 3
+        # The budgets now follow the headers of the successful response
+        assert limiter.limit("o1-mini").requests.capacity == 60
+        assert limiter.limit("o1-mini").tokens.capacity == 1000
+        await client.aclose()
+
+    def test_sync_calls_share_the_scheduler(self, limiter):
+        transport, requests = rate_limited_server(failures=1)
+        client = llm.OpenAIClient(api_key="test", base_url="http://fake/v1", transport=transport)
+
+        assert client.complete_sync("o1-mini", "prompt") == "done"
+        assert len(requests) == 2
+
+    @pytest.mark.anyio
+    async def test_gives_up_after_max_retries(self, limiter, monkeypatch):
+        monkeypatch.setattr(llm.settings, "LLM_MAX_RETRIES", 1)
+        transport, requests = rate_limited_server(failures=5)
+        client = llm.OpenAIClient(api_key="test", base_url="http://fake/v1", transport=transport)
+
+        with pytest.raises(llm.openai.RateLimitError):
+            await client.complete("o1-mini", "prompt")
+        assert len(requests) == 2
+        await client.aclose()
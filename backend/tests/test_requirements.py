@@ -0,0 +1,160 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from beanie import init_beanie
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError
+
+from config.config import settings
+from models.requirements import RequirementsDocument, RequirementsPayload
+from routes.requirements import get_requirements, list_requirements
+from utils.indexes import missing_indexes, plan_stages, verify_indexes, winning_plan
+from utils.payload_store import find_requirements, offload_payload
+
+REQUIREMENTS = {"groups": [{"description": "", "category": "Content", "requirements": []}]}
+
+
+@pytest.fixture
+async def documents():
+    client = AsyncMongoMockClient()
+    await client.drop_database("requirements_test")
+    await init_beanie(
+        database=client["requirements_test"],
+        document_models=[RequirementsDocument, RequirementsPayload],
+    )
+    start = datetime(2024, 1, 1)
+    for n in range(5):
+        await RequirementsDocument(
+            request_id=f"r{n}",
+            title=f"Guide {n}",
+            requirements=REQUIREMENTS,
+            # Two documents share a timestamp to exercise the _id tie-break
+            created_at=start + timedelta(days=min(n, 3)),
+        ).insert()
+    await RequirementsDocument(
+        request_id="failed", title="", requirements={}, status="error", created_at=start
+    ).insert()
+
+
+async def list_page(**params):
+    defaults = {"limit": 50, "cursor": None, "fields": None, "status": None, "stream": False}
+    return await list_requirements(**{**defaults, **params})
+
+
+class TestListRequirements:
+    @pytest.mark.anyio
+    async def test_pages_cover_every_document_once(self, documents):
+        seen = []
+        cursor = None
+        while True:
+            page = await list_page(limit=2, cursor=cursor)
+            seen += [item["request_id"] for item in page["data"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == ["r4", "r3", "r2", "r1", "r0"]
+
+    @pytest.mark.anyio
+    async def test_default_projection_leaves_out_requirements(self, documents):
+        page = await list_page(limit=1)
+        assert set(page["data"][0]) == {"title", "request_id", "status", "created_at"}
+
+        page = await list_page(limit=1, fields="request_id,requirements")
+        assert page["data"][0] == {"request_id": "r4", "requirements": REQUIREMENTS}
+
+    @pytest.mark.anyio
+    async def test_unknown_field_is_rejected(self, documents):
+        with pytest.raises(HTTPException) as error:
+            await list_page(fields="chunks")
+        assert error.value.status_code == 400
+
+    @pytest.mark.anyio
+    async def test_stream_yields_ndjson(self, documents):
+        response = await list_page(stream=True, fields="request_id")
+        lines = [line async for line in response.body_iterator]
+
+        assert [json.loads(line) for line in lines] == [
+            {"request_id": f"r{n}"} for n in range(4, -1, -1)
+        ]
+
+
+class TestPayloadOffload:
+    @pytest.mark.anyio
+    async def test_large_payload_is_compressed_out_of_line(self, documents, monkeypatch):
+        monkeypatch.setattr(settings, "REQUIREMENTS_OFFLOAD_BYTES", 100)
+        requirements = {"groups": [{"description": "x" * 1000, "requirements": []}]}
+        doc = RequirementsDocument(
+            request_id="big",
+            title="Big guide",
+            requirements=requirements,
+            chunks=[{"hash": "abc", "requirements": requirements}],
+        )
+        await (await offload_payload(doc)).insert()
+
+        stored = await RequirementsDocument.get_motor_collection().find_one({"request_id": "big"})
+        payload = await RequirementsPayload.find_one({"request_id": "big"})
+        assert stored["requirements"] == {} and stored["chunks"] == []
+        assert stored["payload_encoding"] == payload.encoding
+        assert len(payload.data) < payload.size
+
+        response = await get_requirements("big")
+        assert response["data"] == requirements
+        page = await list_page(limit=1, fields="request_id,requirements")
+        assert page["data"][0] == {"request_id": "big", "requirements": requirements}
+
+    @pytest.mark.anyio
+    async def test_lookup_leaves_out_chunks(self, documents):
+        chunks = [{"hash": "abc", "requirements": REQUIREMENTS}]
+        await RequirementsDocument(
+            request_id="chunked", title="", requirements=REQUIREMENTS, chunks=chunks
+        ).insert()
+
+        doc = await find_requirements({"request_id": "chunked"})
+
+        assert doc.requirements == REQUIREMENTS
+        assert doc.chunks == []
+        assert (await RequirementsDocument.find_one({"request_id": "chunked"})).chunks == chunks
+
+    @pytest.mark.anyio
+    async def test_small_payload_stays_inline(self, documents, monkeypatch):
+        monkeypatch.setattr(settings, "REQUIREMENTS_OFFLOAD_BYTES", 100000)
+        doc = await offload_payload(
+            RequirementsDocument(request_id="small", title="", requirements=REQUIREMENTS)
+        )
+        assert doc.payload_encoding is None
+        assert doc.requirements == REQUIREMENTS
+
+
+class TestIndexes:
+    @pytest.mark.anyio
+    async def test_declared_indexes_are_created(self, documents):
+        assert await missing_indexes(RequirementsDocument) == []
+        await verify_indexes([RequirementsDocument])
+
+    @pytest.mark.anyio
+    async def test_missing_index_fails_verification(self, documents):
+        await RequirementsDocument.get_motor_collection().drop_index("request_id_1")
+        with pytest.raises(RuntimeError):
+            await verify_indexes([RequirementsDocument])
+
+    @pytest.mark.anyio
+    async def test_duplicate_request_id_is_rejected(self, documents):
+        with pytest.raises(DuplicateKeyError):
+            await RequirementsDocument(request_id="r0", title="", requirements={}).insert()
+
+    def test_collscan_is_found_in_nested_plans(self):
+        explain = {
+            "queryPlanner": {
+                "winningPlan": {
+                    "stage": "SORT",
+                    "inputStage": {
+                        "stage": "OR",
+                        "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}],
+                    },
+                }
+            }
+        }
+        assert list(plan_stages(winning_plan(explain))) == ["SORT", "OR", "IXSCAN", "COLLSCAN"]
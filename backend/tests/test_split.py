@@ -0,0 +1,105 @@
+from prompts.evaluate import evaluate_index
+from utils import split
+
+
+ARTICLE = """Text before the first heading is dropped.
+# Aldolase A
+Aldolase A is an enzyme.  It is encoded by ALDOA!
+
+## Structure ##
+#
+Lost under an empty heading.
+### Active site
+"""
+
+
+class TestSplit:
+    def test_sections_are_offsets_into_the_text(self):
+        spans = list(split.scan_sections(ARTICLE))
+
+        assert [(span.index, span.level, span.title(ARTICLE)) for span in spans] == [
+            (1, 1, "Aldolase A"),
+            (2, 2, "Structure"),
+            (3, 3, "Active site"),
+        ]
+        assert spans[0].content(ARTICLE) == "Aldolase A is an enzyme.  It is encoded by ALDOA!"
+        assert ARTICLE[spans[0].start:spans[0].end] == spans[0].content(ARTICLE)
+        assert spans[1].content(ARTICLE) == ""
+        assert spans[2].content(ARTICLE) == ""
+
+    def test_sentences_are_offsets_into_the_text(self):
+        span = next(split.scan_sections(ARTICLE))
+        sentences = list(split.scan_sentences(ARTICLE, span.start, span.end))
+
+        assert [ARTICLE[start:end] for start, end in sentences] == [
+            "Aldolase A is an enzyme.",
+            "It is encoded by ALDOA!",
+        ]
+
+    def test_section_dicts(self):
+        sections = split.parse_markdown_to_sections(ARTICLE)
+
+        assert sections[0] == {
+            "index": 1,
+            "title": "Aldolase A",
+            "content": "Aldolase A is an enzyme.  It is encoded by ALDOA!",
+            "level": 1,
+        }
+        # Evaluation sections go into prompts and cache keys without a level
+        assert evaluate_index.parse_markdown_to_sections(ARTICLE)[0] == {
+            "index": 1,
+            "title": "Aldolase A",
+            "content": "Aldolase A is an enzyme.  It is encoded by ALDOA!",
+        }
+        assert evaluate_index.split_into_sentences(sections[0]["content"]) == [
+            {"index": 1, "sentence": "Aldolase A is an enzyme."},
+            {"index": 2, "sentence": "It is encoded by ALDOA!"},
+        ]
+
+    def test_large_text_is_scanned_lazily(self):
+        text = "# Heading\nOne sentence. Another one.\n" * 100000
+        spans = split.scan_sections(text)
+
+        assert next(spans).content(text) == "One sentence. Another one."
+        assert sum(1 for _ in spans) == 99999
+
+
+SCIENTIFIC = (
+    "ALDOA was cloned by Sakakibara et al. in 1989. See Fig. 2 for its structure. "
+    "Activity peaks at pH 7.4 (e.g. in muscle). mTOR does not bind it. J. Smith used "
+    "E. coli cultures, buffers, etc. The assay took approx. 5 min."
+)
+
+
+class TestSentenceSegmenter:
+    def test_abbreviations_and_numbers_do_not_end_sentences(self):
+        assert split.split_into_sentences(SCIENTIFIC) == [
+            "ALDOA was cloned by Sakakibara et al. in 1989.",
+            "See Fig. 2 for its structure.",
+            "Activity peaks at pH 7.4 (e.g. in muscle).",
+            "mTOR does not bind it.",
+            "J. Smith used E. coli cultures, buffers, etc.",
+            "The assay took approx. 5 min.",
+        ]
+
+    def test_closing_quotes_and_lexicon(self):
+        text = 'He said "It binds." Then it stopped. Use approx. Values vary.'
+
+        assert split.split_into_sentences(text) == [
+            'He said "It binds."',
+            "Then it stopped.",
+            "Use approx. Values vary.",
+        ]
+        assert [
+            text[start:end]
+            for start, end in split.scan_sentences(text, abbreviations=frozenset())
+        ][-2:] == ["Use approx.", "Values vary."]
+
+    def test_batch(self):
+        texts = [SCIENTIFIC, "", "One. Two."]
+        offsets = split.scan_sentences_batch(texts)
+
+        assert len(offsets[0]) == 6
+        assert offsets[1] == []
+        assert offsets[2] == [(0, 4), (5, 9)]
+        assert split.split_into_sentences_batch(texts)[2] == ["One.", "Two."]
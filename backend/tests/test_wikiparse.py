@@ -0,0 +1,67 @@
+from prompts.extract.format import convert_wikitext, convert_wikitext_to_markdown
+from utils import wikiparse
+
+
+ARTICLE = """{{Infobox gene|name=ALDOA}}
+'''Aldolase A''' is an [[enzyme]] encoded by the [[Gene|gene]] ''ALDOA''.<ref>{{cite journal|title=Aldolase}}</ref>
+[[File:ALDOA structure.png|thumb|The [[protein]] structure]]
+
+== Structure ==
+It forms a tetramer.<ref name="pdb" />
+{| class="wikitable"
+| cell
+|}
+
+=== Active site ===
+See [https://www.rcsb.org the PDB] for details.
+* Lys229
+<!-- hidden note -->
+[[Category:Genes]]
+"""
+
+
+class TestWikiparse:
+    def test_sections_from_wikitext(self):
+        sections = wikiparse.parse_sections(ARTICLE, "ALDOA")
+
+        assert sections == [
+            {
+                "index": 1,
+                "level": 1,
+                "title": "ALDOA",
+                "content": "Aldolase A is an enzyme encoded by the gene ALDOA.",
+            },
+            {"index": 2, "level": 2, "title": "Structure", "content": "It forms a tetramer."},
+            {
+                "index": 3,
+                "level": 3,
+                "title": "Active site",
+                "content": "See the PDB for details.\n- Lys229",
+            },
+        ]
+
+    def test_markup_is_kept_when_configured(self):
+        text = wikiparse.clean_wikitext(
+            ARTICLE, drop_images=False, drop_templates=False, drop_refs=False, drop_tables=False
+        )
+
+        assert "{{Infobox gene|name=ALDOA}}" in text
+        assert "{{cite journal|title=Aldolase}}" in text
+        assert "[[File:ALDOA structure.png|thumb|The protein structure]]" in text
+        assert "| cell" in text
+
+    def test_unterminated_template_keeps_the_text(self):
+        sections = wikiparse.parse_sections("Intro. {{broken\n== Usage ==\nText.")
+
+        assert [section["title"] for section in sections] == ["Lead", "Usage"]
+        assert sections[1]["content"] == "Text."
+
+    def test_markdown_and_sentences(self):
+        markdown = convert_wikitext_to_markdown(ARTICLE, "ALDOA")
+        sections = convert_wikitext(ARTICLE, "ALDOA")
+
+        assert markdown.startswith("# ALDOA\nAldolase A is an enzyme")
+        assert "\n\n## Structure\nIt forms a tetramer." in markdown
+        assert "\n\n### Active site\n" in markdown
+        assert sections[1]["sentences"] == ["It forms a tetramer."]
+        assert "content" not in sections[1]
@@ -0,0 +1,203 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from config.config import settings
+from utils import wikitext
+from utils.cache import ResponseCache
+
+PAGES = {
+    "Wikipedia:WikiProject Spiders/Style guide": "== Page title ==\nUse sentence case.",
+    "ABCC11": "'''ABCC11''' is a gene.",
+}
+
+
+class StubMediaWiki(BaseHTTPRequestHandler):
+    requests = []
+    failures = 0
+    revid = 1
+    # Pages with content per response before the stub asks to continue (None: no limit)
+    content_limit = None
+    # Older revisions by revid: (title, content)
+    history = {}
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        StubMediaWiki.requests.append(params)
+
+        if StubMediaWiki.failures:
+            StubMediaWiki.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if "revids" in params:
+            self.send_json(self.revisions(params["revids"].split("|")))
+            return
+
+        titles = params["titles"].split("|")
+        normalized = [
+            {"from": title, "to": title.replace("_", " ")}
+            for title in titles
+            if "_" in title
+        ]
+        pages = []
+        offset = int(params.get("rvcontinue", 0))
+        limit = StubMediaWiki.content_limit or len(titles)
+        found = 0
+        for title in titles:
+            title = title.replace("_", " ")
+            if title in PAGES:
+                page = {"title": title}
+                if offset <= found < offset + limit:
+                    revision = {"revid": StubMediaWiki.revid}
+                    if "content" in params["rvprop"]:
+                        revision["slots"] = {"main": {"content": PAGES[title]}}
+                    page["revisions"] = [revision]
+                found += 1
+                pages.append(page)
+            else:
+                pages.append({"title": title, "missing": True})
+
+        response = {"query": {"normalized": normalized, "pages": pages}}
+        if offset + limit < found:
+            response["continue"] = {"rvcontinue": str(offset + limit), "continue": "||"}
+        self.send_json(response)
+
+    def revisions(self, revids):
+        pages = {}
+        badrevids = {}
+        for revid in map(int, revids):
+            if revid not in StubMediaWiki.history:
+                badrevids[str(revid)] = {"revid": revid, "missing": True}
+                continue
+            title, content = StubMediaWiki.history[revid]
+            page = pages.setdefault(title, {"title": title, "revisions": []})
+            page["revisions"].append({"revid": revid, "slots": {"main": {"content": content}}})
+        query = {"pages": list(pages.values())}
+        if badrevids:
+            query["badrevids"] = badrevids
+        return {"query": query}
+
+    def send_json(self, response):
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+async def stub_api(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubMediaWiki)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubMediaWiki.requests = []
+    StubMediaWiki.failures = 0
+    StubMediaWiki.revid = 1
+    StubMediaWiki.content_limit = None
+    StubMediaWiki.history = {}
+    cache = ResponseCache(str(tmp_path / "wikitext.sqlite3"))
+    monkeypatch.setattr(wikitext, "get_wikitext_cache", lambda: cache)
+    monkeypatch.setattr(
+        settings, "WIKIPEDIA_API_URL", f"http://127.0.0.1:{server.server_port}/w/api.php"
+    )
+    monkeypatch.setattr(settings, "WIKIPEDIA_BACKOFF", 0.01)
+    yield StubMediaWiki
+    await wikitext.close_client()
+    server.shutdown()
+    server.server_close()
+
+
+class TestFetchWikitext:
+    @pytest.mark.anyio
+    async def test_fetch_from_url(self, stub_api):
+        content = await wikitext.fetch_wikitext(
+            "https://en.wikipedia.org/wiki/Wikipedia:WikiProject_Spiders/Style_guide"
+        )
+        assert content == PAGES["Wikipedia:WikiProject Spiders/Style guide"]
+
+    @pytest.mark.anyio
+    async def test_missing_page_returns_none(self, stub_api):
+        assert await wikitext.fetch_wikitext("https://en.wikipedia.org/wiki/Nope") is None
+
+    @pytest.mark.anyio
+    async def test_titles_are_batched_into_one_request(self, stub_api):
+        result = await wikitext.fetch_wikitexts(["ABCC11", "Nope", "ABCC11"])
+        assert result == {"ABCC11": PAGES["ABCC11"], "Nope": None}
+        assert len(stub_api.requests) == 1
+        assert stub_api.requests[0]["titles"] == "ABCC11|Nope"
+
+    @pytest.mark.anyio
+    async def test_large_batches_are_split(self, stub_api):
+        titles = [f"Page {n}" for n in range(wikitext.MAX_TITLES_PER_REQUEST + 1)]
+        await wikitext.fetch_wikitexts(titles)
+        assert len(stub_api.requests) == 2
+
+    @pytest.mark.anyio
+    async def test_continued_queries_are_followed(self, stub_api):
+        stub_api.content_limit = 1
+        titles = ["Wikipedia:WikiProject Spiders/Style guide", "ABCC11", "Nope"]
+
+        result = await wikitext.fetch_wikitexts(titles)
+
+        assert result == {title: PAGES.get(title) for title in titles}
+        assert [request.get("rvcontinue") for request in stub_api.requests] == [None, "1"]
+
+    @pytest.mark.anyio
+    async def test_transient_errors_are_retried(self, stub_api):
+        stub_api.failures = 2
+        assert await wikitext.fetch_wikitext("ABCC11") == PAGES["ABCC11"]
+        assert len(stub_api.requests) == 3
+
+
+class TestRevisionCache:
+    @pytest.mark.anyio
+    async def test_unchanged_revision_reuses_cached_content(self, stub_api):
+        first = await wikitext.fetch_page("ABCC11")
+        second = await wikitext.fetch_page("ABCC11")
+
+        assert second == first
+        assert [request["rvprop"] for request in stub_api.requests] == ["ids|content", "ids"]
+
+    @pytest.mark.anyio
+    async def test_new_revision_is_downloaded(self, stub_api):
+        await wikitext.fetch_page("ABCC11")
+        stub_api.revid = 2
+        page = await wikitext.fetch_page("ABCC11")
+
+        assert page.revid == 2
+        assert [request["rvprop"] for request in stub_api.requests] == [
+            "ids|content",
+            "ids",
+            "ids|content",
+        ]
+
+    @pytest.mark.anyio
+    async def test_fetch_revision_skips_content(self, stub_api):
+        assert await wikitext.fetch_revision("https://en.wikipedia.org/wiki/ABCC11") == 1
+        assert stub_api.requests[0]["rvprop"] == "ids"
+
+    @pytest.mark.anyio
+    async def test_specific_revisions_are_fetched_by_id(self, stub_api):
+        stub_api.history = {
+            7: ("ABCC11", "Old text."),
+            8: ("ABCC11", "Newer text."),
+            9: ("ALDOA", "Other page."),
+        }
+
+        pages = await wikitext.fetch_revision_contents([7, 9, 404])
+        again = await wikitext.fetch_revision_content(7)
+
+        assert pages[7] == wikitext.WikiPage(title="ABCC11", revid=7, content="Old text.")
+        assert pages[9].title == "ALDOA"
+        assert pages[404] is None
+        assert again == pages[7]
+        assert [request["revids"] for request in stub_api.requests] == ["7|9|404"]
@@ -0,0 +1,158 @@
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Wording in `where` that does not narrow a requirement down to particular sections
+GENERIC_WHERE_WORDS = {
+    "a", "all", "an", "and", "any", "anywhere", "applicable", "appropriate", "article",
+    "articles", "body", "content", "each", "entire", "every", "general", "in", "main",
+    "of", "or", "paragraph", "paragraphs", "prose", "relevant", "section", "sections",
+    "sentence", "sentences", "text", "the", "throughout", "to", "when", "where", "whole",
+    "within",
+}
+
+# Wording in `where` that points at the top of the article
+LEAD_WORDS = {"first", "infobox", "introduction", "lead", "opening", "taxobox", "top"}
+
+# Wording in `when` that means the requirement is unconditional
+UNCONDITIONAL_WHEN = {"", "always", "all times", "at all times", "any time", "n/a", "none"}
+
+CONDITION_STOPWORDS = GENERIC_WHERE_WORDS | {
+    "are", "be", "been", "being", "by", "for", "if", "is", "it", "its", "on", "only",
+    "such", "that", "there", "these", "they", "this", "those", "used", "using", "with",
+}
+
+NON_APPLICABLE = "non-applicable elements"
+CONTEXTUAL = "contextual considerations"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of `text` with a naive plural stripped, so "References" matches "reference"."""
+    words = re.findall(r"[a-z0-9]+", text.casefold())
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words]
+
+
+def where_matches(requirement: Dict, section: Dict, is_lead: bool) -> bool:
+    """Check whether the requirement's `where` covers the section."""
+    where_words = [
+        word for word in tokenize(requirement.get("where", ""))
+        if word not in GENERIC_WHERE_WORDS
+    ]
+    if not where_words:
+        return True
+    if is_lead and LEAD_WORDS.intersection(where_words):
+        return True
+    title_words = set(tokenize(section.get("title", "")))
+    return any(word in title_words for word in where_words)
+
+
+def when_matches(requirement: Dict, section_text: str) -> bool:
+    """Check whether a conditional requirement's `when` is plausibly met by the section text."""
+    when = requirement.get("when", "").strip().casefold()
+    if when in UNCONDITIONAL_WHEN:
+        return True
+    condition_words = {
+        word for word in tokenize(when)
+        if word not in CONDITION_STOPWORDS and len(word) > 2
+    }
+    if not condition_words:
+        return True
+    return bool(condition_words & set(tokenize(section_text)))
+
+
+def is_candidate(requirement: Dict, section: Dict, is_lead: bool) -> bool:
+    """Apply the rule-based applicability checks for one requirement and one section."""
+    classification = requirement.get("classification", "").strip().casefold()
+    if classification == NON_APPLICABLE:
+        return False
+
+    level = requirement.get("level", "").strip().casefold()
+    content = section.get("content", "")
+    section_text = f"{section.get('title', '')}\n{content}"
+
+    if level.startswith("article"):
+        # Article-level requirements are judged once, alongside the lead section
+        return is_lead
+    if not content.strip():
+        # Nothing to grade at section or sentence level in an empty section
+        return False
+    if not where_matches(requirement, section, is_lead):
+        return False
+    if classification == CONTEXTUAL and not when_matches(requirement, section_text):
+        return False
+    return True
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def embedding_scorer(
+    embed: Callable[[List[str]], List[List[float]]],
+) -> Callable[[Dict, Dict], float]:
+    """
+    Build a requirement/section relevance scorer from an embedding function.
+
+    Args:
+    embed (Callable): Maps a list of texts to a list of embedding vectors
+
+    Returns:
+    Callable[[Dict, Dict], float]: Cosine similarity between a requirement and a section
+    """
+    vectors: Dict[str, List[float]] = {}
+
+    def vector(text: str) -> List[float]:
+        if text not in vectors:
+            vectors[text] = embed([text])[0]
+        return vectors[text]
+
+    def score(requirement: Dict, section: Dict) -> float:
+        requirement_text = f"{requirement.get('description', '')}\n{requirement.get('where', '')}"
+        section_text = f"{section.get('title', '')}\n{section.get('content', '')}"
+        return cosine_similarity(vector(requirement_text), vector(section_text))
+
+    return score
+
+
+def select_requirements(
+    requirements: Any,
+    section: Dict,
+    is_lead: bool = False,
+    scorer: Optional[Callable[[Dict, Dict], float]] = None,
+    threshold: float = 0.0,
+) -> Any:
+    """
+    Pick the requirements that are candidates for evaluating a section.
+
+    Uses the `level`, `where`, `when` and `classification` fields of each extracted requirement.
+    If a `scorer` is given (for example from `embedding_scorer`), section- and sentence-level
+    candidates must also score at least `threshold` against the section.
+
+    Args:
+    requirements (Any): Requirements document ({"groups": [...]}) or list of requirements
+    section (Dict): Section with "title" and "content"
+    is_lead (bool): Whether the section is the article's lead (its first section with content)
+    scorer (Callable, optional): Relevance score of a requirement for a section
+    threshold (float): Minimum score for a requirement to be kept when `scorer` is given
+
+    Returns:
+    Any: The candidates, in the same shape as `requirements`
+    """
+
+    def keep(requirement: Dict) -> bool:
+        if not is_candidate(requirement, section, is_lead):
+            return False
+        if scorer is None or requirement.get("level", "").casefold().startswith("article"):
+            return True
+        return scorer(requirement, section) >= threshold
+
+    if isinstance(requirements, dict):
+        groups = []
+        for group in requirements.get("groups", []):
+            candidates = [r for r in group.get("requirements", []) if keep(r)]
+            if candidates:
+                groups.append({**group, "requirements": candidates})
+        return {**requirements, "groups": groups}
+    return [requirement for requirement in requirements if keep(requirement)]
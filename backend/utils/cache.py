@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from config.config import settings
+
+
+def make_cache_key(model: str, template_version: str, payload: Any) -> str:
+    """
+    Build a content-addressed cache key for an LLM call.
+
+    Args:
+    model (str): Model the prompt is sent to
+    template_version (str): Version of the prompt template; bump it when the template changes
+    payload (Any): JSON-serializable inputs that are interpolated into the template
+
+    Returns:
+    str: Hex SHA-256 digest identifying the call
+    """
+    body = json.dumps(
+        {"model": model, "template_version": template_version, "payload": payload},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite store of LLM responses with TTL expiry and LRU eviction.
+
+    get/set block on SQLite I/O; code running on the event loop uses aget/aset, which do
+    the same work in a thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None if it is missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response, evicting the least recently used entries beyond `max_entries`."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.max_entries is not None:
+                (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            conn.commit()
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() without blocking the event loop."""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """set() without blocking the event loop."""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache configured from settings."""
+    return ResponseCache(
+        path=settings.LLM_CACHE_PATH,
+        ttl=settings.LLM_CACHE_TTL,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        enabled=settings.LLM_CACHE_ENABLED,
+    )
@@ -0,0 +1,161 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from config.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency; token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Wikitext "== Heading ==" lines and markdown "# Heading" lines start a new section
+HEADING_PATTERN = re.compile(r"^(?:(={2,6})[^=].*\1|#{1,6}\s.*)\s*$", re.MULTILINE)
+# Tried in order when a block is larger than the budget: paragraphs, lines, sentences, words
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+TokenCounter = Callable[[str], int]
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Return the tiktoken encoding of `model`, or None if it cannot be loaded."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use, which fails offline
+        logger.warning(f"Token encoding for {model} unavailable, estimating counts: {str(e)}")
+        return None
+
+
+def token_counter(model: str) -> TokenCounter:
+    """Count tokens as `model` does, or estimate ~4 characters per token without tiktoken."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return lambda text: (len(text) + 3) // 4
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def split_sections(text: str) -> List[str]:
+    """Split text before every heading line, keeping each heading with its body."""
+    starts = [match.start() for match in HEADING_PATTERN.finditer(text)]
+    bounds = [0] + [start for start in starts if start > 0] + [len(text)]
+    sections = [text[start:end].strip() for start, end in zip(bounds, bounds[1:])]
+    return [section for section in sections if section]
+
+
+def split_block(block: str, max_tokens: int, count: TokenCounter, level: int = 0) -> List[str]:
+    """Split a block that exceeds `max_tokens` on the coarsest separator that works."""
+    if count(block) <= max_tokens:
+        return [block]
+    if level == len(SEPARATORS):
+        # A single unbroken run of text: cut it into equal parts
+        parts = -(-count(block) // max_tokens)
+        size = -(-len(block) // parts)
+        return [block[start:start + size] for start in range(0, len(block), size)]
+
+    # Split after each separator so it stays with the text before it
+    pieces = re.split(f"(?<={re.escape(SEPARATORS[level])})", block)
+    pieces = [piece for piece in pieces if piece.strip()]
+    if len(pieces) == 1:
+        return split_block(block, max_tokens, count, level + 1)
+
+    parts: List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = current + piece
+        if count(candidate) <= max_tokens:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+        if count(piece) <= max_tokens:
+            current = piece
+        else:
+            parts.extend(split_block(piece, max_tokens, count, level + 1))
+            current = ""
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def overlap_tail(pieces: List[str], overlap_tokens: int, count: TokenCounter) -> List[str]:
+    """The trailing paragraphs of a chunk that fit within `overlap_tokens`."""
+    paragraphs = "\n\n".join(pieces).split("\n\n")
+    tail: List[str] = []
+    for paragraph in reversed(paragraphs):
+        if count("\n\n".join([paragraph] + tail)) > overlap_tokens:
+            break
+        tail.insert(0, paragraph)
+    return ["\n\n".join(tail)] if tail else []
+
+
+def chunk_text(
+    text: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+    count: Optional[TokenCounter] = None,
+) -> List[str]:
+    """
+    Split text into chunks of at most `max_tokens` model tokens, following its structure.
+
+    Whole sections (a heading and its body) are packed into chunks, so a section is only
+    split when it does not fit in a chunk by itself; it is then split on paragraphs, then
+    lines, sentences and words. With `overlap_tokens`, each chunk starts with the last
+    paragraphs of the previous one, as context. Empty chunks are never returned.
+
+    Args:
+    text (str): Style guide wikitext or markdown
+    max_tokens (int, optional): Token budget per chunk (default EXTRACTION_CHUNK_TOKENS)
+    overlap_tokens (int, optional): Context repeated from the previous chunk
+        (default EXTRACTION_CHUNK_OVERLAP_TOKENS)
+    model (str, optional): Model whose tokenizer is used (default LLM_EXTRACTION_MODEL)
+    count (TokenCounter, optional): Token counting function, overriding `model`
+
+    Returns:
+    List[str]: Chunks in document order
+    """
+    if max_tokens is None:
+        max_tokens = settings.EXTRACTION_CHUNK_TOKENS
+    if overlap_tokens is None:
+        overlap_tokens = settings.EXTRACTION_CHUNK_OVERLAP_TOKENS
+    if count is None:
+        count = token_counter(model or settings.LLM_EXTRACTION_MODEL)
+
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    # True while `current` only holds context repeated from the previous chunk
+    only_overlap = False
+
+    def fits(pieces: List[str]) -> bool:
+        return count("\n\n".join(pieces)) <= max_tokens
+
+    def start_chunk():
+        nonlocal current, only_overlap
+        if current and not only_overlap:
+            chunks.append(current)
+        tail = overlap_tail(current, overlap_tokens, count) if overlap_tokens and current else []
+        current, only_overlap = tail, bool(tail)
+
+    for section in split_sections(text):
+        for piece in split_block(section, max_tokens, count):
+            if not fits(current + [piece]):
+                start_chunk()
+                if not fits(current + [piece]):
+                    # No room left for the overlap
+                    current, only_overlap = [], False
+            current.append(piece)
+            only_overlap = False
+    if current and not only_overlap:
+        chunks.append(current)
+
+    return ["\n\n".join(chunk) for chunk in chunks]
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple, Type
+
+from beanie import Document
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+import models
+from models.evaluation import Evaluation, EvaluationCheckpoint
+from models.job import Job, JobEvent
+from models.requirements import RequirementsDocument
+
+logger = logging.getLogger(__name__)
+
+IndexKey = Tuple[Tuple[str, Any], ...]
+
+# The queries the routes and the worker send, by name: (model, filter, sort)
+ROUTE_QUERIES: Dict[str, Tuple[Type[Document], Dict[str, Any], List[Tuple[str, int]]]] = {
+    "requirements.by_request_id": (RequirementsDocument, {"request_id": "example"}, []),
+    "requirements.completed_by_request_id": (
+        RequirementsDocument,
+        {"request_id": "example", "status": "completed"},
+        [],
+    ),
+    "requirements.latest_for_url": (
+        RequirementsDocument,
+        {"url": "https://en.wikipedia.org/wiki/Example", "status": "completed"},
+        [("created_at", DESCENDING)],
+    ),
+    "requirements.list_page": (
+        RequirementsDocument,
+        {"status": "completed"},
+        [("created_at", DESCENDING), ("_id", DESCENDING)],
+    ),
+    "evaluations.by_key": (
+        Evaluation,
+        {
+            "article_key": "revid:1",
+            "requirements_request_id": "example",
+            "prompt_version": "o1-preview/2",
+        },
+        [],
+    ),
+    "evaluations.scoreboard": (
+        Evaluation,
+        {"requirements_request_id": "example", "status": "completed"},
+        [("summary.score", DESCENDING)],
+    ),
+    "evaluation_checkpoints.by_key": (EvaluationCheckpoint, {"key": {"$in": ["example"]}}, []),
+    "jobs.by_job_id": (Job, {"job_id": "example"}, []),
+    "jobs.by_dedupe_key": (Job, {"dedupe_key": "extract:url:Example"}, []),
+    "jobs.lease": (
+        Job,
+        {
+            "$or": [
+                {"status": "queued", "run_after": {"$lte": datetime(2024, 1, 1)}},
+                {"status": "running", "lease_expires_at": {"$lt": datetime(2024, 1, 1)}},
+            ]
+        },
+        [("priority", DESCENDING), ("created_at", ASCENDING)],
+    ),
+    "job_events.after_seq": (
+        JobEvent,
+        {"job_id": "example", "seq": {"$gt": 0}},
+        [("seq", ASCENDING)],
+    ),
+}
+
+
+def index_key(index: Any) -> IndexKey:
+    """Normalize an index declared in `Settings.indexes` or read from `index_information`."""
+    if isinstance(index, IndexModel):
+        index = index.document["key"]
+    if isinstance(index, str):
+        return ((index, ASCENDING),)
+    if isinstance(index, dict):
+        index = index.items()
+    return tuple((field, direction) for field, direction in index)
+
+
+def declared_indexes(model: Type[Document]) -> List[IndexKey]:
+    return [index_key(index) for index in getattr(model.Settings, "indexes", [])]
+
+
+async def missing_indexes(model: Type[Document]) -> List[IndexKey]:
+    """Return the indexes declared on `model` that do not exist in its collection."""
+    information = await model.get_motor_collection().index_information()
+    existing = {index_key(index["key"]) for index in information.values()}
+    return [key for key in declared_indexes(model) if key not in existing]
+
+
+async def verify_indexes(models: List[Type[Document]]):
+    """
+    Check at startup that every declared index exists.
+
+    Raises:
+    RuntimeError: If any declared index is missing
+    """
+    missing = {}
+    for model in models:
+        keys = await missing_indexes(model)
+        if keys:
+            missing[model.Settings.name] = keys
+    if missing:
+        raise RuntimeError(f"Missing MongoDB indexes: {missing}")
+    logger.info("All declared MongoDB indexes are present")
+
+
+def plan_stages(plan: Any) -> Iterator[str]:
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+def winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    return explain.get("queryPlanner", {}).get("winningPlan", {})
+
+
+async def audit_queries() -> Dict[str, List[str]]:
+    """
+    Run explain() on every query in ROUTE_QUERIES.
+
+    Returns:
+    Dict[str, List[str]]: Stages of the winning plan per query name
+    """
+    report = {}
+    for name, (model, query, sort) in ROUTE_QUERIES.items():
+        cursor = model.get_motor_collection().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        report[name] = list(plan_stages(winning_plan(explain)))
+    return report
+
+
+async def main() -> int:
+    from config.config import initiate_database
+
+    await initiate_database()
+    # The same models initiate_database initializes
+    await verify_indexes(models.__all__)
+
+    report = await audit_queries()
+    scans = [name for name, stages in report.items() if "COLLSCAN" in stages]
+    for name, stages in report.items():
+        print(json.dumps({"query": name, "stages": stages, "collscan": name in scans}))
+    if scans:
+        print(f"Collection scans: {', '.join(scans)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config.config import settings
+from models.job import Job, JobSlot
+from utils.progress import record_event
+
+logger = logging.getLogger(__name__)
+
+JobRunner = Callable[[Job], Awaitable[Any]]
+FailureHook = Callable[[Job, str], Awaitable[Any]]
+
+# kind -> (runner, hook called once a job has failed its last attempt)
+HANDLERS: Dict[str, Tuple[JobRunner, Optional[FailureHook]]] = {}
+
+
+def register_handler(kind: str, run: JobRunner, on_failure: Optional[FailureHook] = None):
+    """Register the coroutine that workers run for jobs of `kind`."""
+    HANDLERS[kind] = (run, on_failure)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+async def enqueue_job(
+    kind: str,
+    payload: Dict[str, Any],
+    job_id: Optional[str] = None,
+    priority: int = 0,
+    max_attempts: Optional[int] = None,
+    dedupe_key: Optional[str] = None,
+) -> Job:
+    """
+    Persist a job for the worker processes to pick up.
+
+    With a `dedupe_key`, submissions are single-flight: while a job with the same key is queued
+    or running, that job is returned instead of a new one being created, across all API
+    processes. Callers can compare the returned `job_id` with the one they asked for.
+
+    Args:
+    kind (str): Registered handler name
+    payload (Dict[str, Any]): JSON-serializable job arguments
+    job_id (str, optional): Identifier of the job; a UUID is generated if omitted
+    priority (int): Jobs with a higher priority are leased first
+    max_attempts (int, optional): Attempts before the job is marked failed
+    dedupe_key (str, optional): Identity of the work, e.g. the style guide URL or content hash
+
+    Returns:
+    Job: The queued job, or the active job already queued for `dedupe_key`
+    """
+    job = Job(
+        job_id=job_id or str(uuid.uuid4()),
+        kind=kind,
+        payload=payload,
+        priority=priority,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if dedupe_key is None:
+        await job.insert()
+        logger.info(f"Queued {kind} job {job.job_id} (priority {priority})")
+        return job
+
+    # Only active jobs carry a dedupe_key, and a unique sparse index allows one per key, so
+    # this upsert either matches the active job or inserts ours
+    document = job.model_dump(exclude={"id", "dedupe_key"})
+    for attempt in range(2):
+        try:
+            raw = await Job.get_motor_collection().find_one_and_update(
+                {"dedupe_key": dedupe_key},
+                {"$setOnInsert": document},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            break
+        except DuplicateKeyError:
+            # Another process inserted the same key between our match and our insert
+            if attempt:
+                raise
+    existing = Job.model_validate(raw)
+    if existing.job_id == job.job_id:
+        logger.info(f"Queued {kind} job {job.job_id} (priority {priority})")
+    else:
+        logger.info(f"Joined in-flight {kind} job {existing.job_id} for {dedupe_key}")
+    return existing
+
+
+async def lease_job(worker_id: str, lease_seconds: Optional[int] = None) -> Optional[Job]:
+    """
+    Atomically claim the next ready job, or None if the queue is empty.
+
+    Queued jobs whose `run_after` has passed are eligible, and so are running jobs whose lease
+    expired because their worker died. Jobs are taken by priority, then oldest first.
+    """
+    now = datetime.utcnow()
+    lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+    raw = await Job.get_motor_collection().find_one_and_update(
+        {
+            "$or": [
+                {"status": "queued", "run_after": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": now + lease,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("priority", -1), ("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return Job.model_validate(raw) if raw else None
+
+
+async def renew_lease(job: Job, worker_id: str, lease_seconds: Optional[int] = None) -> bool:
+    """Extend the lease on a running job; returns False if another worker has taken it over."""
+    now = datetime.utcnow()
+    lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+    result = await Job.get_motor_collection().update_one(
+        {"_id": job.id, "status": "running", "lease_owner": worker_id},
+        {"$set": {"lease_expires_at": now + lease, "updated_at": now}},
+    )
+    return result.modified_count == 1
+
+
+async def report(job: Job, event: str, data: Dict[str, Any]):
+    """Append a lifecycle event to the job's progress log."""
+    try:
+        await record_event(job.job_id, event, data)
+    except Exception as e:
+        logger.warning(f"Could not record {event} event for job {job.job_id}: {str(e)}")
+
+
+async def complete_job(job: Job, worker_id: str):
+    # The event is written before the status so that a client streaming events sees it
+    # before it sees the job finish
+    await report(job, "completed", {"attempt": job.attempts})
+    await Job.get_motor_collection().update_one(
+        {"_id": job.id, "lease_owner": worker_id},
+        {
+            "$set": {
+                "status": "completed",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "error": None,
+                "updated_at": datetime.utcnow(),
+            },
+            # Later submissions of the same work start a new job
+            "$unset": {"dedupe_key": ""},
+        },
+    )
+
+
+async def fail_job(job: Job, worker_id: str, error: str) -> bool:
+    """
+    Record a failed attempt, re-queueing the job with exponential backoff if it has attempts left.
+
+    Returns:
+    bool: True if the job is now permanently failed
+    """
+    now = datetime.utcnow()
+    final = job.attempts >= job.max_attempts
+    update = {
+        "status": "failed" if final else "queued",
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "error": error,
+        "updated_at": now,
+    }
+    if not final:
+        delay = settings.JOB_RETRY_BACKOFF * 2 ** max(job.attempts - 1, 0)
+        update["run_after"] = now + timedelta(seconds=delay)
+        logger.warning(
+            f"{job.kind} job {job.job_id} failed (attempt {job.attempts}/{job.max_attempts}), "
+            f"retrying in {delay:.0f}s: {error}"
+        )
+    else:
+        logger.error(f"{job.kind} job {job.job_id} failed after {job.attempts} attempts: {error}")
+    await report(
+        job,
+        "failed" if final else "retrying",
+        {"attempt": job.attempts, "max_attempts": job.max_attempts, "error": error},
+    )
+    changes = {"$set": update}
+    if final:
+        changes["$unset"] = {"dedupe_key": ""}
+    await Job.get_motor_collection().update_one({"_id": job.id, "lease_owner": worker_id}, changes)
+    return final
+
+
+async def run_job(job: Job, worker_id: str, run_slot: Optional[int] = None):
+    """Run a leased job, keeping its lease (and run slot, if any) alive until the handler returns."""
+    run, on_failure = HANDLERS.get(job.kind, (None, None))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            if run_slot is not None:
+                await renew_run_slot(run_slot, worker_id)
+            if not await renew_lease(job, worker_id):
+                logger.warning(f"Lost the lease on job {job.job_id}")
+                return
+
+    keepalive = asyncio.create_task(heartbeat())
+    try:
+        if run is None:
+            raise RuntimeError(f"No handler registered for job kind {job.kind!r}")
+        if job.attempts > job.max_attempts:
+            # Re-leased after its worker died on the last attempt
+            raise RuntimeError("Worker lease expired on the final attempt")
+        logger.info(f"Running {job.kind} job {job.job_id} (attempt {job.attempts})")
+        await report(job, "running", {"attempt": job.attempts, "kind": job.kind})
+        await run(job)
+    except Exception as e:
+        logger.error(f"Error running job {job.job_id}: {str(e)}", exc_info=True)
+        if await fail_job(job, worker_id, str(e)) and on_failure is not None:
+            try:
+                await on_failure(job, str(e))
+            except Exception as hook_error:
+                logger.error(f"Failure hook for job {job.job_id} raised: {str(hook_error)}")
+    else:
+        await complete_job(job, worker_id)
+        logger.info(f"Completed {job.kind} job {job.job_id}")
+    finally:
+        keepalive.cancel()
+
+
+async def acquire_run_slot(
+    worker_id: str, cap: int, lease_seconds: Optional[int] = None
+) -> Optional[int]:
+    """
+    Claim one of the `cap` run slots shared by all workers, or None if they are all held.
+
+    The claim is a single conditional update, so two workers can never both take the last free
+    slot. Slots are leased like jobs: one whose worker died is free again once it expires.
+
+    Returns:
+    Optional[int]: The slot number, to be released with `release_run_slot`
+    """
+    now = datetime.utcnow()
+    lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+    collection = JobSlot.get_motor_collection()
+    for attempt in range(2):
+        raw = await collection.find_one_and_update(
+            {"_id": {"$lt": cap}, "$or": [{"owner": None}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": worker_id, "expires_at": now + lease}},
+        )
+        if raw is not None:
+            return raw["_id"]
+        if attempt or await collection.count_documents({"_id": {"$lt": cap}}) >= cap:
+            return None
+        # First run against this database, or the cap was raised: create the missing slots
+        for slot in range(cap):
+            try:
+                await collection.update_one(
+                    {"_id": slot}, {"$setOnInsert": {"owner": None}}, upsert=True
+                )
+            except DuplicateKeyError:
+                # Another worker created it first
+                pass
+    return None
+
+
+async def renew_run_slot(slot: int, worker_id: str, lease_seconds: Optional[int] = None):
+    lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+    await JobSlot.get_motor_collection().update_one(
+        {"_id": slot, "owner": worker_id},
+        {"$set": {"expires_at": datetime.utcnow() + lease}},
+    )
+
+
+async def release_run_slot(slot: int, worker_id: str):
+    await JobSlot.get_motor_collection().update_one(
+        {"_id": slot, "owner": worker_id}, {"$set": {"owner": None, "expires_at": None}}
+    )
+
+
+async def run_worker(
+    worker_id: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    stop: Optional[asyncio.Event] = None,
+):
+    """
+    Process queued jobs until `stop` is set.
+
+    Each worker process runs up to `concurrency` jobs at once. `JOB_MAX_RUNNING`, if set, caps
+    the number of running jobs across all workers sharing the database.
+
+    Args:
+    worker_id (str, optional): Identifier written to leased jobs
+    concurrency (int, optional): Jobs run concurrently by this process
+    stop (asyncio.Event, optional): Set to stop leasing; running jobs are allowed to finish
+    """
+    worker_id = worker_id or default_worker_id()
+    concurrency = concurrency or settings.WORKER_CONCURRENCY
+    stop = stop or asyncio.Event()
+
+    async def idle():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    async def take_job() -> bool:
+        """Lease and run one job; returns False if there was none to run."""
+        run_slot = None
+        if settings.JOB_MAX_RUNNING:
+            run_slot = await acquire_run_slot(worker_id, settings.JOB_MAX_RUNNING)
+            if run_slot is None:
+                return False
+        try:
+            job = await lease_job(worker_id)
+            if job is None:
+                return False
+            await run_job(job, worker_id, run_slot)
+            return True
+        finally:
+            if run_slot is not None:
+                try:
+                    await release_run_slot(run_slot, worker_id)
+                except Exception as e:
+                    # The slot frees itself once its lease expires
+                    logger.warning(f"Could not release run slot {run_slot}: {str(e)}")
+
+    async def slot():
+        while not stop.is_set():
+            try:
+                ran = await take_job()
+            except Exception as e:
+                # A database error (e.g. during a failover) must not stop the worker
+                logger.error(f"Worker {worker_id} could not take a job: {str(e)}", exc_info=True)
+                ran = False
+            if not ran:
+                await idle()
+
+    logger.info(f"Worker {worker_id} started with {concurrency} slots")
+    await asyncio.gather(*(slot() for _ in range(concurrency)))
+    logger.info(f"Worker {worker_id} stopped")
@@ -0,0 +1,171 @@
+import json
+import logging
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# Markdown code fence opening the response, with an optional language tag
+OPENING_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*")
+# Repaired candidates tried for a truncated response before giving up
+MAX_REPAIR_ATTEMPTS = 50
+CLOSERS = {"{": "}", "[": "]"}
+
+
+def string_mask(text: str) -> List[bool]:
+    """Flag each character of a JSON text that lies inside a string literal (quotes included)."""
+    mask = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            mask.append(True)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        else:
+            in_string = char == '"'
+            mask.append(in_string)
+    return mask
+
+
+def repair_json(text: str) -> str:
+    """Drop code fences and trailing commas, leaving string literals untouched."""
+    mask = string_mask(text)
+    repaired = []
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if not mask[position]:
+            if text.startswith("```", position):
+                position = OPENING_FENCE_PATTERN.match(text, position).end()
+                continue
+            if char == ",":
+                following = text[position + 1:].lstrip()
+                if following[:1] in ("}", "]"):
+                    position += 1
+                    continue
+        repaired.append(char)
+        position += 1
+    return "".join(repaired)
+
+
+def complete_prefixes(text: str) -> Iterator[str]:
+    """
+    Yield the longest prefixes of a truncated JSON value that can be closed off, longest first.
+
+    The text is scanned once, tracking strings and open brackets. Every point where an
+    object or array has just been completed is a place where the value can be cut and the
+    brackets still open there closed; later cut points keep more of the response.
+    """
+    stack: List[str] = []
+    cuts = []
+    for position, (char, in_string) in enumerate(zip(text, string_mask(text))):
+        if in_string:
+            continue
+        if char in CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                # The whole value is complete; nothing after it is needed
+                cuts.append((position + 1, ""))
+                break
+            cuts.append((position + 1, "".join(CLOSERS[opener] for opener in reversed(stack))))
+    for end, closers in reversed(cuts):
+        yield text[:end] + closers
+
+
+def json_start(text: str) -> int:
+    return min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+
+
+def json_candidates(raw_output: str) -> Iterator[Tuple[Any, bool]]:
+    """
+    Yield the JSON values a model response may hold, most complete first.
+
+    Each value comes with whether it had to be repaired. A value that decodes once the
+    prose and opening fence around it are skipped is not considered repaired.
+    """
+    text = raw_output.strip()
+    fence = OPENING_FENCE_PATTERN.search(text)
+    if fence is not None and json_start(text) > fence.start():
+        text = text[fence.end():]
+    start = json_start(text)
+    if start < 0:
+        return
+    text = text[start:]
+    for repaired in (False, True):
+        if repaired:
+            text = repair_json(text)
+        try:
+            # Any prose or closing fence after the value is ignored
+            value = json.JSONDecoder().raw_decode(text)[0]
+        except json.JSONDecodeError:
+            continue
+        yield value, repaired
+        return
+    for attempt, candidate in enumerate(complete_prefixes(text)):
+        if attempt == MAX_REPAIR_ATTEMPTS:
+            return
+        try:
+            yield json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+
+
+def read_json_output(raw_output: str, schema: Type[T]) -> Tuple[Optional[T], bool]:
+    """
+    Parse a model response into `schema`, tolerating what models wrap around their JSON.
+
+    Strict structured outputs parse directly, and so does JSON with prose or markdown
+    fences around it. Otherwise code fences and trailing commas outside strings are dropped,
+    and a truncated response is cut back to its last complete object or array, so as much
+    of it as possible is kept.
+
+    Args:
+    raw_output (str): Model response
+    schema (Type[T]): Pydantic model of the expected output
+
+    Returns:
+    Tuple[Optional[T], bool]: The parsed output, or None if no valid output could be
+    recovered, and whether the response had to be repaired (and may be incomplete)
+    """
+    try:
+        return schema.model_validate_json(raw_output), False
+    except ValidationError:
+        pass
+    for value, repaired in json_candidates(raw_output):
+        try:
+            output = schema.model_validate(value)
+        except ValidationError:
+            continue
+        if repaired:
+            logger.debug(f"Recovered {schema.__name__} from a malformed response")
+        return output, repaired
+    return None, False
+
+
+def parse_json_output(raw_output: str, schema: Type[T]) -> Optional[T]:
+    """Parse a model response into `schema` (see read_json_output), or None if it fails."""
+    return read_json_output(raw_output, schema)[0]
+
+
+def is_complete_output(raw_output: str, schema: Type[T]) -> bool:
+    """
+    Whether a response holds a whole `schema` value without any repair.
+
+    Only such responses are cached: a truncated one cut back to its last complete object
+    would otherwise be served as complete from then on.
+    """
+    output, repaired = read_json_output(raw_output, schema)
+    return output is not None and not repaired
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple, Type
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI, pydantic_function_tool
+from pydantic import BaseModel
+
+from config.config import settings
+from utils.rate_limit import estimate_tokens, get_rate_limiter, retry_delay
+
+logger = logging.getLogger(__name__)
+
+_openai: Optional["OpenAIClient"] = None
+_client: Optional["LLMClient"] = None
+# Guards the lazily created clients, which worker threads may ask for at the same time
+_lock = threading.Lock()
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Models that accept a strict JSON schema as response_format (matched by prefix), and
+# earlier snapshots that do not
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+UNSTRUCTURED_OUTPUT_MODELS = ("o1-mini", "o1-preview", "gpt-4o-2024-05-13")
+
+
+class LLMClient(Protocol):
+    """
+    Single-prompt chat completion, the only kind of call the pipeline makes.
+
+    With a `schema`, the response should be JSON for that Pydantic model. Models that support
+    structured outputs are held to it (see chat_request); other responses may still need
+    the tolerant parsing of utils/json_output.py.
+    """
+
+    async def complete(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str: ...
+
+    def complete_sync(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str: ...
+
+
+def supports_structured_output(model: str) -> bool:
+    if not settings.LLM_STRUCTURED_OUTPUTS:
+        return False
+    return model.startswith(STRUCTURED_OUTPUT_MODELS) and not model.startswith(
+        UNSTRUCTURED_OUTPUT_MODELS
+    )
+
+
+@lru_cache(maxsize=None)
+def response_format(schema: Type[BaseModel]) -> Dict[str, Any]:
+    """Strict JSON schema response format for `schema`."""
+    # The SDK's public helper for strict tools converts the model the same way parse() does
+    function = pydantic_function_tool(schema)["function"]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": function["name"],
+            "schema": function["parameters"],
+            "strict": True,
+        },
+    }
+
+
+def chat_request(
+    model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+) -> Dict[str, Any]:
+    """
+    Body of a single-prompt chat completion request.
+
+    Args:
+    model (str): Model to call
+    prompt (str): User message
+    schema (Type[BaseModel], optional): Expected output, sent as a strict response format
+        if `model` supports structured outputs
+
+    Returns:
+    Dict[str, Any]: Request body for the chat completions endpoint
+    """
+    body: Dict[str, Any] = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+    if schema is not None and supports_structured_output(model):
+        body["response_format"] = response_format(schema)
+    return body
+
+
+class OpenAIClient:
+    """
+    Chat completions over shared keep-alive connection pools.
+
+    The async and sync OpenAI clients are built on first use and reused for every call, so
+    connection and TLS setup is paid once per process rather than once per prompt. Creation is
+    locked, and the sync client is thread-safe, so it can serve calls from worker threads.
+
+    Every call first waits for its model's budget in the shared RateLimiter (see
+    utils/rate_limit.py). Rate-limited and transient failures are retried with jittered
+    backoff up to LLM_MAX_RETRIES times, so they delay a call instead of failing it.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or settings.OPENAI_BASE_URL
+        self.transport = transport
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._sync_client: Optional[OpenAI] = None
+        self._lock = threading.Lock()
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_SECONDS,
+        )
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        http_client=httpx.AsyncClient(
+                            timeout=httpx.Timeout(settings.LLM_TIMEOUT),
+                            limits=self.limits(),
+                            transport=self.transport,
+                        ),
+                        # Retries are scheduled by complete() against the shared rate limits
+                        max_retries=0,
+                    )
+        return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        http_client=httpx.Client(
+                            timeout=httpx.Timeout(settings.LLM_TIMEOUT),
+                            limits=self.limits(),
+                            transport=self.transport,
+                        ),
+                        max_retries=0,
+                    )
+        return self._sync_client
+
+    async def complete(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        limiter = get_rate_limiter()
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            attempt += 1
+            await limiter.acquire(model, tokens)
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(
+                    **chat_request(model, prompt, schema)
+                )
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self.retry_delay(model, e, attempt))
+                continue
+            return self.read_response(model, tokens, raw)
+
+    def complete_sync(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        limiter = get_rate_limiter()
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.acquire_sync(model, tokens)
+            try:
+                raw = self.sync_client.chat.completions.with_raw_response.create(
+                    **chat_request(model, prompt, schema)
+                )
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self.retry_delay(model, e, attempt))
+                continue
+            return self.read_response(model, tokens, raw)
+
+    def retry_delay(self, model: str, error: Exception, attempt: int) -> float:
+        """Return the delay before retrying after `error`, or re-raise it once out of retries."""
+        attempts = settings.LLM_MAX_RETRIES + 1
+        # An exhausted quota is reported as a 429 too, but waiting will not help
+        if attempt >= attempts or getattr(error, "code", None) == "insufficient_quota":
+            raise error
+
+        headers = error.response.headers if isinstance(error, openai.APIStatusError) else None
+        delay = retry_delay(attempt, headers)
+        if isinstance(error, openai.RateLimitError):
+            # Queue everyone else behind the retry rather than letting them hit the limit too
+            get_rate_limiter().throttle(model, delay)
+        logger.warning(
+            f"{model} call failed ({error}), retrying in {delay:.2f}s "
+            f"(attempt {attempt}/{attempts - 1})"
+        )
+        return delay
+
+    def read_response(self, model: str, reserved_tokens: int, raw) -> str:
+        limiter = get_rate_limiter()
+        limiter.observe(model, raw.headers)
+        response = raw.parse()
+        if response.usage is not None:
+            limiter.record_usage(model, reserved_tokens, response.usage.total_tokens)
+        return response.choices[0].message.content
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+class FakeLLMClient:
+    """
+    Local stand-in that answers prompts without any network calls.
+
+    Args:
+    respond (Callable[[str, str], str], optional): Returns the response for (model, prompt);
+        by default every prompt gets an empty JSON object
+    """
+
+    def __init__(self, respond: Optional[Callable[[str, str], str]] = None):
+        self.respond = respond or (lambda model, prompt: "{}")
+        self.calls: List[Tuple[str, str]] = []
+
+    async def complete(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        return self.complete_sync(model, prompt, schema)
+
+    def complete_sync(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        self.calls.append((model, prompt))
+        return self.respond(model, prompt)
+
+    async def aclose(self):
+        pass
+
+
+def get_openai_client() -> OpenAIClient:
+    """Return the process-wide OpenAI client (also used to submit Batch API jobs)."""
+    global _openai
+    with _lock:
+        if _openai is None:
+            _openai = OpenAIClient()
+    return _openai
+
+
+def get_llm_client() -> LLMClient:
+    """Return the client selected by LLM_BACKEND, or the one installed with set_llm_client."""
+    global _client
+    if _client is None:
+        client = FakeLLMClient() if settings.LLM_BACKEND == "fake" else get_openai_client()
+        with _lock:
+            if _client is None:
+                _client = client
+    return _client
+
+
+def set_llm_client(client: Optional[LLMClient]):
+    """Install `client` for all pipeline stages; None goes back to LLM_BACKEND."""
+    global _client
+    _client = client
+
+
+async def close_llm_client():
+    global _openai, _client
+    if _openai is not None:
+        await _openai.aclose()
+    _openai = None
+    _client = None
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+from config.config import settings
+from utils.llm import chat_request, get_openai_client
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# The Batch API accepts at most 50,000 requests per batch
+MAX_BATCH_REQUESTS = 50000
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+_collector: Optional["BatchCollector"] = None
+
+
+class BatchRequestError(Exception):
+    """A request, or the whole batch it was part of, did not produce a response."""
+
+
+def batch_backend_enabled() -> bool:
+    return settings.LLM_BACKEND == "batch"
+
+
+def build_batch_file(requests: List[Tuple[str, Dict[str, Any]]]) -> bytes:
+    """
+    Build the JSONL input file of a batch.
+
+    Args:
+    requests (List[Tuple[str, Dict[str, Any]]]): (custom_id, request body) per request
+
+    Returns:
+    bytes: One chat completion request per line
+    """
+    lines = [
+        json.dumps(
+            {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+        )
+        for custom_id, body in requests
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def parse_batch_output(text: str) -> Dict[str, Any]:
+    """
+    Read a batch output or error file.
+
+    Returns:
+    Dict[str, Any]: Message content per custom_id, or a BatchRequestError for failed requests
+    """
+    results: Dict[str, Any] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or response.get("body", {}).get("error")
+            results[record["custom_id"]] = BatchRequestError(f"Batch request failed: {error}")
+            continue
+        results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+async def run_batch(
+    client: AsyncOpenAI,
+    requests: List[Tuple[str, Dict[str, Any]]],
+    poll_interval: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Submit requests through the Batch API and wait for the results.
+
+    Args:
+    client (AsyncOpenAI): Client for the API (or a compatible fake server)
+    requests (List[Tuple[str, Dict[str, Any]]]): (custom_id, request body) per request
+    poll_interval (float, optional): Seconds between status checks
+
+    Returns:
+    Dict[str, Any]: Message content per custom_id, or a BatchRequestError where there is none
+    """
+    if poll_interval is None:
+        poll_interval = settings.OPENAI_BATCH_POLL_INTERVAL
+
+    input_file = await client.files.create(
+        file=("batch.jsonl", build_batch_file(requests)), purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} requests")
+
+    while batch.status not in FINAL_STATUSES:
+        await asyncio.sleep(poll_interval)
+        batch = await client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        if counts is not None:
+            logger.debug(
+                f"Batch {batch.id} {batch.status}: {counts.completed}/{counts.total} completed, "
+                f"{counts.failed} failed"
+            )
+    logger.info(f"Batch {batch.id} finished with status {batch.status}")
+
+    # Expired and cancelled batches still return the requests that did finish
+    results: Dict[str, Any] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            content = await client.files.content(file_id)
+            results.update(parse_batch_output(content.text))
+    for custom_id, _ in requests:
+        if custom_id not in results:
+            results[custom_id] = BatchRequestError(
+                f"No result for {custom_id} in batch {batch.id} ({batch.status})"
+            )
+    return results
+
+
+class BatchCollector:
+    """
+    Gather concurrent completion calls into Batch API submissions.
+
+    Calls made within `window` seconds of each other go into the same batch, so code that
+    fans out with asyncio.gather (map-reduce extraction, section evaluation) submits one
+    batch per fan-out, and each caller gets its own response back.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        window: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.client = client
+        self.window = settings.OPENAI_BATCH_WINDOW if window is None else window
+        self.poll_interval = poll_interval
+        self.pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.tasks = set()
+        self.counter = 0
+
+    def get_client(self) -> AsyncOpenAI:
+        if self.client is None:
+            # Shares the connection pool; file uploads and status polls keep the SDK's retries
+            self.client = get_openai_client().async_client.with_options(max_retries=2)
+        return self.client
+
+    async def complete(
+        self, model: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        """Queue a single-message chat completion and wait for its batch to finish."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.counter += 1
+        body = chat_request(model, prompt, schema)
+        self.pending.append((f"request-{self.counter}", body, future))
+
+        if len(self.pending) >= MAX_BATCH_REQUESTS:
+            self.flush()
+        else:
+            # Wait for the rest of the fan-out before submitting
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+            self.flush_handle = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending, self.pending = self.pending, []
+        if pending:
+            task = asyncio.ensure_future(self.submit(pending))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def submit(self, pending: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        try:
+            results = await run_batch(
+                self.get_client(),
+                [(custom_id, body) for custom_id, body, _ in pending],
+                self.poll_interval,
+            )
+        except Exception as e:
+            logger.error(f"Batch of {len(pending)} requests failed: {str(e)}", exc_info=True)
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, _, future in pending:
+            if future.done():
+                continue
+            result = results[custom_id]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def get_batch_collector() -> BatchCollector:
+    global _collector
+    if _collector is None:
+        _collector = BatchCollector()
+    return _collector
@@ -0,0 +1,111 @@
+import gzip
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from config.config import settings
+from models.requirements import RequirementsDocument, RequirementsPayload
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency; gzip is used without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """Compress with zstd if it is installed and configured, else gzip; returns (encoding, data)."""
+    if settings.PAYLOAD_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=6)
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed payloads")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown payload encoding: {encoding}")
+
+
+def should_offload(size: int) -> bool:
+    threshold = settings.REQUIREMENTS_OFFLOAD_BYTES
+    return threshold is not None and size >= threshold
+
+
+async def offload_payload(doc: RequirementsDocument) -> RequirementsDocument:
+    """
+    Move a large document's requirements and chunks to the compressed payload collection.
+
+    Call before inserting `doc`. Documents below `REQUIREMENTS_OFFLOAD_BYTES` (or every
+    document, if it is unset) are left inline.
+
+    Args:
+    doc (RequirementsDocument): Document about to be saved
+
+    Returns:
+    RequirementsDocument: The same document, with its payload fields emptied if offloaded
+    """
+    body = json.dumps(
+        {"requirements": doc.requirements, "chunks": doc.chunks}, separators=(",", ":")
+    ).encode("utf-8")
+    if not should_offload(len(body)):
+        return doc
+
+    encoding, data = compress(body)
+    # Written before the document that points at it, so readers never miss a payload
+    await RequirementsPayload.get_motor_collection().replace_one(
+        {"request_id": doc.request_id},
+        {"request_id": doc.request_id, "encoding": encoding, "data": data, "size": len(body)},
+        upsert=True,
+    )
+    logger.info(
+        f"Stored {len(body)} byte payload for {doc.request_id} out of line "
+        f"({encoding}, {len(data)} bytes)"
+    )
+    doc.requirements = {}
+    doc.chunks = []
+    doc.payload_encoding = encoding
+    return doc
+
+
+async def load_payload_fields(request_id: str) -> Dict[str, Any]:
+    """Return the stored {"requirements", "chunks"} of an offloaded document."""
+    payload = await RequirementsPayload.find_one({"request_id": request_id})
+    if payload is None:
+        raise LookupError(f"Payload missing for request_id: {request_id}")
+    return json.loads(decompress(payload.encoding, payload.data))
+
+
+async def load_payload(doc: RequirementsDocument) -> RequirementsDocument:
+    """Fill in the requirements and chunks of `doc` if they are stored out of line."""
+    if doc.payload_encoding is None:
+        return doc
+    fields = await load_payload_fields(doc.request_id)
+    doc.requirements = fields["requirements"]
+    doc.chunks = fields["chunks"]
+    return doc
+
+
+async def find_requirements(query: Dict[str, Any]) -> Optional[RequirementsDocument]:
+    """
+    Find a requirements document with its requirements loaded but without its chunks.
+
+    The per-chunk records repeat every requirement and are only needed to re-extract an
+    edited style guide, so readers that just want the requirements leave them out.
+
+    Args:
+    query (Dict[str, Any]): Filter on the requirements collection
+
+    Returns:
+    Optional[RequirementsDocument]: The document, with `chunks` empty, or None if not found
+    """
+    raw = await RequirementsDocument.get_motor_collection().find_one(query, {"chunks": False})
+    if raw is None:
+        return None
+    doc = await load_payload(RequirementsDocument.model_validate(raw))
+    doc.chunks = []
+    return doc
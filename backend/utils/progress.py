@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from models.job import Job, JobEvent
+
+logger = logging.getLogger(__name__)
+
+# Called with an event name and a JSON-serializable payload, e.g. ("chunk", {"index": 3, ...})
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+def emit(on_progress: Optional[ProgressCallback], event: str, data: Dict[str, Any]):
+    """Report progress if a callback is set; a failing callback never breaks the pipeline."""
+    if on_progress is None:
+        return
+    try:
+        on_progress(event, data)
+    except Exception as e:
+        logger.warning(f"Progress callback failed for {event} event: {str(e)}")
+
+
+async def record_event(job_id: str, event: str, data: Dict[str, Any]) -> Optional[JobEvent]:
+    """
+    Append a progress event to a job's event log.
+
+    Args:
+    job_id (str): Job the event belongs to
+    event (str): Event name
+    data (Dict[str, Any]): JSON-serializable payload
+
+    Returns:
+    Optional[JobEvent]: The stored event, or None if the job does not exist
+    """
+    job = await Job.get_motor_collection().find_one_and_update(
+        {"job_id": job_id},
+        {"$inc": {"event_count": 1}},
+        projection={"event_count": True},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        return None
+    job_event = JobEvent(job_id=job_id, seq=job["event_count"], event=event, data=data)
+    await job_event.insert()
+    return job_event
+
+
+class JobProgress:
+    """
+    Progress callback that stores events for a job, for pipelines that report synchronously.
+
+    Events are written in the background by a single task so that they are stored in the
+    order they were reported. Call `aclose` to wait for pending writes.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+
+    def __call__(self, event: str, data: Dict[str, Any]):
+        self._queue.put_nowait((event, data))
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        while True:
+            event, data = await self._queue.get()
+            try:
+                await record_event(self.job_id, event, data)
+            except Exception as e:
+                logger.warning(f"Could not record {event} event for job {self.job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def aclose(self):
+        if self._writer is None:
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        self._writer = None
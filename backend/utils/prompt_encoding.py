@@ -0,0 +1,159 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+# "pretty": indented JSON, as prompts were originally written
+# "compact": minified JSON
+# "digest": minified JSON, with requirements rendered as a pipe-separated table
+ENCODING_MODES = ("pretty", "compact", "digest")
+
+DIGEST_COLUMNS = ("id", "level", "classification", "category", "where", "when", "description")
+
+_mode: ContextVar[Optional[str]] = ContextVar("prompt_encoding_mode", default=None)
+
+
+def current_mode() -> str:
+    mode = _mode.get() or settings.PROMPT_ENCODING
+    if mode not in ENCODING_MODES:
+        raise ValueError(f"Unknown prompt encoding: {mode}")
+    return mode
+
+
+@contextmanager
+def prompt_encoding(mode: str) -> Iterator[None]:
+    """Temporarily build prompts with another encoding mode."""
+    if mode not in ENCODING_MODES:
+        raise ValueError(f"Unknown prompt encoding: {mode}")
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def encode_json(payload: Any) -> str:
+    """Serialize a prompt payload (dicts, lists or Pydantic models) in the current mode."""
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump(mode="json")
+    if current_mode() == "pretty":
+        return json.dumps(payload, indent=2)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def digest_cell(value: Any) -> str:
+    return " ".join(str(value if value is not None else "").split()).replace("|", "/")
+
+
+def encode_requirements(requirements: Any) -> str:
+    """
+    Serialize requirements for a prompt in the current mode.
+
+    In "digest" mode the requirements become one table row each, grouped under their group
+    category, which drops the JSON keys and quoting that are repeated for every requirement.
+
+    Args:
+    requirements (Any): Requirements document ({"groups": [...]}) or list of requirements
+
+    Returns:
+    str: Encoded requirements
+    """
+    if current_mode() != "digest":
+        return encode_json(requirements)
+
+    if isinstance(requirements, dict):
+        groups = requirements.get("groups", [])
+    else:
+        groups = [{"category": "", "description": "", "requirements": list(requirements)}]
+
+    lines = [" | ".join(DIGEST_COLUMNS)]
+    for group in groups:
+        if group.get("category") or group.get("description"):
+            lines.append(
+                f"# {digest_cell(group.get('category'))}: {digest_cell(group.get('description'))}"
+            )
+        for requirement in group.get("requirements", []):
+            lines.append(" | ".join(digest_cell(requirement.get(c)) for c in DIGEST_COLUMNS))
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count the tokens in `text` for `model`, estimating if no tokenizer is available."""
+    try:
+        return len(get_tokenizer(model).encode(text))
+    except Exception as e:
+        logger.debug(f"Falling back to estimated token count: {e}")
+        return len(text) // 4
+
+
+def token_report(prompts: Dict[str, Dict[str, str]], model: str = "gpt-4o") -> List[Dict]:
+    """
+    Compare token counts of the same prompts built with different encoding modes.
+
+    Args:
+    prompts (Dict[str, Dict[str, str]]): Prompt text per template name, then per mode
+    model (str): Model whose tokenizer is used
+
+    Returns:
+    List[Dict]: One row per template with the tokens per mode and the savings over "pretty"
+    """
+    report = []
+    for template, by_mode in prompts.items():
+        tokens = {mode: count_tokens(text, model) for mode, text in by_mode.items()}
+        row = {"template": template, "tokens": tokens}
+        if "pretty" in tokens and tokens["pretty"]:
+            row["savings"] = {
+                mode: round(1 - count / tokens["pretty"], 3)
+                for mode, count in tokens.items()
+                if mode != "pretty"
+            }
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+    from prompts.evaluate import evaluate_index
+    from prompts.extract import extract_deduped
+    # The prompt builders read the mode from the imported module, not from __main__
+    from utils import prompt_encoding as encoding
+
+    with open("prompts/outputs/requirements.json") as f:
+        requirements = json.load(f)
+    with open("prompts/outputs/article.json") as f:
+        section = next(s for s in json.load(f) if s["content"])
+    state = extract_deduped.RequirementsDocument.model_validate(requirements)
+
+    prompts = {"extract": {}, "evaluate_index": {}}
+    for mode in ENCODING_MODES:
+        with encoding.prompt_encoding(mode):
+            prompts["extract"][mode] = extract_deduped.build_extraction_prompt(
+                state, section["content"], 1, 1
+            )
+            prompts["evaluate_index"][mode] = evaluate_index.build_section_prompt(
+                evaluate_index.empty_evaluation(), section, requirements, 1, 1
+            )
+
+    for row in token_report(prompts):
+        print(json.dumps(row))
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+# OpenAI reports reset times as durations such as "1s", "6m0s" or "120ms"
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+_limiter: Optional["RateLimiter"] = None
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset duration into seconds, or None if it is missing or malformed."""
+    if not value:
+        return None
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough token count of a call: ~4 characters per prompt token plus the expected completion."""
+    return len(prompt) // 4 + settings.LLM_COMPLETION_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """
+    Per-minute budget that refills continuously.
+
+    Thread-safe, so the same bucket serves calls made on the event loop and from worker
+    threads. The available amount may go negative when a call turns out to use more than
+    was reserved; later callers then wait for the deficit to refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float):
+        elapsed = now - self.updated
+        self.available = min(self.capacity, self.available + elapsed * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` if it is available and return 0, else return the seconds to wait."""
+        # A single call larger than the whole budget still runs once the bucket is full
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.refill(now)
+            if self.available >= amount:
+                self.available -= amount
+                return 0.0
+            return (amount - self.available) / self.rate
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference from a reservation."""
+        with self.lock:
+            self.available = min(self.capacity, self.available - amount)
+
+    def observe(self, limit: Optional[int], remaining: Optional[int]):
+        """Align the bucket with the limit and remaining budget reported by the API."""
+        with self.lock:
+            self.refill(time.monotonic())
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self.available = min(self.available, float(remaining))
+
+    def block(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. after a 429."""
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class ModelLimit:
+    """Requests-per-minute and tokens-per-minute budgets of one model."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def reserve(self, tokens: int) -> float:
+        wait = self.requests.reserve(1)
+        if wait:
+            return wait
+        wait = self.tokens.reserve(tokens)
+        if wait:
+            # Give the request slot back so other callers are not held up by this one
+            self.requests.adjust(-1)
+        return wait
+
+
+class RateLimiter:
+    """
+    Central scheduler for LLM calls, shared by every stage of the pipeline.
+
+    Callers reserve a request and an estimated number of tokens for their model before each
+    call and wait (rather than fail) until the budget allows it. Budgets start from
+    LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE and follow the x-ratelimit-* headers
+    returned by the API, so throughput adapts to the account's actual limits.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.requests_per_minute = requests_per_minute or settings.LLM_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = tokens_per_minute or settings.LLM_TOKENS_PER_MINUTE
+        self.limits: Dict[str, ModelLimit] = {}
+        self.lock = threading.Lock()
+
+    def limit(self, model: str) -> ModelLimit:
+        with self.lock:
+            if model not in self.limits:
+                self.limits[model] = ModelLimit(self.requests_per_minute, self.tokens_per_minute)
+            return self.limits[model]
+
+    async def acquire(self, model: str, tokens: int):
+        limit = self.limit(model)
+        while (wait := limit.reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, model: str, tokens: int):
+        limit = self.limit(model)
+        while (wait := limit.reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    def record_usage(self, model: str, reserved: int, used: Optional[int]):
+        """Correct the token budget once the actual usage of a call is known."""
+        if used is not None:
+            self.limit(model).tokens.adjust(used - reserved)
+
+    def observe(self, model: str, headers: Mapping[str, str]):
+        limit = self.limit(model)
+        limit.requests.observe(
+            parse_int(headers.get("x-ratelimit-limit-requests")),
+            parse_int(headers.get("x-ratelimit-remaining-requests")),
+        )
+        limit.tokens.observe(
+            parse_int(headers.get("x-ratelimit-limit-tokens")),
+            parse_int(headers.get("x-ratelimit-remaining-tokens")),
+        )
+
+    def throttle(self, model: str, seconds: float):
+        """Hold back every call to `model` for `seconds` after it was rate limited."""
+        limit = self.limit(model)
+        limit.requests.block(seconds)
+        limit.tokens.block(seconds)
+
+
+def retry_delay(attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+    """
+    Seconds to wait before retrying a failed call.
+
+    Args:
+    attempt (int): Number of the failed attempt, starting at 1
+    headers (Mapping[str, str], optional): Headers of the error response, if any
+
+    Returns:
+    float: Jittered exponential backoff, or longer if the API asked for it
+    """
+    headers = headers or {}
+    delay = min(settings.LLM_RETRY_MAX_BACKOFF, settings.LLM_RETRY_BACKOFF * 2 ** (attempt - 1))
+    # Jitter, so callers that failed together do not retry together
+    delay = random.uniform(delay / 2, delay)
+
+    server_delays = [parse_duration(headers.get("retry-after"))]
+    for budget in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{budget}") == "0":
+            server_delays.append(parse_duration(headers.get(f"x-ratelimit-reset-{budget}")))
+    return max([delay] + [d for d in server_delays if d is not None])
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
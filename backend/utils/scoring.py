@@ -0,0 +1,43 @@
+from typing import Any, Dict, Iterator, List
+
+
+def requirement_evaluations(evaluation: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield every requirement evaluation in an EvaluationOutput: section, sentence and article level."""
+    for section in evaluation.get("sections") or []:
+        yield from section.get("requirement_evaluations") or []
+        for sentence in section.get("sentence_evaluations") or []:
+            yield from sentence.get("requirement_evaluations") or []
+    article = evaluation.get("article_evaluation") or {}
+    yield from article.get("requirement_evaluations") or []
+
+
+def summarize_evaluation(evaluation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce an EvaluationOutput to the figures shown on the scoreboard.
+
+    Args:
+    evaluation (Dict[str, Any]): EvaluationOutput as a dict
+
+    Returns:
+    Dict[str, Any]: Mean score of the applicable evaluations ("score", None if there are none),
+    the number of scored and non-applicable evaluations, and the mean score per requirement
+    """
+    scores: Dict[str, List[float]] = {}
+    not_applicable = 0
+    for item in requirement_evaluations(evaluation):
+        if not item.get("applicable"):
+            not_applicable += 1
+        elif item.get("score") is not None:
+            scores.setdefault(item["requirement_id"], []).append(float(item["score"]))
+
+    all_scores = [score for values in scores.values() for score in values]
+    return {
+        "score": round(sum(all_scores) / len(all_scores), 4) if all_scores else None,
+        "scored": len(all_scores),
+        "not_applicable": not_applicable,
+        "sections": len(evaluation.get("sections") or []),
+        "by_requirement": {
+            requirement_id: round(sum(values) / len(values), 4)
+            for requirement_id, values in scores.items()
+        },
+    }
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight call within this process."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` for `key`, or wait for the call already running for `key`.
+
+        Every caller gets the same result (or exception). Once the call finishes, the next
+        caller with the same key starts a new one.
+
+        Args:
+        key (str): Identity of the call
+        fn (Callable[[], Awaitable[Any]]): Starts the call
+
+        Returns:
+        Any: Result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
@@ -1,69 +1,213 @@
-from typing import List, Dict
+from typing import AbstractSet, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 import re
 import json
 
+# Any line whose first non-blank character is "#" is a heading
+HEADING_PATTERN = re.compile(r"^[^\S\n]*#[^\n]*", re.MULTILINE)
+# Possible sentence end: terminal punctuation and closing quotes/brackets before whitespace
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"'\u201d\u2019)\]]*(?=\s)")
+NEXT_WORD_PATTERN = re.compile(r"\s+[\"'\u201c\u2018(\[]*(\S*)")
+# Symbols such as mTOR, p53 or cAMP start a sentence despite their lowercase first letter
+SYMBOL_PATTERN = re.compile(r"[a-z]+[A-Z0-9]")
+# Dotted letter sequences such as "e.g", "i.e" or "U.S"
+DOTTED_PATTERN = re.compile(r"(?:[a-z]\.)+[a-z]")
+OPENING_CHARS = "\"'\u201c\u2018(["
 
-def parse_markdown_to_sections(markdown_content: str) -> List[Dict]:
+# Lowercase, without the final period. Words that end a sentence as often as not
+# (e.g. "min", "wt") are left out, since a missed split costs more than a false one.
+ABBREVIATIONS = frozenset(
+    """
+    e.g i.e cf viz vs etc al approx ca c
+    fig figs tab eq eqs ref refs no nos vol vols p pp ch chap sec sect suppl ed eds
+    dr mr mrs ms prof st jr sr inc ltd co corp dept univ
+    jan feb mar apr jun jul aug sep sept oct nov dec
+    sp spp subsp ssp var cv gen syn aff resp
+    """.split()
+)
+# Abbreviations that may also end a sentence, when the next word is capitalized
+FINAL_ABBREVIATIONS = frozenset({"etc"})
+
+
+class SectionSpan(NamedTuple):
+    """
+    A markdown section located by character offsets into the scanned text.
+
+    `title_start:title_end` is the heading text and `start:end` the section body, both
+    without surrounding whitespace, so no part of the text is copied until it is read.
+    """
+
+    index: int
+    level: int
+    title_start: int
+    title_end: int
+    start: int
+    end: int
+
+    def title(self, text: str) -> str:
+        return text[self.title_start:self.title_end]
+
+    def content(self, text: str) -> str:
+        return text[self.start:self.end]
+
+
+def strip_span(text: str, start: int, end: int, chars: Optional[str] = None) -> Tuple[int, int]:
+    """Narrow `start:end` past leading and trailing `chars` (whitespace by default)."""
+    while start < end and (text[start] in chars if chars else text[start].isspace()):
+        start += 1
+    while end > start and (text[end - 1] in chars if chars else text[end - 1].isspace()):
+        end -= 1
+    return start, end
+
+
+def scan_sections(text: str) -> Iterator[SectionSpan]:
+    """
+    Scan markdown for sections in a single pass, without copying the text.
+
+    A section runs from a heading line to the next one. Text before the first heading and
+    sections whose heading has no title are skipped.
+
+    Args:
+    text (str): Markdown content
+
+    Yields:
+    SectionSpan: Index (from 1), level (number of leading "#") and offsets of each section
+    """
+    index = 0
+    heading = None
+    for match in HEADING_PATTERN.finditer(text):
+        if heading is not None:
+            index += 1
+            yield section_span(text, heading, match.start(), index)
+        title_start, title_end = heading_title(text, match)
+        # Headings without a title do not start a section
+        heading = match if title_start < title_end else None
+    if heading is not None:
+        yield section_span(text, heading, len(text), index + 1)
+
+
+def heading_title(text: str, heading: re.Match) -> Tuple[int, int]:
+    """Offsets of a heading line without its "#" marks and surrounding whitespace."""
+    return strip_span(text, *strip_span(text, heading.start(), heading.end(), "#"))
+
+
+def section_span(text: str, heading: re.Match, end: int, index: int) -> SectionSpan:
+    line_end = heading.end()
+    marks_start = marks_end = strip_span(text, heading.start(), line_end)[0]
+    while marks_end < line_end and text[marks_end] == "#":
+        marks_end += 1
+    title_start, title_end = heading_title(text, heading)
+    start, end = strip_span(text, line_end, end)
+    return SectionSpan(index, marks_end - marks_start, title_start, title_end, start, end)
+
+
+def is_sentence_end(
+    text: str, mark: re.Match, start: int, end: int, abbreviations: AbstractSet[str]
+) -> bool:
+    """Decide whether the punctuation matched by `mark` ends a sentence."""
+    following = NEXT_WORD_PATTERN.match(text, mark.end(), end)
+    next_word = following.group(1) if following else ""
+    if not next_word:
+        return True
+    # Lowercase words and numbers continue the sentence: "Fig. 2", "approx. 5", "ca. three"
+    if next_word[0].isdigit() or (next_word[0].islower() and not SYMBOL_PATTERN.match(next_word)):
+        return False
+    if not mark.group().startswith("."):
+        return True
+
+    word_start = mark.start()
+    while word_start > start and not text[word_start - 1].isspace():
+        word_start -= 1
+    word = text[word_start:mark.start()].lstrip(OPENING_CHARS).lower()
+    if word in abbreviations:
+        return word in FINAL_ABBREVIATIONS and next_word[0].isupper()
+    # Initials ("J. Smith", "E. coli") and dotted abbreviations ("U.S.")
+    return not (len(word) == 1 and word.isalpha()) and not DOTTED_PATTERN.fullmatch(word)
+
+
+def scan_sentences(
+    text: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    abbreviations: AbstractSet[str] = ABBREVIATIONS,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Scan `text[start:end]` for sentences, with rules tuned for scientific prose.
+
+    A sentence ends at ".", "!" or "?" (and any closing quotes or brackets) followed by
+    whitespace, unless the period belongs to an abbreviation from `abbreviations` ("e.g.",
+    "et al.", "Fig."), an initial or a dotted abbreviation, or the next word starts with a
+    number or a lowercase letter. Symbols such as "mTOR" or "p53" may start a sentence.
+    Decimals ("7.4") are never split, since no whitespace follows their point.
+
+    Args:
+    text (str): Text to scan
+    start (int): Offset to start at
+    end (int, optional): Offset to stop at (default the end of `text`)
+    abbreviations (AbstractSet[str]): Lowercase abbreviations without their final period
+
+    Yields:
+    Tuple[int, int]: Offsets of each sentence in `text`, without surrounding whitespace
+    """
+    if end is None:
+        end = len(text)
+    position = start
+    for mark in SENTENCE_END_PATTERN.finditer(text, start, end):
+        if not is_sentence_end(text, mark, start, end, abbreviations):
+            continue
+        sentence = strip_span(text, position, mark.end())
+        if sentence[0] < sentence[1]:
+            yield sentence
+        position = mark.end()
+    sentence = strip_span(text, position, end)
+    if sentence[0] < sentence[1]:
+        yield sentence
+
+
+def scan_sentences_batch(
+    texts: Iterable[str], abbreviations: AbstractSet[str] = ABBREVIATIONS
+) -> List[List[Tuple[int, int]]]:
+    """
+    Segment many texts (e.g. every section of a set of articles) in one call.
+
+    Returns:
+    List[List[Tuple[int, int]]]: Sentence offsets per text, in the order of `texts`
+    """
+    return [list(scan_sentences(text, abbreviations=abbreviations)) for text in texts]
+
+
+def parse_markdown_to_sections(markdown_content: str, with_level: bool = True) -> List[Dict]:
     """
     Parse markdown content into sections.
     Returns a list of dictionaries containing section title, content, level (depth of the section), and index.
     """
-    # Split the content into sections based on headers
     sections = []
-    current_section = {"title": "", "content": [], "level": 0}
-    current_index = 1
-
-    # Split content into lines
-    lines = markdown_content.split("\n")
-
-    for line in lines:
-        # Check if line is a header (starts with #)
-        if line.strip().startswith("#"):
-            # If we have a previous section, save it
-            if current_section["title"]:
-                sections.append(
-                    {
-                        "title": current_section["title"],
-                        "content": "\n".join(current_section["content"]).strip(),
-                        "level": current_section["level"],
-                        "index": current_index,
-                    }
-                )
-                current_index += 1
-            # Start new section
-            # Count #s to determine level
-            level = len(re.match(r"^#+", line.strip()).group())
-            # Remove #s and whitespace from title
-            current_section = {
-                "title": line.strip("#").strip(),
-                "content": [],
-                "level": level,
-            }
-        else:
-            # Add content line to current section
-            current_section["content"].append(line)
-
-    # Add the last section if it exists
-    if current_section["title"]:
-        sections.append(
-            {
-                "title": current_section["title"],
-                "content": "\n".join(current_section["content"]).strip(),
-                "level": current_section["level"],
-                "index": current_index,
-            }
-        )
-
+    for span in scan_sections(markdown_content):
+        section = {
+            "index": span.index,
+            "title": span.title(markdown_content),
+            "content": span.content(markdown_content),
+        }
+        if with_level:
+            section["level"] = span.level
+        sections.append(section)
     return sections
 
 
 def split_into_sentences(text: str) -> List[str]:
     """
-    Split text into sentences using basic rules.
+    Split text into sentences (see scan_sentences).
+    """
+    return [text[start:end] for start, end in scan_sentences(text)]
+
+
+def split_into_sentences_batch(texts: List[str]) -> List[List[str]]:
+    """
+    Split many texts into sentences in one call (see scan_sentences_batch).
     """
-    # Simple sentence splitting - can be enhanced based on needs
-    sentences = re.split(r"(?<=[.!?])\s+", text)
-    return [s.strip() for s in sentences if s.strip()]
+    return [
+        [text[start:end] for start, end in offsets]
+        for text, offsets in zip(texts, scan_sentences_batch(texts))
+    ]
 
 
 if __name__ == "__main__":
@@ -72,11 +216,9 @@ if __name__ == "__main__":
     sections = parse_markdown_to_sections(md)
     print(sections)
 
-    for section in sections:
-        if section["content"]:
-            section["sentences"] = split_into_sentences(section["content"])
-        else:
-            section["sentences"] = []
+    sentences = split_into_sentences_batch([section["content"] for section in sections])
+    for section, section_sentences in zip(sections, sentences):
+        section["sentences"] = section_sentences
 
     with open("APRT.json", "w") as a:
         json.dump(sections, a, indent=4)
@@ -0,0 +1,37 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """In-process cache whose entries expire after `ttl` seconds, keeping at most `max_entries`."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Store `value`, evicting the least recently used entries beyond `max_entries`."""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, matches: Callable[[Hashable], bool]):
+        """Drop every entry whose key `matches`."""
+        for key in [key for key in self._entries if matches(key)]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,182 @@
+import re
+from typing import Dict, Iterator, List, Optional
+
+from config.config import settings
+
+COMMENT_PATTERN = re.compile(r"<!--.*?(?:-->|$)", re.DOTALL)
+REF_PATTERN = re.compile(r"<ref\b[^>]*/>|<ref\b[^>]*>.*?</ref\s*>", re.DOTALL | re.IGNORECASE)
+REF_TAG_PATTERN = re.compile(r"</?ref\b[^>]*>", re.IGNORECASE)
+# Tags whose content is never article prose
+DROPPED_TAG_PATTERN = re.compile(
+    r"<(gallery|math|score|syntaxhighlight|timeline|imagemap)\b[^>]*>.*?</\1\s*>",
+    re.DOTALL | re.IGNORECASE,
+)
+BREAK_PATTERN = re.compile(r"<br\s*/?>", re.IGNORECASE)
+TAG_PATTERN = re.compile(r"</?[a-zA-Z][^>]*>")
+TEMPLATE_START_PATTERN = re.compile(r"\{\{")
+TEMPLATE_TOKEN_PATTERN = re.compile(r"\{\{|\}\}")
+FILE_LINK_PATTERN = re.compile(r"\[\[\s*:?\s*(?:File|Image)\s*:", re.IGNORECASE)
+LINK_TOKEN_PATTERN = re.compile(r"\[\[|\]\]")
+LINK_PATTERN = re.compile(r"\[\[([^\[\]|]*)(?:\|([^\[\]]*))?\]\]")
+EXTERNAL_LINK_PATTERN = re.compile(r"\[(?:https?:)?//[^\s\]]+(?:\s+([^\]]*))?\]")
+EMPHASIS_PATTERN = re.compile(r"'{2,}")
+MAGIC_WORD_PATTERN = re.compile(r"__[A-Z]+__")
+LIST_PATTERN = re.compile(r"^[*#:;]+\s*", re.MULTILINE)
+RULE_PATTERN = re.compile(r"^-{4,}\s*$", re.MULTILINE)
+HEADING_PATTERN = re.compile(r"^(={1,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# Namespaces whose links are metadata rather than text
+HIDDEN_LINK_PREFIXES = ("category:",)
+
+
+def remove_balanced(text: str, start_pattern: re.Pattern, token_pattern: re.Pattern) -> str:
+    """
+    Remove every span that starts at a `start_pattern` match and ends where the brackets
+    matched by `token_pattern` (an opener and a closer) balance out.
+
+    An unterminated span is left in place rather than swallowing the rest of the page.
+    """
+    parts = []
+    position = 0
+    while True:
+        start = start_pattern.search(text, position)
+        if start is None:
+            break
+        depth = 0
+        end = None
+        for token in token_pattern.finditer(text, start.start()):
+            depth += 1 if token.group() in ("{{", "[[") else -1
+            if depth == 0:
+                end = token.end()
+                break
+        if end is None:
+            break
+        parts.append(text[position:start.start()])
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def remove_tables(text: str) -> str:
+    """Remove `{| ... |}` tables, including nested ones."""
+    lines = []
+    depth = 0
+    for line in text.split("\n"):
+        stripped = line.lstrip()
+        if stripped.startswith("{|"):
+            depth += 1
+        elif depth and stripped.startswith("|}"):
+            depth -= 1
+        elif not depth:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def replace_link(match: re.Match) -> str:
+    target, label = match.group(1).strip(), match.group(2)
+    if target.lower().startswith(HIDDEN_LINK_PREFIXES):
+        return ""
+    if label is not None and label.strip():
+        return label.strip()
+    # [[Page#Section]] reads as "Page"; a leading colon only escapes the namespace
+    return target.lstrip(":").split("#")[0] or target.lstrip(":#")
+
+
+def clean_wikitext(
+    wikitext: str,
+    drop_images: Optional[bool] = None,
+    drop_templates: Optional[bool] = None,
+    drop_refs: Optional[bool] = None,
+    drop_tables: Optional[bool] = None,
+) -> str:
+    """
+    Reduce wikitext to its readable text, keeping heading lines.
+
+    Links are replaced by their labels, bold/italic quotes and HTML tags are stripped, list
+    items become "- " lines, and comments, categories and magic words are removed. Images,
+    templates, references and tables are dropped unless configured otherwise.
+
+    Args:
+    wikitext (str): Raw wikitext of a page
+    drop_images (bool, optional): Drop [[File:...]] and [[Image:...]] (default WIKITEXT_DROP_IMAGES)
+    drop_templates (bool, optional): Drop {{...}} (default WIKITEXT_DROP_TEMPLATES)
+    drop_refs (bool, optional): Drop <ref> footnotes (default WIKITEXT_DROP_REFS)
+    drop_tables (bool, optional): Drop {| ... |} tables (default WIKITEXT_DROP_TABLES)
+
+    Returns:
+    str: Plain text with "== Heading ==" lines
+    """
+    if drop_images is None:
+        drop_images = settings.WIKITEXT_DROP_IMAGES
+    if drop_templates is None:
+        drop_templates = settings.WIKITEXT_DROP_TEMPLATES
+    if drop_refs is None:
+        drop_refs = settings.WIKITEXT_DROP_REFS
+    if drop_tables is None:
+        drop_tables = settings.WIKITEXT_DROP_TABLES
+
+    text = COMMENT_PATTERN.sub("", wikitext)
+    text = REF_PATTERN.sub("", text) if drop_refs else REF_TAG_PATTERN.sub(" ", text)
+    text = DROPPED_TAG_PATTERN.sub("", text)
+    # Templates go first: they can hold links, images and whole tables
+    if drop_templates:
+        text = remove_balanced(text, TEMPLATE_START_PATTERN, TEMPLATE_TOKEN_PATTERN)
+    if drop_tables:
+        text = remove_tables(text)
+    if drop_images:
+        # Captions may contain links, so the brackets have to be balanced
+        text = remove_balanced(text, FILE_LINK_PATTERN, LINK_TOKEN_PATTERN)
+    text = LINK_PATTERN.sub(replace_link, text)
+    text = EXTERNAL_LINK_PATTERN.sub(lambda match: match.group(1) or "", text)
+    text = BREAK_PATTERN.sub("\n", text)
+    text = TAG_PATTERN.sub("", text)
+    text = EMPHASIS_PATTERN.sub("", text)
+    text = MAGIC_WORD_PATTERN.sub("", text)
+    text = RULE_PATTERN.sub("", text)
+    text = LIST_PATTERN.sub("- ", text)
+    return BLANK_LINES_PATTERN.sub("\n\n", text)
+
+
+def iter_sections(wikitext: str, title: Optional[str] = None, **options) -> Iterator[Dict]:
+    """
+    Parse wikitext into sections, without any model call.
+
+    The lead (the text before the first heading) is a level 1 section titled `title`; every
+    "== Heading ==" starts a section whose level is its number of "=" signs. Sections with
+    no text left after cleaning are still yielded, so headings stay in document order.
+
+    Args:
+    wikitext (str): Raw wikitext of a page
+    title (str, optional): Page title, used for the lead section (default "Lead")
+    **options: drop_images, drop_templates, drop_refs, drop_tables (see clean_wikitext)
+
+    Yields:
+    Dict: Section with index (from 1), level, title and content
+    """
+    text = clean_wikitext(wikitext, **options)
+    index = 0
+    heading_title, level, start = title or "Lead", 1, 0
+    for heading in HEADING_PATTERN.finditer(text):
+        content = text[start:heading.start()].strip()
+        # An empty lead is not a section of its own
+        if index or content:
+            index += 1
+            yield {"index": index, "level": level, "title": heading_title, "content": content}
+        heading_title, level, start = heading.group(2), len(heading.group(1)), heading.end()
+    content = text[start:].strip()
+    if index or content:
+        index += 1
+        yield {"index": index, "level": level, "title": heading_title, "content": content}
+
+
+def parse_sections(wikitext: str, title: Optional[str] = None, **options) -> List[Dict]:
+    """List of the sections yielded by iter_sections."""
+    return list(iter_sections(wikitext, title, **options))
+
+
+def sections_to_markdown(sections: List[Dict]) -> str:
+    """Render parsed sections as markdown, with one "#" per section level."""
+    return "\n\n".join(
+        f"{'#' * section['level']} {section['title']}\n{section['content']}".rstrip()
+        for section in sections
+    )
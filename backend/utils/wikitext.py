@@ -1,30 +1,349 @@
-import requests
-
-
-def fetch_wikitext(url):
-    # Extract the page title from the URL
-    title = url.split("/wiki/")[-1]
-
-    # Set up the API request to get the wikitext
-    api_url = "https://en.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "prop": "revisions",
-        "rvprop": "content",
-        "rvslots": "main",
-        "titles": title,
-        "format": "json",
-        "formatversion": "2",
-    }
-
-    # Send the request
-    response = requests.get(api_url, params=params)
-    data = response.json()
-
-    # Extract the wikitext from the response
+import asyncio
+import logging
+import random
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote
+
+import httpx
+from pydantic import BaseModel
+
+from config.config import settings
+from utils.cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# MediaWiki accepts at most 50 titles per query for regular clients
+MAX_TITLES_PER_REQUEST = 50
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class WikiPage(BaseModel):
+    title: str
+    revid: Optional[int] = None
+    content: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def get_wikitext_cache() -> ResponseCache:
+    """Return the local store of page content keyed by title, tagged with its revision id."""
+    return ResponseCache(
+        path=settings.WIKITEXT_CACHE_PATH,
+        max_entries=settings.WIKITEXT_CACHE_MAX_ENTRIES,
+        enabled=settings.WIKITEXT_CACHE_ENABLED,
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared, connection-pooled HTTP client used for Wikipedia requests."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.WIKIPEDIA_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.WIKIPEDIA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.WIKIPEDIA_MAX_CONNECTIONS,
+            ),
+            headers={"User-Agent": settings.WIKIPEDIA_USER_AGENT},
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def title_from_url(url: str) -> str:
+    """Extract the page title from a Wikipedia URL (or return a bare title unchanged)."""
+    title = url.split("/wiki/")[-1].split("#")[0].split("?")[0]
+    return unquote(title).replace("_", " ")
+
+
+async def query_api(params: Dict[str, str]) -> Dict:
+    """
+    Send a GET request to the MediaWiki API, retrying transient failures with backoff.
+
+    Args:
+    params (Dict[str, str]): Query parameters for the request
+
+    Returns:
+    Dict: Decoded JSON response
+    """
+    client = get_client()
+    attempts = settings.WIKIPEDIA_MAX_RETRIES + 1
+
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await client.get(settings.WIKIPEDIA_API_URL, params=params)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+            error = httpx.HTTPStatusError(
+                f"Wikipedia API returned {response.status_code}",
+                request=response.request,
+                response=response,
+            )
+            retry_after = response.headers.get("Retry-After")
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            error = e
+            retry_after = None
+
+        if attempt == attempts:
+            raise error
+
+        delay = settings.WIKIPEDIA_BACKOFF * 2 ** (attempt - 1)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        delay += random.uniform(0, delay / 2)
+        logger.warning(
+            f"Wikipedia request failed ({error}), retrying in {delay:.2f}s "
+            f"(attempt {attempt}/{attempts - 1})"
+        )
+        await asyncio.sleep(delay)
+
+
+def resolve_pages(data: Dict, titles: List[str]) -> Dict[str, Optional[Dict]]:
+    """Map each requested title to its page object, following normalization and redirects."""
+    query = data.get("query", {})
+    aliases = {}
+    for item in query.get("normalized", []) + query.get("redirects", []):
+        aliases[item["from"]] = item["to"]
+    pages = {page["title"]: page for page in query.get("pages", [])}
+
+    resolved = {}
+    for title in titles:
+        target = title
+        seen = set()
+        while target in aliases and target not in seen:
+            seen.add(target)
+            target = aliases[target]
+        page = pages.get(target)
+        resolved[title] = None if page is None or page.get("missing") else page
+    return resolved
+
+
+def merge_query(merged: Dict, query: Dict):
+    """Add one response of a continued query to `merged`, collecting revisions per page."""
+    merged["normalized"].extend(query.get("normalized", []))
+    merged["redirects"].extend(query.get("redirects", []))
+    for page in query.get("pages", []):
+        existing = merged["pages"].setdefault(page["title"], {**page, "revisions": []})
+        existing["revisions"].extend(page.get("revisions", []))
+        if page.get("missing"):
+            existing["missing"] = True
+
+
+async def query_continued(params: Dict[str, str]) -> Dict:
+    """
+    Run a query to completion and return its merged "query" block.
+
+    When a response would exceed the API's size limit, the pages that did not fit come back
+    without revisions and a "continue" block; the query is repeated from there until every
+    page has its revisions.
+    """
+    merged = {"normalized": [], "redirects": [], "pages": {}}
+    continuation: Dict[str, str] = {}
+    while True:
+        data = await query_api({**params, **continuation})
+        merge_query(merged, data.get("query", {}))
+        if "continue" not in data:
+            break
+        continuation = data["continue"]
+    merged["pages"] = list(merged["pages"].values())
+    return merged
+
+
+def batched(items: List[Any]) -> List[List[Any]]:
+    items = list(dict.fromkeys(items))
+    return [
+        items[start:start + MAX_TITLES_PER_REQUEST]
+        for start in range(0, len(items), MAX_TITLES_PER_REQUEST)
+    ]
+
+
+async def query_revisions(titles: List[str], rvprop: str) -> Dict[str, Optional[Dict]]:
+    """Query the latest revision of each title, batching titles into as few requests as possible."""
+
+    async def query_batch(batch: List[str]) -> Dict[str, Optional[Dict]]:
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "rvprop": rvprop,
+            "rvslots": "main",
+            "titles": "|".join(batch),
+            "redirects": "1",
+            "format": "json",
+            "formatversion": "2",
+        }
+        return resolve_pages({"query": await query_continued(params)}, batch)
+
+    pages = {}
+    for result in await asyncio.gather(*(query_batch(batch) for batch in batched(titles))):
+        pages.update(result)
+    return pages
+
+
+def page_revid(page: Optional[Dict]) -> Optional[int]:
+    try:
+        return page["revisions"][0]["revid"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def page_content(page: Optional[Dict]) -> Optional[str]:
     try:
-        wikitext = data["query"]["pages"][0]["revisions"][0]["slots"]["main"]["content"]
-        return wikitext
-    except KeyError:
-        return "Wikitext not found. Check if the page exists."
+        return page["revisions"][0]["slots"]["main"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+async def fetch_revisions(titles: List[str]) -> Dict[str, Optional[int]]:
+    """Fetch only the latest revision id of each title; missing pages map to None."""
+    pages = await query_revisions(titles, "ids")
+    return {title: page_revid(page) for title, page in pages.items()}
+
+
+async def fetch_pages(titles: List[str]) -> Dict[str, Optional[WikiPage]]:
+    """
+    Fetch the latest revision of many pages, reusing cached content when the revision is unchanged.
+
+    Titles already in the local cache only cost a cheap revision-id check; the full wikitext is
+    downloaded just for pages that are new or have been edited since they were cached.
+
+    Args:
+    titles (List[str]): Page titles to fetch
+
+    Returns:
+    Dict[str, Optional[WikiPage]]: Page per requested title, or None if the page is missing
+    """
+    titles = list(dict.fromkeys(titles))
+    cache = get_wikitext_cache()
+
+    cached = {}
+    for title in titles:
+        value = await cache.aget(title)
+        if value is not None:
+            cached[title] = WikiPage.model_validate_json(value)
+
+    result: Dict[str, Optional[WikiPage]] = {}
+    if cached:
+        revisions = await fetch_revisions(list(cached))
+        for title, revid in revisions.items():
+            if revid is None:
+                result[title] = None
+            elif revid == cached[title].revid:
+                logger.debug(f"Reusing cached wikitext for {title} (revid {revid})")
+                result[title] = cached[title]
+
+    to_download = [title for title in titles if title not in result]
+    if to_download:
+        pages = await query_revisions(to_download, "ids|content")
+        for title, page in pages.items():
+            content = page_content(page)
+            if content is None:
+                result[title] = None
+                continue
+            wiki_page = WikiPage(title=page["title"], revid=page_revid(page), content=content)
+            await cache.aset(title, wiki_page.model_dump_json())
+            result[title] = wiki_page
+
+    return {title: result[title] for title in titles}
+
+
+def revision_cache_key(revid: int) -> str:
+    # Titles always start with a capital letter, so this cannot collide with a title key
+    return f"revid:{revid}"
+
+
+async def fetch_revision_contents(revids: List[int]) -> Dict[int, Optional[WikiPage]]:
+    """
+    Fetch specific revisions of pages, batching revision ids into as few requests as possible.
+
+    Revisions never change, so cached ones are returned without asking the API.
+
+    Args:
+    revids (List[int]): Revision ids to fetch
+
+    Returns:
+    Dict[int, Optional[WikiPage]]: Page per revision id, or None if the revision is missing,
+    deleted or hidden
+    """
+    revids = list(dict.fromkeys(revids))
+    cache = get_wikitext_cache()
+
+    result: Dict[int, Optional[WikiPage]] = {}
+    for revid in revids:
+        value = await cache.aget(revision_cache_key(revid))
+        if value is not None:
+            result[revid] = WikiPage.model_validate_json(value)
+
+    async def query_batch(batch: List[int]) -> Dict[int, WikiPage]:
+        query = await query_continued(
+            {
+                "action": "query",
+                "prop": "revisions",
+                "rvprop": "ids|content",
+                "rvslots": "main",
+                "revids": "|".join(str(revid) for revid in batch),
+                "format": "json",
+                "formatversion": "2",
+            }
+        )
+        pages = {}
+        for page in query["pages"]:
+            for revision in page["revisions"]:
+                content = page_content({"revisions": [revision]})
+                if content is not None:
+                    pages[revision["revid"]] = WikiPage(
+                        title=page["title"], revid=revision["revid"], content=content
+                    )
+        return pages
+
+    to_download = [revid for revid in revids if revid not in result]
+    for pages in await asyncio.gather(*(query_batch(batch) for batch in batched(to_download))):
+        for revid, page in pages.items():
+            await cache.aset(revision_cache_key(revid), page.model_dump_json())
+            result[revid] = page
+
+    return {revid: result.get(revid) for revid in revids}
+
+
+async def fetch_revision_content(revid: int) -> Optional[WikiPage]:
+    """Fetch one specific revision of a page, or None if it is missing, deleted or hidden."""
+    page = (await fetch_revision_contents([revid])).get(revid)
+    if page is None:
+        logger.warning(f"Revision {revid} not found. Check if it has been deleted.")
+    return page
+
+
+async def fetch_page(url: str) -> Optional[WikiPage]:
+    """Fetch the page at `url`, or None if the page does not exist."""
+    title = title_from_url(url)
+    page = (await fetch_pages([title])).get(title)
+    if page is None:
+        logger.warning(f"Wikitext not found for {title}. Check if the page exists.")
+    return page
+
+
+async def fetch_revision(url: str) -> Optional[int]:
+    """Fetch only the latest revision id of the page at `url`."""
+    title = title_from_url(url)
+    return (await fetch_revisions([title])).get(title)
+
+
+async def fetch_wikitexts(titles: List[str]) -> Dict[str, Optional[str]]:
+    """Fetch the wikitext of many pages; missing pages map to None."""
+    pages = await fetch_pages(titles)
+    return {title: page.content if page else None for title, page in pages.items()}
+
 
+async def fetch_wikitext(url: str) -> Optional[str]:
+    """Fetch the wikitext of the page at `url`, or None if the page does not exist."""
+    page = await fetch_page(url)
+    return page.content if page else None
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+from config.config import initiate_database, settings
+from utils.jobs import run_worker
+from utils.llm import close_llm_client
+from utils.wikitext import close_client
+import routes.evaluate  # noqa: F401 - registers the "evaluate" and "evaluate_batch" job handlers
+import routes.extract  # noqa: F401 - registers the "extract" job handler
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def main(concurrency: int):
+    await initiate_database()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Stop leasing new jobs and let the running ones finish
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await run_worker(concurrency=concurrency, stop=stop)
+    finally:
+        await close_client()
+        await close_llm_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued extraction and evaluation jobs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.WORKER_CONCURRENCY,
+        help="Jobs run concurrently by this worker process",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))